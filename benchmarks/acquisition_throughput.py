@@ -0,0 +1,195 @@
+"""
+Benchmark of the acquisition chain throughput.
+
+Drives the simulated Recorder (SimRecorder) in real time over a sweep of
+sampling rates, channel counts, chunk sizes and buffer lengths, in three
+modes:
+    * write: streaming into the ring buffer only
+    * record: streaming and recording to memory
+    * trigger: streaming with the trigger armed (but never set off)
+
+For each configuration it reports the per-chunk callback latency
+percentiles, the consumer lag (chunks waiting, and time from the callback
+to the end of processing), the dropped chunks, the processing load
+(processing time / chunk period) and the CPU time. The results are
+written as JSON so they can be compared between releases.
+
+Usage:
+    python benchmarks/acquisition_throughput.py --output results.json
+    python benchmarks/acquisition_throughput.py --rates 51200 --channels 32 --duration 10
+"""
+import argparse
+import collections
+import json
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import cued_datalogger.acquisition.SimRecorder as SimR
+
+MODES = ['write', 'record', 'trigger']
+PERCENTILES = [50, 90, 99, 99.9]
+
+class BenchRecorder(SimR.Recorder):
+    """
+    SimRecorder instrumented to time the callback and the processing.
+    The chunks are pregenerated so that generating the signal is not
+    counted as part of the chain.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.signal_params['noise'] = 0.1
+        self._chunks = [super(BenchRecorder, self).generate_chunk()
+                        for _ in range(8)]
+        self._next = 0
+        self.callback_times = []
+        self.process_times = []
+        self.consumer_delays = []
+        self.lags = []
+        self._put_times = collections.deque()
+
+    def generate_chunk(self):
+        self._next = (self._next + 1) % len(self._chunks)
+        return self._chunks[self._next]
+
+    def stream_audio_callback(self, in_data, timestamp=None):
+        t0 = time.perf_counter()
+        # Stamp before queueing, the worker may pick the chunk up at once
+        self._put_times.append(t0)
+        dropped = self.consumer.dropped
+        self.push_chunk(in_data, timestamp)
+        if self.consumer.dropped > dropped:
+            self._put_times.pop()
+        t1 = time.perf_counter()
+        self.callback_times.append(t1 - t0)
+        self.lags.append(self.consumer.lag)
+
+    def process_chunk(self, raw, *args):
+        t0 = time.perf_counter()
+        super().process_chunk(raw, *args)
+        t1 = time.perf_counter()
+        self.process_times.append(t1 - t0)
+        self.consumer_delays.append(t1 - self._put_times.popleft())
+
+
+def percentiles(values):
+    """Return the percentiles (and maximum) of *values* in microseconds."""
+    if not len(values):
+        return {}
+    values = np.asarray(values) * 1e6
+    result = {'p%g' % p: float(v)
+              for p, v in zip(PERCENTILES, np.percentile(values, PERCENTILES))}
+    result['max'] = float(values.max())
+    return result
+
+
+def run_config(rate, channels, chunk_size, num_chunk, mode, duration):
+    """Stream one configuration for *duration* seconds and return its
+    measurements as a dict."""
+    rec = BenchRecorder(channels=channels, rate=rate, chunk_size=chunk_size,
+                        num_chunk=num_chunk, device_name='Noise')
+    rec.stream_init()
+    # Let the stream settle before measuring
+    time.sleep(min(0.2, duration))
+    rec.callback_times, rec.process_times = [], []
+    rec.consumer_delays, rec.lags = [], []
+    dropped_before = rec.consumer.dropped
+
+    if mode == 'record':
+        rec.record_init(duration=duration * 2)
+        rec.record_start()
+    elif mode == 'trigger':
+        rec.trigger_start(posttrig=chunk_size, pretrig=chunk_size // 2,
+                          threshold=rec.max_value * 10)
+
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    time.sleep(duration)
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+
+    rec.stream_stop()
+    dropped = rec.consumer.dropped - dropped_before
+    chunks = len(rec.callback_times)
+    period = chunk_size / rate
+    process_mean = float(np.mean(rec.process_times)) if rec.process_times else 0.0
+    stats = rec.stats()
+    rec.record_cancel()
+    rec.close()
+
+    return {'rate': rate,
+            'channels': channels,
+            'chunk_size': chunk_size,
+            'num_chunk': num_chunk,
+            'mode': mode,
+            'duration_s': wall,
+            'chunks': chunks,
+            'dropped_chunks': dropped,
+            'lost_chunks': stats['lost_chunks'],
+            'samples_per_s': chunks * chunk_size * channels / wall,
+            'callback_latency_us': percentiles(rec.callback_times),
+            'process_time_us': percentiles(rec.process_times),
+            'consumer_delay_us': percentiles(rec.consumer_delays),
+            'consumer_lag_max': int(max(rec.lags)) if rec.lags else 0,
+            'load': process_mean / period,
+            'cpu_percent': 100 * cpu / wall,
+            'sustained': dropped == 0 and process_mean < period}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Acquisition throughput "
+                                     "benchmark using the simulated recorder.")
+    parser.add_argument('--rates', type=int, nargs='+',
+                        default=[8000, 44100, 51200, 96000, 200000])
+    parser.add_argument('--channels', type=int, nargs='+',
+                        default=[1, 8, 32, 64])
+    parser.add_argument('--chunk-sizes', type=int, nargs='+',
+                        default=[256, 1024, 4096])
+    parser.add_argument('--num-chunks', type=int, nargs='+', default=[4, 64])
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=MODES)
+    parser.add_argument('--duration', type=float, default=1.0,
+                        help="Seconds to stream each configuration for")
+    parser.add_argument('-o', '--output',
+                        help="Write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    version_file = os.path.join(os.path.dirname(SimR.__file__), '..', 'VERSION')
+    with open(version_file) as f:
+        version = f.read().strip()
+
+    results = []
+    for rate in args.rates:
+        for channels in args.channels:
+            for chunk_size in args.chunk_sizes:
+                for num_chunk in args.num_chunks:
+                    for mode in args.modes:
+                        r = run_config(rate, channels, chunk_size, num_chunk,
+                                       mode, args.duration)
+                        results.append(r)
+                        print("{rate:>7} Hz {channels:>3} ch chunk {chunk_size:>5}"
+                              " x{num_chunk:<4} {mode:<8} load {load:6.3f}"
+                              " cb p99 {cb:8.1f} us  lag {consumer_lag_max:>3}"
+                              "  dropped {dropped_chunks}".format(
+                                  cb=r['callback_latency_us'].get('p99', 0), **r))
+
+    report = {'version': version,
+              'python': platform.python_version(),
+              'numpy': np.__version__,
+              'platform': platform.platform(),
+              'processor': platform.processor(),
+              'timestamp': time.time(),
+              'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+
+if __name__ == '__main__':
+    main()
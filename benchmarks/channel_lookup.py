@@ -0,0 +1,130 @@
+"""
+Benchmark of the Channel DataSet lookups and bulk loading.
+
+Builds a ChannelSet of many channels, as an import of a large file does,
+then times the per-channel DataSet accesses done by the plotting and
+analysis loops:
+    * load: create the channels and set their time series and spectrum
+    * data: Channel.data for the time series and its time axis
+    * dataset: Channel.dataset, units and is_dataset
+    * ids: Channel.ids
+
+Only the public API is used, so that the same script can be run on
+different releases and the JSON results compared.
+
+Usage:
+    python benchmarks/channel_lookup.py --output results.json
+    python benchmarks/channel_lookup.py --channels 1000 10000 --samples 4096
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from cued_datalogger.api.channel import ChannelSet
+
+LOOKUPS = ['data', 'dataset', 'ids']
+
+
+def best_of(func, repeats):
+    """Return the shortest time (in seconds) of *repeats* calls of *func*."""
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+def load(num_channels, samples):
+    """Create a ChannelSet of *num_channels* channels, each with a time
+    series of *samples* samples and its spectrum."""
+    cs = ChannelSet(num_channels)
+    time_series = np.random.randn(samples)
+    spectrum = np.fft.rfft(time_series)
+    for i in range(num_channels):
+        cs.add_channel_dataset(i, 'time_series', time_series)
+        cs.add_channel_dataset(i, 'spectrum', spectrum)
+    return cs
+
+
+def run_config(num_channels, samples, repeats):
+    """Time the loading and lookups of one configuration and return the
+    measurements as a dict."""
+    load_time = best_of(lambda: load(num_channels, samples), repeats)
+    cs = load(num_channels, samples)
+    channels = list(cs.channels)
+
+    def data():
+        for channel in channels:
+            channel.data('time_series')
+            channel.data('time')
+
+    def dataset():
+        for channel in channels:
+            channel.dataset('spectrum')
+            channel.units('time_series')
+            channel.is_dataset('spectrum')
+
+    def ids():
+        for channel in channels:
+            channel.ids()
+
+    lookups = {'data': (data, 2), 'dataset': (dataset, 3), 'ids': (ids, 1)}
+    result = {'channels': num_channels,
+              'samples': samples,
+              'load_s': load_time,
+              'load_per_channel_us': 1e6 * load_time / num_channels}
+    for name in LOOKUPS:
+        func, calls = lookups[name]
+        t = best_of(func, repeats)
+        result[name + '_s'] = t
+        result[name + '_per_call_ns'] = 1e9 * t / (num_channels * calls)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Channel DataSet lookup and "
+                                     "bulk loading benchmark.")
+    parser.add_argument('--channels', type=int, nargs='+',
+                        default=[100, 1000, 10000])
+    parser.add_argument('--samples', type=int, default=1024,
+                        help="Samples in the time series of each channel")
+    parser.add_argument('--repeats', type=int, default=3,
+                        help="Best time of this number of runs is kept")
+    parser.add_argument('-o', '--output',
+                        help="Write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    import cued_datalogger
+    results = []
+    for num_channels in args.channels:
+        r = run_config(num_channels, args.samples, args.repeats)
+        results.append(r)
+        print("{channels:>6} ch  load {load_s:8.3f} s ({load_per_channel_us:7.1f} us/ch)"
+              "  data {data_per_call_ns:8.0f} ns  dataset {dataset_per_call_ns:8.0f} ns"
+              "  ids {ids_per_call_ns:8.0f} ns".format(**r))
+
+    report = {'version': cued_datalogger.__version__.strip(),
+              'python': platform.python_version(),
+              'numpy': np.__version__,
+              'platform': platform.platform(),
+              'processor': platform.processor(),
+              'timestamp': time.time(),
+              'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,24 @@
 from cued_datalogger import api
 from cued_datalogger import analysis
 from cued_datalogger import acquisition
-from cued_datalogger.analysis import analysis_window as analysis_window
-from cued_datalogger.acquisition import acquisition_window as acquisition_window
-from cued_datalogger.api import workspace as workspace
 
+import importlib as _importlib
 import os.path as _path
 
+# The windows need PyQt and a display, so they are only imported when first
+# used (e.g. cued_datalogger.analysis_window). The headless acquisition
+# (python -m cued_datalogger record) then runs without them.
+_GUI_MODULES = {'analysis_window': 'cued_datalogger.analysis.analysis_window',
+                'acquisition_window': 'cued_datalogger.acquisition.acquisition_window',
+                'workspace': 'cued_datalogger.api.workspace'}
+
+def __getattr__(name):
+    if name in _GUI_MODULES:
+        module = _importlib.import_module(_GUI_MODULES[name])
+        globals()[name] = module
+        return module
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
 _PKG_ROOT = _path.abspath(_path.dirname(__file__))
 
 if _path.isfile(_path.join(_PKG_ROOT, 'VERSION')):
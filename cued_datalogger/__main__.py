@@ -1,12 +1,10 @@
 import sys
-from PyQt5.QtWidgets import QApplication
 
 if __name__ == '__main__':
     sys.path.append('../')
 
 import cued_datalogger
-from cued_datalogger.api.workspace import Workspace
-from cued_datalogger.analysis.analysis_window import AnalysisWindow
+from cued_datalogger.acquisition import headless
 from cued_datalogger import __version__
 import argparse
 
@@ -18,11 +16,26 @@ def run():
     parser.add_argument('-w', '--workspace', dest='workspace_path',
                         help="Run the datalogger with the configuration given "
                         "in the Workspace (.wsp) file found at WORKSPACE_PATH")
+    subparsers = parser.add_subparsers(dest='command', title='commands',
+                                       description="Run without a command to "
+                                       "start the GUI")
+    record_parser = subparsers.add_parser('record',
+                                          help="Record from the command line, "
+                                          "without the GUI")
+    headless.add_arguments(record_parser)
 
     args = parser.parse_args()
 
     print("CUED DataLogger {}".format(__version__))
 
+    if args.command == 'record':
+        sys.exit(headless.record(args))
+
+    # Only the GUI needs PyQt
+    from PyQt5.QtWidgets import QApplication
+    from cued_datalogger.api.workspace import Workspace
+    from cued_datalogger.analysis.analysis_window import AnalysisWindow
+
     # Create the application instance
     app = 0
     app = QApplication(sys.argv)
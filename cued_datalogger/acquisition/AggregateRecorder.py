@@ -0,0 +1,472 @@
+# -*- coding: utf-8 -*-
+"""
+This module contains the class to record from several devices at once,
+as a single stream of channels (for example a soundcard and an NI card,
+or several NI cards).
+
+The aggregate recorder drives the stream of each source recorder, and
+takes their chunks (in volts) as they arrive, see
+RecorderParent.add_chunk_listener. The sources are aligned by the time
+of their first sample, then followed sample by sample: the dropouts
+detected from the chunk sequence numbers are filled with zeros, so that
+a source does not slip against the others. Sources with another sample
+rate are resampled, by linear interpolation, onto the sample times of
+the aggregate stream. The channels of the sources are then put side by
+side, in the order of the sources, and processed as the chunks of a
+single recorder: buffering, recording, triggering and listeners all
+work as usual.
+
+The time of the first sample of each source is taken either from the
+computer clock when its first chunk arrives ('host'), which works for
+any devices, or from the device timestamps ('device'), which is more
+precise when the devices share a clock (e.g. synchronised NI cards).
+The sources are not corrected for the drift between their clocks.
+
+Typical example of using the module:
+    | >>>import AggregateRecorder as AggR
+    | >>>recorder = AggR.Recorder([NIR.Recorder(channels = 8),
+    | ...                          mR.Recorder(channels = 2)])
+    | >>>recorder.stream_init()
+    | True
+    | >>>recorder.record_init(duration = 5)
+    | >>>recorder.record_start()
+    | >>>data = recorder.flush_record_data()   # 10 channels
+    | >>>recorder.close()
+    | >>>recorder = AggR.Recorder(backends = ['NIRecorder','myRecorder'],
+    | ...                        channels = 2)   # 2 channels from each
+
+Attributes
+----------
+SYNC_MODES: list of str
+    The available ways to align the first samples of the sources
+MAX_SKEW: float
+    Maximum time (in seconds) a source is held waiting for the others,
+    after which its oldest samples are dropped
+"""
+from cued_datalogger.acquisition.RecorderParent import (RecorderParent,
+                                                        STATUS_INPUT_UNDERFLOW)
+import cued_datalogger.acquisition.SimRecorder as SimR
+
+import importlib
+import threading
+import time
+
+import numpy as np
+
+SYNC_MODES = ['host','device']
+MAX_SKEW = 2.0
+
+class Source(object):
+    """
+    The samples of one source recorder waiting to be aggregated
+
+    Attributes
+    ----------
+    rec: Recorder object
+        The source recorder
+    rate: int
+        Sampling rate of the source
+    channels: int
+        Number of channels of the source
+    buffer: Numpy Array
+        The waiting samples (in volts), the first fill rows are valid
+    fill: int
+        Number of waiting samples
+    dropped: int
+        Number of samples removed from the front of the buffer so far
+    first_time: float
+        Time of the first sample of the source, None until it arrives
+    start: float
+        Time of the first sample, relative to the start of the aggregate
+        stream (0 or negative)
+    padded: bool
+        Whether some samples were filled in since the last aggregate chunk
+    """
+    def __init__(self,rec):
+        self.rec = rec
+        self.rate = rec.rate
+        self.channels = rec.channels
+        self.buffer = np.zeros((4*rec.chunk_size,rec.channels))
+        self.fill = 0
+        self.dropped = 0
+        self.first_time = None
+        self.start = 0.0
+        self.padded = False
+
+    def append(self,data,max_samples):
+        """
+        Add samples at the end of the buffer, dropping the oldest samples
+        beyond max_samples
+
+        Parameters
+        ----------
+        data: Numpy Array
+            Samples with dimension of samples x channels
+        max_samples: int
+            Maximum number of waiting samples
+        """
+        n = data.shape[0]
+        if self.fill + n > self.buffer.shape[0]:
+            buffer = np.zeros((self.fill + n + self.buffer.shape[0],self.channels))
+            buffer[:self.fill] = self.buffer[:self.fill]
+            self.buffer = buffer
+        self.buffer[self.fill:self.fill+n] = data
+        self.fill += n
+        if self.fill > max_samples:
+            self.consume(self.fill - max_samples)
+            self.padded = True
+
+    def consume(self,n):
+        """
+        Remove samples from the front of the buffer
+
+        Parameters
+        ----------
+        n: int
+            Number of samples to remove
+        """
+        n = min(max(0,n),self.fill)
+        if n:
+            self.buffer[:self.fill-n] = self.buffer[n:self.fill]
+            self.fill -= n
+            self.dropped += n
+
+    def positions(self,times):
+        """
+        Get the (fractional) indices into the buffer of some sample times
+
+        Parameters
+        ----------
+        times: Numpy Array
+            Times (in seconds) relative to the start of the aggregate stream
+
+        Returns
+        ----------
+        Numpy Array
+            Fractional buffer indices
+        """
+        pos = (times - self.start) * self.rate - self.dropped
+        # Remove the rounding errors, so that matching samples are copied
+        near = np.round(pos)
+        return np.where(np.abs(pos - near) < 1e-6,near,pos)
+
+    def resample(self,pos):
+        """
+        Linearly interpolate the buffer at fractional indices.
+        Indices out of the buffer are clipped to its ends
+
+        Parameters
+        ----------
+        pos: Numpy Array
+            Fractional buffer indices, in increasing order
+
+        Returns
+        ----------
+        Numpy Array
+            Samples with dimension of len(pos) x channels
+        """
+        if pos[0] < 0:
+            self.padded = True
+        idx = np.clip(np.floor(pos).astype(np.int64),0,self.fill-1)
+        frac = np.clip(pos - idx,0,1).reshape((-1,1))
+        if not frac.any():
+            return self.buffer[idx]
+        nxt = np.minimum(idx + 1,self.fill-1)
+        return self.buffer[idx] * (1 - frac) + self.buffer[nxt] * frac
+
+class Recorder(RecorderParent):
+    """
+    Sets up one recording stream from several source recorders
+
+    Attributes
+    ----------
+    sources: list of Source
+        The source recorders and their waiting samples
+    sync: str
+        How the first samples of the sources are aligned, one of SYNC_MODES
+    device_name: str
+        Names of the source devices
+    """
+    def __init__(self,recorders = None,rate = None,chunk_size = 1024,
+                 num_chunk = 4,channels = 1,device_name = None,sync = 'host',
+                 backends = None):
+        """
+        Parameters
+        ----------
+        recorders: list of Recorder object
+            The source recorders, which should not be streaming yet.
+            If None, they are created from the backends
+        rate: int
+            Sampling rate of the aggregate stream. If None, the rate of the
+            first source is used
+        chunk_size: int
+            Number of samples to get from each channel in one chunk
+        num_chunk: int
+            Number of chunks to store in circular buffer
+        channels: int
+            Number of channels of each source created from the backends,
+            or of the simulated source, if no recorders
+        device_name: str
+            Signal type of the simulated source, if no recorders
+            nor backends
+        sync: str
+            One of SYNC_MODES
+        backends: list of str
+            Module names of the Recorder backends (e.g. 'NIRecorder') of
+            the sources to create on their default devices, if no recorders.
+            If None, a single simulated source is used
+        """
+        if not sync in SYNC_MODES:
+            raise ValueError('Unknown sync mode: %s' % sync)
+        if not recorders and backends:
+            recorders = []
+            for name in backends:
+                backend = importlib.import_module('cued_datalogger.acquisition.'
+                                                  + name)
+                recorders.append(backend.Recorder(channels = channels,
+                                                  rate = rate or 44100,
+                                                  chunk_size = chunk_size,
+                                                  num_chunk = num_chunk))
+        if not recorders:
+            recorders = [SimR.Recorder(channels = channels,
+                                       rate = rate or 44100,
+                                       chunk_size = chunk_size,
+                                       device_name = device_name)]
+        self.sources = [Source(rec) for rec in recorders]
+        self.sync = sync
+        self._lock = threading.Lock()
+        super().__init__(channels = sum(s.channels for s in self.sources),
+                         rate = rate or self.sources[0].rate,
+                         chunk_size = chunk_size,num_chunk = num_chunk)
+        print('You are aggregating %i recorders' % len(self.sources))
+        self.device_name = None
+        self.set_device_by_name(None)
+
+        self.open_recorder()
+        self.trigger_init()
+        self.reset_sources()
+
+    def close(self):
+        """
+        Re-implemented from RecorderParent.
+        Closes the source recorders too
+        """
+        super().close()
+        for s in self.sources:
+            s.rec.close()
+
+#---------------- DEVICE SETTING METHODS -----------------------------------
+    def set_device_by_name(self, name):
+        """
+        The devices are set on the source recorders,
+        so only the combined name is kept
+        """
+        self.device_name = ' + '.join(str(s.rec.device_name) for s in self.sources)
+        print('Selected device: %s' % self.device_name)
+
+    def available_devices(self):
+        """
+        Get the combined device
+
+        Returns
+        ----------
+        names: List of str
+            The combined name of the source devices
+        descriptions: List of str
+            The number of channels of each source
+        """
+        description = ' + '.join('%i ch' % s.channels for s in self.sources)
+        return([self.device_name],[description])
+
+    def current_device_info(self):
+        """
+        Prints information about the source devices
+        """
+        for i,s in enumerate(self.sources):
+            print('Source %i: %i channels at %i Hz' % (i,s.channels,s.rate))
+            s.rec.current_device_info()
+
+#---------------- DATA METHODS -----------------------------------
+    @property
+    def storage_dtype(self):
+        """
+        numpy dtype
+            Data type of the buffer and recordings. The sources are
+            already in volts, so it is always float
+        """
+        return np.float64
+
+    def audiodata_to_array(self,data):
+        """
+        Re-implemented from RecorderParent.
+        The aggregate chunks are already in volts
+        """
+        return np.asarray(data,dtype = np.float64).reshape((-1,self.channels))
+
+    def stats(self):
+        """
+        Re-implemented from RecorderParent.
+        Adds 'sources': the statistics of each source recorder
+        """
+        stats = super().stats()
+        stats['sources'] = [s.rec.stats() for s in self.sources]
+        return stats
+
+#---------------- AGGREGATION METHODS -----------------------------------
+    def reset_sources(self):
+        """
+        Clear the waiting samples of the sources, and wait for all of them
+        to align the aggregate stream again
+        """
+        with self._lock:
+            for s in self.sources:
+                s.fill = 0
+                s.dropped = 0
+                s.first_time = None
+                s.padded = False
+            self.aligned = False
+            self.sample_count = 0
+
+    def _source_chunk(self,index,data):
+        """
+        Chunk listener of the source recorders: add the chunk to the
+        waiting samples of its source, and send out any aggregate chunk
+        which all the sources have the samples for
+
+        Parameters
+        ----------
+        index: int
+            Index of the source
+        data: Numpy Array
+            The chunk in volts, with dimension of samples x channels
+        """
+        arrival = time.perf_counter()
+        with self._lock:
+            s = self.sources[index]
+            rec = s.rec
+            n = data.shape[0]
+            max_samples = int(MAX_SKEW * s.rate) + n
+            if s.first_time is None:
+                timestamp = rec.last_timestamp
+                if self.sync == 'device' and timestamp is not None:
+                    s.first_time = timestamp
+                else:
+                    s.first_time = arrival - n / s.rate
+            else:
+                # Fill the samples lost before this chunk, so that the
+                # source does not slip against the others
+                gap = rec.last_gap
+                if gap is not None and gap[0] == rec.ring.total_written - n:
+                    if gap[1] > 0:
+                        s.append(np.zeros((min(gap[1],max_samples),s.channels)),max_samples)
+                    s.padded = True
+            s.append(data,max_samples)
+
+            if not self.aligned:
+                if any(src.first_time is None for src in self.sources):
+                    return
+                self._align()
+            while self._aggregate_chunk():
+                pass
+
+    def _align(self):
+        """
+        Start the aggregate stream at the latest first sample of the sources
+        """
+        origin = max(s.first_time for s in self.sources)
+        for s in self.sources:
+            # Snap to the sample grid of the source, so that sources at
+            # the aggregate rate are copied rather than interpolated
+            s.start = -round((origin - s.first_time) * s.rate) / s.rate
+        self.aligned = True
+
+    def _aggregate_chunk(self):
+        """
+        Put the channels of the sources side by side for the next
+        aggregate chunk, if all the sources have the samples for it
+
+        Returns
+        ----------
+        bool
+            True if a chunk was sent out
+        """
+        times = (self.sample_count + np.arange(self.chunk_size)) / self.rate
+        positions = []
+        for s in self.sources:
+            pos = s.positions(times)
+            last = np.ceil(pos[-1])
+            if last >= s.fill:
+                return False
+            positions.append(pos)
+
+        chunk = np.hstack([s.resample(pos) for s,pos in zip(self.sources,positions)])
+        status = 0
+        if any(s.padded for s in self.sources):
+            status = STATUS_INPUT_UNDERFLOW
+        self.sample_count += self.chunk_size
+
+        # Keep the samples needed from the next chunk onwards
+        next_time = np.array([self.sample_count / self.rate])
+        for s in self.sources:
+            s.consume(int(np.floor(s.positions(next_time)[0])))
+            s.padded = False
+
+        self.push_chunk(chunk.ravel(),times[0],status)
+        return True
+
+#---------------- STREAMING METHODS -----------------------------------
+    def stream_init(self, playback = False):
+        """
+        Re-implemented from RecorderParent.
+        Initialises the streams of all the sources
+        """
+        if self.audio_stream == None:
+            self.reset_stats()
+            self.reset_sources()
+            for i,s in enumerate(self.sources):
+                listener = lambda data,i = i: self._source_chunk(i,data)
+                s.listener = listener
+                s.rec.add_chunk_listener(listener,physical = True)
+                if not s.rec.stream_init(playback = playback):
+                    print('Cannot initialise the stream of source %i' % i)
+                    self.stream_close()
+                    return False
+            self.audio_stream = [s.rec for s in self.sources]
+            return True
+        else:
+            return False
+
+    def stream_start(self):
+        """
+        Re-implemented from RecorderParent.
+        """
+        if self.audio_stream:
+            for s in self.sources:
+                s.rec.stream_start()
+        else:
+            print('No audio stream is set up')
+
+    def stream_stop(self):
+        """
+        Re-implemented from RecorderParent.
+        The sources are realigned when the stream starts again
+        """
+        if self.audio_stream:
+            for s in self.sources:
+                s.rec.stream_stop()
+            self.reset_sources()
+        else:
+            print('No audio stream is set up')
+
+    def stream_close(self):
+        """
+        Re-implemented from RecorderParent.
+        Closes the streams of all the sources
+        """
+        for s in self.sources:
+            listener = getattr(s,'listener',None)
+            if listener:
+                s.rec.remove_chunk_listener(listener)
+                s.listener = None
+            s.rec.stream_close()
+        self.audio_stream = None
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+This module contains the queue of captured events used by the Recorder
+classes in multi-shot capture mode.
+
+The blocks holding the events are allocated once, when the capture starts.
+The recorder fills a free block on each trigger and moves it to the
+completed queue, then re-arms the trigger straight away. The UI drains the
+completed blocks in its own time, which hands them back to the free pool.
+If no block is free when the trigger is set off, the event is dropped and
+counted rather than holding up the stream.
+
+Example:
+    | >>>queue = CaptureQueue(16, samples = 5200, channels = 8)
+    | >>>idx = queue.acquire()        # From the recorder, on trigger
+    | >>>queue.commit(idx, trigger_sample = 123456)
+    | >>>for event in queue.drain():  # From the UI
+    | ...    print(event['trigger_sample'], event['data'].shape)
+"""
+import collections
+
+import numpy as np
+
+class CaptureQueue(object):
+    """
+    Bounded queue of preallocated capture blocks
+
+    Attributes
+    ----------
+    blocks: Numpy Array
+        The preallocated events, with dimension of
+        num_blocks x samples x channels
+    trigger_samples: Numpy Array
+        Stream sample index at which each event was triggered
+    gaps: list of list
+        Gap map of each event (see RecorderParent.rec_gaps)
+    captured: int
+        Number of events completed
+    dropped: int
+        Number of events dropped because no block was free
+    """
+    def __init__(self,num_blocks,samples,channels,dtype = np.float64):
+        """
+        Allocate the blocks
+
+        Parameters
+        ----------
+        num_blocks: int
+            Maximum number of events held at once
+        samples: int
+            Number of samples (per channel) in one event,
+            including the pretrigger samples
+        channels: int
+            Number of channels
+        dtype: numpy dtype
+            Data type of the samples
+        """
+        self.num_blocks = max(1,int(num_blocks))
+        self.blocks = np.zeros((self.num_blocks,samples,channels),dtype = dtype)
+        self.trigger_samples = np.zeros(self.num_blocks,dtype = np.int64)
+        self.gaps = [[] for i in range(self.num_blocks)]
+        self.captured = 0
+        self.dropped = 0
+        # deque appends and pops are atomic, so the recorder and the UI
+        # can use the queue from different threads
+        self._free = collections.deque(range(self.num_blocks))
+        self._completed = collections.deque()
+
+#---------------- RECORDER METHODS -----------------------------------
+    def acquire(self):
+        """
+        Take a free block to capture an event into
+
+        Returns
+        ----------
+        int or None
+            Index of the block, None if the event is dropped
+        """
+        try:
+            return self._free.popleft()
+        except IndexError:
+            self.dropped += 1
+            return None
+
+    def commit(self,idx,trigger_sample = 0,gaps = None):
+        """
+        Move a filled block to the completed queue
+
+        Parameters
+        ----------
+        idx: int
+            Index of the block
+        trigger_sample: int
+            Stream sample index at which the event was triggered
+        gaps: list
+            Gap map of the event
+        """
+        self.trigger_samples[idx] = trigger_sample
+        self.gaps[idx] = list(gaps) if gaps else []
+        self.captured += 1
+        self._completed.append(idx)
+
+    def abort(self,idx):
+        """
+        Hand an unfinished block back to the free pool
+
+        Parameters
+        ----------
+        idx: int
+            Index of the block
+        """
+        self._free.append(idx)
+
+#---------------- UI METHODS -----------------------------------
+    @property
+    def pending(self):
+        """
+        int
+            Number of completed events waiting to be drained
+        """
+        return len(self._completed)
+
+    def get(self):
+        """
+        Take the oldest completed event without copying it.
+        The block must be handed back with release() once used
+
+        Returns
+        ----------
+        int or None
+            Index of the block, None if there is no completed event
+        """
+        try:
+            return self._completed.popleft()
+        except IndexError:
+            return None
+
+    def release(self,idx):
+        """
+        Hand a drained block back to the free pool
+
+        Parameters
+        ----------
+        idx: int
+            Index of the block
+        """
+        self._free.append(idx)
+
+    def drain(self):
+        """
+        Take all the completed events, copying them out of their blocks
+
+        Returns
+        ----------
+        events: list of dict
+            'data': copy of the event, with dimension of samples x channels
+            'trigger_sample': stream sample index of the trigger
+            'gaps': gap map of the event
+        """
+        events = []
+        idx = self.get()
+        while idx is not None:
+            events.append({'data': self.blocks[idx].copy(),
+                           'trigger_sample': int(self.trigger_samples[idx]),
+                           'gaps': self.gaps[idx]})
+            self.release(idx)
+            idx = self.get()
+        return events
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+This module contains the consumer thread used by the Recorder classes to
+keep the work done in the audio callback to a minimum.
+
+The callback only copies the raw chunk into a preallocated slot and
+signals the worker thread. The worker thread then does the conversion,
+buffering, recording and triggering, see RecorderParent.process_chunk.
+If the worker falls behind and all the slots are full, new chunks are
+dropped and counted instead of blocking the callback.
+
+Example:
+    | >>>consumer = ChunkConsumer(recorder.process_chunk,
+    | ...                         chunk_size = 1024, channels = 2)
+    | >>>consumer.start()
+    | >>>consumer.put(in_data)      # From the audio callback
+    | >>>consumer.stop()
+"""
+import sys,traceback
+import threading
+
+import numpy as np
+
+class ChunkConsumer(object):
+    """
+    Single producer, single consumer queue of preallocated chunk slots,
+    drained by a worker thread.
+
+    Attributes
+    ----------
+    slots: Numpy Array
+        The preallocated raw chunks, with dimension of
+        num_slots x (chunk_size * channels)
+    lengths: Numpy Array
+        Number of valid values in each slot
+    sequences, timestamps, status: Numpy Array
+        Sequence number, timestamp and status flags of the chunk in each slot
+    dropped: int
+        Number of chunks dropped because all slots were full
+    processed: int
+        Number of chunks processed by the worker thread
+    """
+    def __init__(self,process,chunk_size,channels,num_slots = 16,dtype = np.int16):
+        """
+        Allocate the slots
+
+        Parameters
+        ----------
+        process: function
+            Called by the worker thread with each raw chunk (a 1D view
+            into a slot, only valid during the call), followed by its
+            sequence number, timestamp and status flags
+        chunk_size: int
+            Number of samples per channel in one chunk
+        channels: int
+            Number of channels
+        num_slots: int
+            Number of chunks that can wait to be processed
+        dtype: numpy dtype
+            Data type of the raw samples
+        """
+        self.process = process
+        self.num_slots = max(1,int(num_slots))
+        self.dtype = np.dtype(dtype)
+        self.slots = np.zeros((self.num_slots,chunk_size*channels),dtype = self.dtype)
+        self.lengths = np.zeros(self.num_slots,dtype = np.int64)
+        self.sequences = np.zeros(self.num_slots,dtype = np.int64)
+        self.timestamps = np.zeros(self.num_slots,dtype = np.float64)
+        self.status = np.zeros(self.num_slots,dtype = np.int64)
+
+        self.dropped = 0
+        self.processed = 0
+        self._write_count = 0
+        self._read_count = 0
+        self._filled = threading.Semaphore(0)
+        self._running = False
+        self._thread = None
+
+#---------------- PRODUCER METHODS -----------------------------------
+    def put(self,raw,sequence = 0,timestamp = np.nan,status = 0):
+        """
+        Copy a raw chunk into the next free slot and signal the worker.
+        To be called from the audio callback.
+
+        Parameters
+        ----------
+        raw: bytes or Numpy Array
+            Raw samples, interleaved by channel
+        sequence: int
+            Sequence number of the chunk
+        timestamp: float
+            Device time (in seconds) of the first sample of the chunk
+        status: int
+            Status flags of the chunk
+
+        Returns
+        ----------
+        bool
+            True if the chunk was queued, False if it was dropped
+        """
+        idx = self.acquire_slot()
+        if idx is None:
+            return False
+
+        values = np.frombuffer(raw,dtype = self.dtype)
+        n = min(values.shape[0],self.slots.shape[1])
+        self.slots[idx,:n] = values[:n]
+        self.commit_slot(idx,n,sequence,timestamp,status)
+        return True
+
+    def acquire_slot(self):
+        """
+        Get the next free slot, so that a chunk can be read straight into
+        it (self.slots[idx]) instead of being copied by put.
+        The slot must be handed over with commit_slot before acquiring
+        another one.
+
+        Returns
+        ----------
+        int or None
+            Index of the slot, None if all slots are full (the chunk is
+            counted as dropped)
+        """
+        if self._write_count - self._read_count >= self.num_slots:
+            self.dropped += 1
+            return None
+        return self._write_count % self.num_slots
+
+    def commit_slot(self,idx,n_values,sequence = 0,timestamp = np.nan,status = 0):
+        """
+        Hand a slot filled in place over to the worker
+
+        Parameters
+        ----------
+        idx: int
+            Index of the slot, from acquire_slot
+        n_values: int
+            Number of valid values in the slot
+        sequence: int
+            Sequence number of the chunk
+        timestamp: float
+            Device time (in seconds) of the first sample of the chunk
+        status: int
+            Status flags of the chunk
+        """
+        self.lengths[idx] = n_values
+        self.sequences[idx] = sequence
+        self.timestamps[idx] = timestamp
+        self.status[idx] = status
+
+        self._write_count += 1
+        self._filled.release()
+
+    @property
+    def lag(self):
+        """
+        int
+            Number of chunks waiting to be processed
+        """
+        return self._write_count - self._read_count
+
+#---------------- CONSUMER METHODS -----------------------------------
+    def start(self):
+        """
+        Start the worker thread
+        """
+        if self._thread is None:
+            self._running = True
+            self._thread = threading.Thread(target = self._run,
+                                            name = 'ChunkConsumer',
+                                            daemon = True)
+            self._thread.start()
+
+    def stop(self):
+        """
+        Stop the worker thread, after it has processed the waiting chunks
+        """
+        if self._thread is not None:
+            self._running = False
+            self._filled.release()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        """
+        Worker thread: process the filled slots in order
+        """
+        while True:
+            self._filled.acquire()
+            if self._read_count == self._write_count:
+                if not self._running:
+                    break
+                continue
+
+            idx = self._read_count % self.num_slots
+            try:
+                self.process(self.slots[idx,:self.lengths[idx]],
+                             int(self.sequences[idx]),
+                             float(self.timestamps[idx]),
+                             int(self.status[idx]))
+            except Exception:
+                t,v,tb = sys.exc_info()
+                print(t)
+                print(v)
+                print(traceback.format_tb(tb))
+            self.processed += 1
+            self._read_count += 1
@@ -28,7 +28,7 @@ Typical example of using the module:
     | Data flushed
     | >>>recorder.close()
 """
-from cued_datalogger.acquisition.RecorderParent import RecorderParent
+from cued_datalogger.acquisition.RecorderParent import RecorderParent, STATUS_SHORT_READ
 
 import sys,traceback
 try:
@@ -46,7 +46,7 @@ except:
                 return MagicMock()
 
     sys.modules['PyDAQmx'] = MockModule()
-    import PyDAQmx
+    import PyDAQmx as pdaq
     from PyDAQmx import Task
 
 import numpy as np
@@ -63,6 +63,7 @@ class Recorder(RecorderParent):
     max_value: float
         Maximum value of recorded data
     """
+    full_scale = 10.0
 #---------------- INITIALISATION METHODS -----------------------------------
     def __init__(self,channels = 1,rate = 30000.0, chunk_size = 1000,
                  num_chunk = 4,device_name = None):
@@ -199,39 +200,42 @@ class Recorder(RecorderParent):
         return channelname
 
 #---------------- STREAMING METHODS -----------------------------------
-    # Convert data obtained into a proper array
-    def audiodata_to_array(self,data):
-        """
-        Re-implemented from RecorderParent
-        """
-        return data.reshape((-1,self.channels))/(2**15) *10.0
-
     # Callback function for audio streaming
     def stream_audio_callback(self):
         """
         Callback function for audio streaming.
-        First, it writes data to the circular buffer,
-        then record data if it is recording,
-        finally check for any trigger.
+        It reads the data and hands it over to the consumer thread,
+        which does the rest (see RecorderParent.process_chunk).
+
+        The chunk is read straight into a slot of the consumer, and the
+        read count is kept in a preallocated int32, so nothing is allocated
+        here. If the consumer is full, the chunk is still read (into a
+        spare array) to keep the device buffer from overflowing, then dropped.
+        Only the samples actually read are handed over.
+
+        The chunk is stamped with the device time of its first sample,
+        worked out from the number of samples read so far.
 
         Returns 0 as part of the callback format.
         More info can be found in PyDAQmx documentation on Task class
         """
-        in_data = np.zeros(self.chunk_size*self.channels,dtype = np.int16)
-        read = pdaq.int32()
+        in_data = self.acquire_chunk_slot()
+        dropped = in_data is None
+        if dropped:
+            in_data = self.spare_data
         self.audio_stream.ReadBinaryI16(self.chunk_size,10.0,pdaq.DAQmx_Val_GroupByScanNumber,
-                           in_data,self.chunk_size*self.channels,pdaq.byref(read),None)
-
-        data_array = self.audiodata_to_array(in_data)
-        self.write_buffer(data_array)
+                           in_data,in_data.shape[0],self.read_ref,None)
+
+        n_read = min(max(int(self.read_count.value),0),self.chunk_size)
+        status = STATUS_SHORT_READ if n_read < self.chunk_size else 0
+        timestamp = self.samples_read / self.rate
+        self.samples_read += n_read
+        if dropped:
+            self.drop_chunk_slot()
+        else:
+            self.commit_chunk_slot(n_read*self.channels,timestamp,status)
         #self.rEmitter.newdata.emit()
 
-        if self.recording:
-            self.record_data(data_array)
-         # Trigger check
-        if self.trigger:
-            self._trigger_check_threshold(data_array)
-
         return 0
 
     def stream_init(self, playback = False):
@@ -240,16 +244,24 @@ class Recorder(RecorderParent):
         """
         if self.audio_stream == None:
             try:
+                self.consumer_start()
+                self.samples_read = 0
+                # Preallocated for the callback
+                self.read_count = pdaq.int32()
+                self.read_ref = pdaq.byref(self.read_count)
+                self.spare_data = np.zeros(self.chunk_size*self.channels,dtype = np.int16)
                 self.audio_stream = Task()
                 self.audio_stream.stream_audio_callback = self.stream_audio_callback
                 self.audio_stream.CreateAIVoltageChan(self.set_channels(),"",
                                          pdaq.DAQmx_Val_RSE,-10.0,10.0,
                                          pdaq.DAQmx_Val_Volts,None)
+                # Leave room in the device buffer for a few late callbacks
                 self.audio_stream.CfgSampClkTiming("",self.rate,
                                       pdaq.DAQmx_Val_Rising,pdaq.DAQmx_Val_ContSamps,
-                                      self.chunk_size)
+                                      self.chunk_size*max(self.num_chunk,4))
+                # One callback per chunk, so that each read is a full chunk
                 self.audio_stream.AutoRegisterEveryNSamplesEvent(pdaq.DAQmx_Val_Acquired_Into_Buffer,
-                                                    1000,0,name = 'stream_audio_callback')
+                                                    self.chunk_size,0,name = 'stream_audio_callback')
 
                 self.stream_start()
                 return True
@@ -259,6 +271,7 @@ class Recorder(RecorderParent):
                 print(v)
                 print(traceback.format_tb(tb))
                 self.audio_stream = None
+                self.consumer_stop()
 
                 return False
 
@@ -21,7 +21,18 @@ class RecEmitter(QObject):
         Emits when trigger threshold is reached
     newdata: pyqtsignal
         Emits when new data is received (not used)
+    overflowed: pyqtsignal
+        Emits the estimated number of missing samples (0 if unknown)
+        when stream data is lost
+    underflowed: pyqtsignal
+        Emits when the device reports an input underflow
+    captured: pyqtsignal
+        Emits the number of events waiting to be drained, when
+        an event of a multi-shot capture is captured
     """
     recorddone = pyqtSignal()
     triggered = pyqtSignal()
-    newdata = pyqtSignal()
\ No newline at end of file
+    newdata = pyqtSignal()
+    overflowed = pyqtSignal(int)
+    underflowed = pyqtSignal()
+    captured = pyqtSignal(int)
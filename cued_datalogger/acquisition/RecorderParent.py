@@ -18,11 +18,22 @@ If you have PyQt, it will import RecEmitter for emitting Signals.
 Attributes
 ----------
     QT_EMITTER : Indicates whether you can use qt Signals
+    STATUS_INPUT_UNDERFLOW : Chunk status flag, the device ran out of input
+        data and padded the chunk (same value as PortAudio's paInputUnderflow)
+    STATUS_INPUT_OVERFLOW : Chunk status flag, the device discarded input
+        data before this chunk (same value as PortAudio's paInputOverflow)
+    STATUS_SHORT_READ : Chunk status flag, fewer samples than chunk_size
+        were read from the device
 
 """
 from abc import ABCMeta, abstractmethod
 import numpy as np
-import copy as cp
+
+from cued_datalogger.acquisition.RingBuffer import RingBuffer
+from cued_datalogger.acquisition.StreamWriter import StreamWriter, open_stream_file
+from cued_datalogger.acquisition.ChunkConsumer import ChunkConsumer
+from cued_datalogger.acquisition.TriggerEngine import TriggerEngine
+from cued_datalogger.acquisition.CaptureQueue import CaptureQueue
 
 try:
     from cued_datalogger.acquisition.RecEmitter import RecEmitter
@@ -31,6 +42,9 @@ except Exception as e:
     print(e)
     QT_EMITTER = False
     
+STATUS_INPUT_UNDERFLOW = 0x1
+STATUS_INPUT_OVERFLOW = 0x2
+STATUS_SHORT_READ = 0x100
 
 
 class RecorderParent(object):
@@ -49,12 +63,32 @@ class RecorderParent(object):
         Number of chunks to store in circular buffer
     recording: bool
         Indicate whether to record
+    raw_storage: bool
+        Whether the buffer and recordings keep the raw int16 samples
+        instead of converting them to float
+    full_scale: float
+        Value (in volts) of a full scale int16 sample
+    scale: Numpy Array
+        Per channel factor to convert raw samples to volts
+    offset: Numpy Array
+        Per channel offset (in volts) added after scaling
+    chunk_sequence: int
+        Sequence number to be given to the next chunk from the device
+    rec_gaps: list of tuple
+        Gap map of the current (or last flushed) recording: the position
+        (in samples) of each dropout, and the estimated number of samples
+        missing there (0 if unknown)
+    multishot: bool
+        Indicate whether a multi-shot capture is running
+    capture_queue: CaptureQueue
+        The events of the current (or last) multi-shot capture
     """
     __metaclass__ = ABCMeta
+    full_scale = 1.0
     
 #---------------- INITIALISATION METHODS -----------------------------------    
     def __init__(self,channels = 1,rate = 44100, chunk_size = 1024,
-                 num_chunk = 4):
+                 num_chunk = 4, raw_storage = False):
         """
         Initialise a ciruclar buffer, array and trigger for recording
         
@@ -68,12 +102,21 @@ class RecorderParent(object):
             Number of samples to get from each channel in one chunk
         num_chunk: int
             Number of chunks to store in circular buffer
+        raw_storage: bool
+            Whether to keep the raw int16 samples in the buffer and recordings
         """
+        self._raw_storage = raw_storage
         self.channels = channels
         self.rate = rate
         self.chunk_size = chunk_size
         self.num_chunk = num_chunk;
         self.audio_stream = None #: The audio object
+        self.consumer = None #: The worker processing the chunks
+        self.chunk_listeners = [] #: Functions called with each new chunk
+        self.gap_listeners = [] #: Functions called with each dropout
+        self._slot_idx = None
+        self._spare_chunk = None
+        self.reset_stats()
         
         self.allocate_buffer()
         self.show_stream_settings()
@@ -87,11 +130,22 @@ class RecorderParent(object):
                  
     def allocate_buffer(self):
         """
-        Set up the circular buffer
+        Set up the circular buffer.
+        The buffer is mirrored so that the newest data is always contiguous,
+        self.buffer is a (num_chunk, chunk_size, channels) view of it.
+        The per channel scale and offset are kept if the number of channels
+        has not changed, otherwise they are reset to the full scale
         """
-        self.buffer = np.zeros(shape = (self.num_chunk,
-                                        self.chunk_size,
-                                        self.channels))
+        scale = getattr(self,'scale',None)
+        if scale is None or not len(scale) == self.channels:
+            self.scale = np.full(self.channels, self.full_scale / 2**15)
+            self.offset = np.zeros(self.channels)
+        self.ring = RingBuffer(self.num_chunk * self.chunk_size,
+                               self.channels, dtype = self.storage_dtype,
+                               mirrored = True)
+        self.buffer = self.ring.data.reshape((self.num_chunk,
+                                              self.chunk_size,
+                                              self.channels))
         self.next_chunk = 0;
 
 #---------------- DESTRUCTOR METHODS -----------------------------------     
@@ -103,6 +157,7 @@ class RecorderParent(object):
         Close the audio object, to be called if streaming is no longer needed 
         """
         self.stream_close()
+        self.consumer_stop()
  
 #---------------- DEVICE SETTINGS METHODS -----------------------------------     
     def show_stream_settings(self):
@@ -139,17 +194,376 @@ class RecorderParent(object):
         pass
     
 #---------------- DATA METHODS -----------------------------------
+    @property
+    def storage_dtype(self):
+        """
+        numpy dtype
+            Data type of the buffer and recordings
+        """
+        return np.int16 if self._raw_storage else np.float64
+
     def audiodata_to_array(self,data):
         """
-        Convert audio data obtained into a proper array
+        Convert audio data obtained into a proper array.
+        The raw int16 samples are scaled to volts, unless raw_storage is set
+        
+        Parameters
+        -----------
+        data: bytes or Numpy Array
+            Raw int16 audio data, interleaved by channel
+        """
+        data = np.frombuffer(data, dtype = np.int16).reshape((-1,self.channels))
+        if self._raw_storage:
+            return data
+        return data * self.scale + self.offset
+
+    def to_physical(self,data,dtype = np.float64,channel = None):
+        """
+        Convert data from the buffer or a recording to volts.
+        Float data is already in volts, so it is returned as it is
         
         Parameters
         -----------
         data: Numpy Array
-            Audio data 
+            Data with dimension of samples x channels, or 1D data of one channel
+        dtype: numpy dtype
+            Float type to convert raw data to
+        channel: int
+            Channel of the data, if it is 1D
+        
+        Returns
+        ----------
+        Numpy Array
         """
-        return data.reshape((-1,self.channels))/ 2**15
+        if data.dtype != np.int16:
+            return data
+        if channel is None:
+            scale, offset = self.scale, self.offset
+        else:
+            scale, offset = self.scale[channel], self.offset[channel]
+        out = data.astype(dtype)
+        out *= np.asarray(scale, dtype = dtype)
+        out += np.asarray(offset, dtype = dtype)
+        return out
     
+    def process_chunk(self,raw,sequence = None,timestamp = None,status = 0):
+        """
+        Process one raw chunk from the stream:
+        First, it checks the chunk for dropouts,
+        then writes data to the circular buffer,
+        then record data if it is recording,
+        finally check for any trigger.
+        
+        Parameters
+        -----------
+        raw: bytes or Numpy Array
+            Raw audio data, interleaved by channel
+        sequence: int
+            Sequence number of the chunk
+        timestamp: float
+            Device time (in seconds) of the first sample of the chunk
+        status: int
+            Status flags of the chunk (see the STATUS constants)
+        """
+        data_array = self.audiodata_to_array(raw)
+        gap = self._check_chunk(data_array.shape[0],sequence,timestamp,status)
+        self.write_buffer(data_array)
+
+        if gap is not None:
+            self.last_gap = (self.ring.total_written - data_array.shape[0],gap)
+            if self.recording and self.rec_pos > self.rec_start:
+                self._add_rec_gap(self.rec_pos,gap)
+            for listener in self.gap_listeners:
+                try:
+                    listener(gap)
+                except Exception as e:
+                    print(e)
+
+        for listener,physical in self.chunk_listeners:
+            try:
+                if physical:
+                    listener(self.to_physical(data_array))
+                else:
+                    listener(data_array)
+            except Exception as e:
+                print(e)
+
+        if self.recording:
+            n = self.record_data(data_array)
+            if self.multishot:
+                # Keep the trigger state up to date while capturing, then
+                # check the rest of the chunk once the trigger is re-armed
+                chans = self.trigger_engine.channels
+                self.trigger_engine.check(self.to_physical(data_array[:n,chans],
+                                                           channel = chans))
+            data_array = data_array[n:]
+
+        # Trigger check
+        if self.trigger and data_array.shape[0]:
+            self._trigger_check_threshold(data_array)
+
+    def push_chunk(self,raw,timestamp = None,status = 0):
+        """
+        Hand a raw chunk over from the audio callback, stamped with
+        the next sequence number.
+        If the consumer thread is running, the chunk is only copied into
+        one of its slots, otherwise it is processed straight away.
+        
+        Parameters
+        -----------
+        raw: bytes or Numpy Array
+            Raw audio data, interleaved by channel
+        timestamp: float
+            Device time (in seconds) of the first sample of the chunk
+        status: int
+            Status flags of the chunk (see the STATUS constants)
+        """
+        sequence = self.chunk_sequence
+        self.chunk_sequence += 1
+        if timestamp is None:
+            timestamp = np.nan
+        if self.consumer:
+            self.consumer.put(raw,sequence,timestamp,status)
+        else:
+            self.process_chunk(raw,sequence,timestamp,status)
+
+    def acquire_chunk_slot(self):
+        """
+        Get a preallocated array for the audio callback to read the next
+        raw chunk straight into, instead of allocating one and copying it
+        with push_chunk. It is a slot of the consumer if it is running,
+        a spare array otherwise.
+        Hand it over with commit_chunk_slot, or give it up with
+        drop_chunk_slot.
+        
+        Returns
+        ----------
+        Numpy Array or None
+            1D int16 array of chunk_size * channels values, None if the
+            consumer is full and the chunk has to be dropped
+        """
+        if self.consumer:
+            self._slot_idx = self.consumer.acquire_slot()
+            if self._slot_idx is None:
+                return None
+            return self.consumer.slots[self._slot_idx]
+        self._slot_idx = None
+        size = self.chunk_size * self.channels
+        if self._spare_chunk is None or not self._spare_chunk.shape[0] == size:
+            self._spare_chunk = np.zeros(size,dtype = np.int16)
+        return self._spare_chunk
+
+    def commit_chunk_slot(self,n_values,timestamp = None,status = 0):
+        """
+        Hand over the chunk read into the array from acquire_chunk_slot,
+        stamped with the next sequence number
+        
+        Parameters
+        -----------
+        n_values: int
+            Number of values read (samples read * channels)
+        timestamp: float
+            Device time (in seconds) of the first sample of the chunk
+        status: int
+            Status flags of the chunk (see the STATUS constants)
+        """
+        sequence = self.chunk_sequence
+        self.chunk_sequence += 1
+        if timestamp is None:
+            timestamp = np.nan
+        if self._slot_idx is not None:
+            self.consumer.commit_slot(self._slot_idx,n_values,sequence,timestamp,status)
+            self._slot_idx = None
+        else:
+            self.process_chunk(self._spare_chunk[:n_values],sequence,timestamp,status)
+
+    def drop_chunk_slot(self):
+        """
+        Give up a chunk for which acquire_chunk_slot had no array.
+        Its sequence number is skipped, so the dropout is detected
+        """
+        self.chunk_sequence += 1
+
+    def add_chunk_listener(self,listener,physical = False):
+        """
+        Add a function to be called with each new chunk, from the thread
+        processing the chunks. It must not keep the chunk, as it may be
+        a view into the buffer.
+        
+        Parameters
+        -----------
+        listener: function
+            Called with the chunk, with dimension of samples x channels
+        physical: bool
+            Whether the chunk is converted to volts first, in case the
+            raw int16 samples are kept
+        """
+        self.chunk_listeners = self.chunk_listeners + [(listener,physical)]
+
+    def remove_chunk_listener(self,listener):
+        """
+        Remove a function added with add_chunk_listener
+        
+        Parameters
+        -----------
+        listener: function
+            The function to remove
+        """
+        self.chunk_listeners = [(l,p) for l,p in self.chunk_listeners
+                                if not l == listener]
+
+    def add_gap_listener(self,listener):
+        """
+        Add a function to be called when a dropout is found before a chunk,
+        from the thread processing the chunks. It is called before the
+        chunk listeners get the chunk, e.g. so that they can drop the data
+        they hold from before the dropout
+        
+        Parameters
+        -----------
+        listener: function
+            Called with the estimated number of samples missing (0 if unknown)
+        """
+        self.gap_listeners = self.gap_listeners + [listener]
+
+    def remove_gap_listener(self,listener):
+        """
+        Remove a function added with add_gap_listener
+        
+        Parameters
+        -----------
+        listener: function
+            The function to remove
+        """
+        self.gap_listeners = [l for l in self.gap_listeners if not l == listener]
+
+    def _check_chunk(self,n_samples,sequence,timestamp,status):
+        """
+        Check a chunk for lost data, using its sequence number,
+        timestamp and status flags, and count any dropout
+        
+        Parameters
+        -----------
+        n_samples: int
+            Number of samples in the chunk
+        sequence: int
+            Sequence number of the chunk
+        timestamp: float
+            Device time (in seconds) of the first sample of the chunk
+        status: int
+            Status flags of the chunk
+        
+        Returns
+        ----------
+        int or None
+            None if the chunk follows on from the previous one, otherwise
+            the estimated number of samples missing before it (0 if unknown)
+        """
+        if timestamp is not None and np.isnan(timestamp):
+            timestamp = None
+        gap = None
+        if sequence is not None:
+            if self.last_sequence is not None and sequence > self.last_sequence + 1:
+                lost = sequence - self.last_sequence - 1
+                self.lost_chunks += lost
+                gap = lost * self.chunk_size
+            self.last_sequence = sequence
+
+        if status & STATUS_INPUT_OVERFLOW:
+            self.overflows += 1
+            # Estimate the discarded samples from the device time
+            missing = 0
+            if self.last_timestamp is not None and timestamp is not None:
+                missing = int(round((timestamp - self.last_timestamp) * self.rate)) - self.last_chunk_samples
+            gap = max(gap or 0, missing)
+        if status & STATUS_SHORT_READ:
+            self.short_reads += 1
+
+        if gap is not None:
+            print('Stream dropout: about %i samples lost' % gap)
+            if self.rEmitter:
+                self.rEmitter.overflowed.emit(gap)
+        if status & STATUS_INPUT_UNDERFLOW:
+            # The device padded the chunk, so the data is not continuous
+            self.underflows += 1
+            gap = gap or 0
+            if self.rEmitter:
+                self.rEmitter.underflowed.emit()
+
+        self.last_timestamp = timestamp
+        self.last_chunk_samples = n_samples
+        return gap
+
+    def reset_stats(self):
+        """
+        Reset the chunk sequence numbers and the dropout counters
+        """
+        self.chunk_sequence = 0
+        self.last_sequence = None
+        self.last_timestamp = None
+        self.last_chunk_samples = self.chunk_size
+        self.last_gap = None
+        self.lost_chunks = 0
+        self.overflows = 0
+        self.underflows = 0
+        self.short_reads = 0
+
+    def stats(self):
+        """
+        Get the statistics of the stream
+        
+        Returns
+        ----------
+        dict
+            'chunks': number of chunks received from the device
+            'processed': number of chunks processed
+            'lag': number of chunks waiting to be processed
+            'dropped': number of chunks dropped by the consumer
+            'lost_chunks': number of missing chunk sequence numbers
+            'overflows': number of input overflows reported by the device
+            'underflows': number of input underflows reported by the device
+            'short_reads': number of chunks shorter than chunk_size
+            'last_sequence': sequence number of the last processed chunk
+            'last_timestamp': device time of the last processed chunk
+        """
+        processed = 0 if self.last_sequence is None else self.last_sequence + 1 - self.lost_chunks
+        return {'chunks': self.chunk_sequence,
+                'processed': self.consumer.processed if self.consumer else processed,
+                'lag': self.consumer.lag if self.consumer else 0,
+                'dropped': self.consumer.dropped if self.consumer else 0,
+                'lost_chunks': self.lost_chunks,
+                'overflows': self.overflows,
+                'underflows': self.underflows,
+                'short_reads': self.short_reads,
+                'last_sequence': self.last_sequence,
+                'last_timestamp': self.last_timestamp}
+
+    def consumer_start(self,num_slots = 16):
+        """
+        Start the worker thread which processes the chunks, so that the
+        audio callback only has to copy the raw data
+        
+        Parameters
+        -----------
+        num_slots: int
+            Number of chunks that can wait to be processed
+        """
+        self.consumer_stop()
+        self.reset_stats()
+        self.consumer = ChunkConsumer(self.process_chunk,self.chunk_size,
+                                      self.channels,num_slots = num_slots)
+        self.consumer.start()
+
+    def consumer_stop(self):
+        """
+        Stop the worker thread, after it has processed the waiting chunks
+        """
+        if self.consumer:
+            self.consumer.stop()
+            if self.consumer.dropped:
+                print('%i chunks were dropped by the consumer' % self.consumer.dropped)
+            self.consumer = None
+
 #---------------- BUFFER METHODS -----------------------------------
     def write_buffer(self,data):
         """
@@ -160,12 +574,14 @@ class RecorderParent(object):
         data: Numpy Array
             Audio data 
         """
-        self.buffer[self.next_chunk,:,:] = data
-        self.next_chunk = (self.next_chunk + 1) % self.num_chunk
+        self.ring.write(data)
+        self.next_chunk = (self.ring.cursor // self.chunk_size) % self.num_chunk
      
     def get_buffer(self):
         """
-        Convert the buffer data as a 2D array by stitching the chunks together
+        Get the buffer data as a 2D array, oldest chunk first.
+        No data is copied: the returned array is a view into the buffer,
+        so copy it if it needs to outlive the next chunk
         
         Returns
         ----------
@@ -173,9 +589,24 @@ class RecorderParent(object):
             with dimension of(chunk_size * num_chunk) x channels
             The newest data on the most right 
         """
-        return np.concatenate((self.buffer[self.next_chunk:],self.buffer[:self.next_chunk]),axis = 0) \
-                 .reshape((self.buffer.shape[0] * self.buffer.shape[1],
-                           self.buffer.shape[2]))
+        return self.ring.latest()
+
+    def read_latest(self,n_samples):
+        """
+        Get the newest samples in the buffer without copying them
+        
+        Parameters
+        ----------
+        n_samples: int
+            Number of samples to read
+
+        Returns
+        ----------
+        Buffer data: Numpy Array
+            View with dimension of n_samples x channels
+            The newest data on the most right 
+        """
+        return self.ring.latest(n_samples)
         
 #---------------- RECORDING METHODS -----------------------------------
     def open_recorder(self):
@@ -186,14 +617,21 @@ class RecorderParent(object):
         self.initialised_record = False
         self.next_rec_chunk = 0
         self.total_rec_chunk = 0
-        self.recorded_data = []
+        self.recorded_data = None
+        self.disk_writer = None
+        self.rec_start = 0
+        self.rec_pos = 0
+        self.rec_end = 0
+        self.rec_gaps = []
         
-    def record_init(self,samples = None,duration = 3):
+    def record_init(self,samples = None,duration = 3,pretrig = 0,filename = None):
         """
-        Remove any pretrigger and postrigger data
-        Calculate the number of chunk to record
-        It will record more samples than necessary, then slice down to the
-        amount of samples required + putting in pretrigger data
+        Calculate the number of samples to record and allocate
+        the recording array once, with room for any pretrigger data.
+        Recorded chunks, pretrigger and posttrigger data are then
+        written into it in place.
+        If a filename is given, the recording is streamed to disk instead
+        (see StreamWriter), so it is not limited by the memory.
         
         Parameters
         ----------
@@ -201,21 +639,44 @@ class RecorderParent(object):
             Number of samples to record
         duration: int
             The recording duration
+        pretrig: int
+            Number of pretrigger samples to reserve in front of the recording
+        filename: str
+            Base name of the files to stream the recording to
         """
         if not self._record_check():
             return False
         
-        self.pretrig_data = np.array([],dtype = np.int16)
-        self.part_posttrig_data = np.array([],dtype = np.int16)
         if samples:
             self.actual_rec_samples = samples
             self.total_rec_chunk = (samples // self.chunk_size)+1
-            self.rec_samples = self.total_rec_chunk * self.chunk_size 
         else:
             self.total_rec_chunk = int(duration * self.rate // self.chunk_size)
-            self.rec_samples = self.total_rec_chunk * self.chunk_size 
-            self.actual_rec_samples = self.rec_samples
+            self.actual_rec_samples = self.total_rec_chunk * self.chunk_size 
+        self.rec_samples = self.actual_rec_samples
             
+        self.rec_start = max(0,int(pretrig))
+        self.rec_pos = self.rec_start
+        self.rec_end = self.rec_start + self.actual_rec_samples
+        self.rec_gaps = []
+        if self.multishot:
+            # The events are captured into the blocks of the capture queue
+            self.disk_writer = None
+            self.recorded_data = None
+        elif filename:
+            self.recorded_data = None
+            metadata = {'chunk_size':self.chunk_size,
+                        'pretrig':self.rec_start}
+            if self._raw_storage:
+                metadata['scale'] = self.scale.tolist()
+                metadata['offset'] = self.offset.tolist()
+            self.disk_writer = StreamWriter(filename,self.channels,self.rate,
+                                            dtype = self.storage_dtype,
+                                            metadata = metadata)
+        else:
+            self.disk_writer = None
+            self.recorded_data = np.zeros(shape = (self.rec_end,self.channels),
+                                          dtype = self.storage_dtype)
         self.next_rec_chunk = 0
         
         self.initialised_record = True
@@ -238,12 +699,22 @@ class RecorderParent(object):
             return False
         
         # Check if the previous recorded data is flushed
-        if self.recorded_data:
+        if self._has_record_data():
             print('Please flush your recorded data')
             return False
         
         return True
 
+    def _has_record_data(self):
+        """
+        Returns
+        ----------
+        bool
+            True if there is recorded data waiting to be flushed
+        """
+        return ((self.recorded_data is not None or self.disk_writer is not None)
+                and self.rec_pos > self.rec_start)
+
     # Function to initiate a normal recording
     def record_start(self):
         """
@@ -273,6 +744,9 @@ class RecorderParent(object):
         """
         # Stop the recording
         self.recording = False
+        if self.multishot:
+            self._capture_done()
+            return
         # Give a signal that recording is done
         print('Recording Done! Please flush the data with flush_record_data().')
         if self.rEmitter:
@@ -283,44 +757,91 @@ class RecorderParent(object):
         Cancel a recording and clear any recorder data
         """
         print('Recording Cancel! Recorded data has been discarded!')
+        if self.multishot:
+            self.capture_stop()
         self.trigger = False
         self.recording = False
-        self.recorded_data = []
+        self.recorded_data = None
+        if self.disk_writer:
+            self.disk_writer.close()
+            self.disk_writer = None
+        self.rec_pos = self.rec_start = self.rec_end = 0
            
     def record_data(self,data):
         """
-        Append recorded chunk to recorder_data
-        and stop doing so if neccessary amount of chunks is recorded
+        Write recorded chunk into recorded_data
+        and stop doing so if neccessary amount of samples is recorded.
+        If the disk writer drops the chunk, it is added to the gap map and
+        the recording carries on from the same position, so that the gap map
+        matches the file
+        
+        Parameters
+        -----------
+        data: Numpy Array
+            Audio data, with dimension of samples x channels
+        
+        Returns
+        ----------
+        int
+            Number of samples recorded from the data
         """
-        #data = cp.copy(self.buffer[self.next_chunk-1])
-        self.recorded_data.append(data)
+        n = min(data.shape[0], self.rec_end - self.rec_pos)
+        if self.disk_writer:
+            if not self.disk_writer.write(data[:n]):
+                self._add_rec_gap(self.rec_pos,n)
+                self.next_rec_chunk += 1
+                return n
+        else:
+            self.recorded_data[self.rec_pos:self.rec_pos + n] = data[:n]
+        self.rec_pos += n
         # Check to see whether recording is done
         self.next_rec_chunk += 1
-        if self.next_rec_chunk == self.total_rec_chunk:
+        if self.rec_pos == self.rec_end:
             self._record_stop()
+        return n
           
+    def _add_rec_gap(self,pos,missing):
+        """
+        Add a dropout to the gap map of the recording, merged with the
+        previous one if it is at the same position
+        
+        Parameters
+        -----------
+        pos: int
+            Position (in samples) of the dropout in the recording
+        missing: int
+            Estimated number of samples missing there
+        """
+        if self.rec_gaps and self.rec_gaps[-1][0] == pos:
+            self.rec_gaps[-1] = (pos,self.rec_gaps[-1][1] + missing)
+        else:
+            self.rec_gaps.append((pos,missing))
+
     def flush_record_data(self):
         """
-        Add in any partial posttrigger data
-        Slice the recorded data into the requested amount of samples
-        Add in any pretrigger data
+        Hand over the recorded data, including any pretrigger data.
+        The recording array is returned as it is (no copy is made), and
+        the recorder lets go of it.
+        For a recording streamed to disk, the files are closed and the
+        data is returned as a memory-mapped array.
+        The gap map of the recording stays in rec_gaps (and is written
+        to the header of a disk recording).
         
         Returns
         ----------
         flushed_data: numpy array
             2D numpy array (similar to get_buffer) 
         """
-        if self.recorded_data:
-            data =  np.array(self.recorded_data);
-            flushed_data = data.reshape((self.rec_samples,self.channels))
-            if self.part_posttrig_data.shape[0]:
-                flushed_data = np.vstack((self.part_posttrig_data,flushed_data))
-            
-            flushed_data = flushed_data[:self.actual_rec_samples,:]
-
-            self.recorded_data = []
-            if self.pretrig_data.shape[0]:
-                flushed_data = np.vstack((self.pretrig_data,flushed_data))
+        if self._has_record_data():
+            if self.disk_writer:
+                self.disk_writer.header['gaps'] = [list(g) for g in self.rec_gaps]
+                self.disk_writer.close()
+                flushed_data = open_stream_file(self.disk_writer.filename)
+                self.disk_writer = None
+            else:
+                flushed_data = self.recorded_data[:self.rec_pos]
+                self.recorded_data = None
+            self.rec_pos = self.rec_start = self.rec_end = 0
                 
             print('Data flushed')
             return flushed_data               
@@ -371,14 +892,43 @@ class RecorderParent(object):
         self.trigger = False
         self.trigger_threshold = 0
         self.trigger_channel = 0
+        self.trigger_engine = None
         self.ref_level = 0.08
         self.pretrig_samples = 200
-        self.pretrig_data = np.array([])
-        self.part_posttrig_data = np.array([])
+        self.multishot = False
+        self.capture_queue = None
+        self.capture_block = None
+        self.capture_trigger_sample = 0
         
-    def trigger_start(self,duration = 3, threshold = 0.09, channel = 0,pretrig = 200,posttrig = 5000):
+    def trigger_start(self,duration = 3, threshold = 0.09, channel = 0,pretrig = 200,posttrig = 5000,
+                      filename = None, slope = 'either', hysteresis = 0, logic = 'any'):
         """
-        Start the trigger if possible
+        Start the trigger if possible.
+        The trigger levels are relative to the mean of the newest chunk
+        of each trigger channel.
+        If a filename is given, the triggered recording is streamed to disk
+        
+        Parameters
+        ----------
+        duration: float
+            Not used, the recording length is set by posttrig
+        threshold: float or list of float
+            Trigger level (in volts), for all channels or per channel
+        channel: int or list of int
+            Channel(s) to trigger on
+        pretrig: int
+            Number of samples to keep from before the trigger, up to the
+            buffer length less one chunk
+        posttrig: int
+            Number of samples to record from the trigger
+        filename: str
+            Base name of the files to stream the recording to
+        slope: str
+            'rising', 'falling' or 'either' (see TriggerEngine)
+        hysteresis: float
+            Re-arming hysteresis (in volts)
+        logic: str
+            'any' or 'all' of the trigger channels
         
         Returns
         ----------
@@ -390,14 +940,29 @@ class RecorderParent(object):
             return False
         
         if not self.trigger:
-            if not self.record_init(samples = posttrig):
+            if pretrig > self.max_pretrig:
+                print('Pretrigger is limited to %i samples by the buffer length' % self.max_pretrig)
+                pretrig = self.max_pretrig
+            try:
+                chans = list(np.atleast_1d(channel).astype(int))
+                ref_level = np.mean(self.to_physical(self.ring.latest(self.chunk_size)[:,chans],
+                                                     channel = chans),axis = 0)
+                engine = TriggerEngine(chans,threshold,slope = slope,
+                                       hysteresis = hysteresis,logic = logic,
+                                       reference = ref_level)
+            except Exception as e:
+                print(e)
+                return False
+            if not self.record_init(samples = posttrig, pretrig = pretrig,
+                                    filename = filename):
                 return False
+            self.trigger_engine = engine
             self.trigger = True
             self.trigger_threshold = threshold
             self.trigger_channel = channel
             self.pretrig_samples = pretrig
-            self.ref_level = np.mean(self.buffer[self.next_chunk,:,self.trigger_channel])
-            print('Reference level: %.2f' % self.ref_level)
+            self.ref_level = ref_level[0] if len(chans) == 1 else ref_level
+            print('Reference level: %s' % np.array2string(ref_level,precision = 2))
             print('Trigger Set!')
             return True
         else:
@@ -406,7 +971,7 @@ class RecorderParent(object):
 
     def _trigger_check_threshold(self,data):
         """
-        Check if the trigger is set off
+        Check if the trigger is set off (see TriggerEngine)
         Start recording if so and emit a signal if possible
         
         Parameters
@@ -414,27 +979,169 @@ class RecorderParent(object):
         data: Numpy Array
             data to be analysed
         """
-        trig_data = data[:,self.trigger_channel]
-        norm_data = abs(trig_data - np.mean(trig_data))#- self.ref_level
+        chans = self.trigger_engine.channels
+        pos = self.trigger_engine.check(self.to_physical(data[:,chans],channel = chans))
         
-        maximum = np.amax(norm_data)
-        
-        if maximum > self.trigger_threshold:
+        if pos is not None:
+            if self.multishot and not self._capture_next():
+                # Stay armed, the event is counted as dropped
+                return
             print('Triggered!')
-            pos = np.argmax(norm_data)
             self.recording = True
             self.trigger = False
+            # Copy the pretrigger data straight from the buffer (which already
+            # holds this chunk) into the front of the recording,
+            # then add the rest of the chunk
+            post_samples = data.shape[0] - pos
             try:
-                self.part_posttrig_data =  cp.copy(self.buffer[self.next_chunk-1, pos:,:])
-                temp = np.vstack((self.buffer[self.next_chunk-2,:,:],self.buffer[self.next_chunk-1,:pos,:]))
-                self.pretrig_data = temp[temp.shape[0]-self.pretrig_samples:,:]
+                if self.disk_writer:
+                    # Wait for room rather than drop it, as the file must
+                    # start with the pretrigger data
+                    self.disk_writer.write(self.ring.latest(self.rec_start,
+                                                            skip = post_samples),
+                                           block = True)
+                else:
+                    self.ring.copy_latest(self.recorded_data[:self.rec_start],
+                                          skip = post_samples)
             except Exception as e:
                 print(e)
                 print('Cannot get trigger data')
+                if self.disk_writer:
+                    self.disk_writer.write(np.zeros((self.rec_start,self.channels),
+                                                    dtype = self.storage_dtype),
+                                           block = True)
+            self.capture_trigger_sample = self.ring.total_written - post_samples
+            # Mark any dropout inside the pretrigger data
+            if self.last_gap is not None:
+                pretrig_start = self.capture_trigger_sample - self.rec_start
+                if self.last_gap[0] > pretrig_start:
+                    self.rec_gaps.append((self.last_gap[0] - pretrig_start,
+                                          self.last_gap[1]))
             if self.rEmitter:
                 self.rEmitter.triggered.emit()
+            self.record_data(data[pos:])
             
+#---------------- MULTI-SHOT CAPTURE METHODS -----------------------------------
+    def capture_start(self,posttrig = 5000,pretrig = 200,num_blocks = 16,
+                      threshold = 0.09,channel = 0,slope = 'either',
+                      hysteresis = 0,logic = 'any'):
+        """
+        Start a multi-shot capture: the trigger is re-armed as soon as each
+        event is captured, and the events are put in a queue of
+        preallocated blocks (capture_queue) to be drained by the UI.
+        The 'captured' signal is emitted after each event, if possible.
+        
+        Parameters
+        ----------
+        posttrig: int
+            Number of samples to capture from each trigger
+        pretrig: int
+            Number of samples to keep from before each trigger
+        num_blocks: int
+            Maximum number of events waiting to be drained
+        threshold, channel, slope, hysteresis, logic:
+            Trigger settings, see trigger_start
+        
+        Returns
+        ----------
+        bool
+            True if successful, False otherwise
+        """
+        if self.recording or self.trigger:
+            print('Please finish the recording or trigger before starting a capture.')
+            return False
+        
+        pretrig = min(max(0,int(pretrig)),self.max_pretrig)
+        self.capture_queue = CaptureQueue(num_blocks,pretrig + posttrig,
+                                          self.channels,dtype = self.storage_dtype)
+        self.capture_block = None
+        self.multishot = True
+        if not self.trigger_start(threshold = threshold,channel = channel,
+                                  pretrig = pretrig,posttrig = posttrig,
+                                  slope = slope,hysteresis = hysteresis,
+                                  logic = logic):
+            self.multishot = False
+            return False
+        print('Multi-shot capture armed!')
+        return True
+
+    def capture_stop(self):
+        """
+        Stop a multi-shot capture. An event being captured is discarded,
+        the completed events stay in capture_queue to be drained
+        """
+        self.trigger = False
+        self.recording = False
+        if self.capture_block is not None:
+            self.capture_queue.abort(self.capture_block)
+            self.capture_block = None
+        self.multishot = False
+        self.recorded_data = None
+        self.rec_pos = self.rec_start = self.rec_end = 0
+        if self.capture_queue:
+            print('Capture stopped: %i events captured, %i dropped'
+                  % (self.capture_queue.captured,self.capture_queue.dropped))
+
+    def _capture_next(self):
+        """
+        Point the recording at a free block of the capture queue
+        
+        Returns
+        ----------
+        bool
+            True if a block is free, False if the event is dropped
+        """
+        idx = self.capture_queue.acquire()
+        if idx is None:
+            return False
+        self.capture_block = idx
+        self.recorded_data = self.capture_queue.blocks[idx]
+        self.rec_pos = self.rec_start
+        self.rec_gaps = []
+        return True
+
+    def _capture_done(self):
+        """
+        Queue the captured event, re-arm the trigger
+        and emit a signal if possible
+        """
+        self.capture_queue.commit(self.capture_block,
+                                  self.capture_trigger_sample,self.rec_gaps)
+        self.capture_block = None
+        self.recorded_data = None
+        self.rec_pos = self.rec_start
+        self.trigger = True
+        if self.rEmitter:
+            self.rEmitter.captured.emit(self.capture_queue.pending)
+
 #----------------- DECORATOR METHODS --------------------------------------
+    @property
+    def max_pretrig(self):
+        """
+        int
+            Maximum number of pretrigger samples: the buffer length less
+            the chunk setting off the trigger
+        """
+        return max(0,self.ring.length - self.chunk_size)
+
+    @property
+    def raw_storage(self):
+        """
+        bool
+            Whether the buffer and recordings keep the raw int16 samples.
+            Use to_physical to convert them to volts.
+            The setter method reallocates the buffer
+        """
+        return self._raw_storage
+
+    @raw_storage.setter
+    def raw_storage(self, raw):
+        if getattr(self,'recording',False) or self.trigger:
+            print('Cannot change the storage type while recording')
+            return
+        self._raw_storage = bool(raw)
+        self.allocate_buffer()
+
     @property
     def num_chunk(self):
         """
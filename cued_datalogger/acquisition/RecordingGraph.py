@@ -16,13 +16,12 @@ TRACE_DURATION: float
     Duration before the peak plots decay
 """
 from PyQt5.QtGui import QColor
-from PyQt5.QtCore import Qt, pyqtSignal
+from PyQt5.QtCore import Qt, pyqtSignal, QLineF, QRectF
 
 from cued_datalogger.api.pyqtgraph_extensions import CustomPlotWidget
 
 import pyqtgraph as pg
 import numpy as np
-import math
 
 CHANLVL_FACTOR = 0.1
 TRACE_DECAY = 0.005
@@ -224,6 +223,74 @@ class LiveGraph(pg.PlotWidget):
             self.set_plot_colour(i,QColor(r,g,b))
             self.def_colours.append(QColor(r,g,b))
 
+class MinMaxDecimator(object):
+    """
+    Reduces the data of a plot to the minimum and maximum of each horizontal
+    pixel, so that the plot looks the same but costs the same to draw
+    whatever the number of samples.
+    All the channels are reduced at once, and the output arrays are reused
+    as long as the number of pixels and channels do not change.
+    """
+    def __init__(self):
+        self._key = None
+        self._x_key = None
+        self._x = None
+        self._y = None
+
+    def decimate(self,x,y,n_bins,reuse = True):
+        """
+        Reduce the data to min/max pairs.
+        If there are too few samples, the data is returned as it is.
+        Any samples left over are dropped from the start (the oldest data).
+
+        Parameters
+        ----------
+        x: Numpy Array
+            X data, shared by the channels
+        y: Numpy Array
+            Y data, with dimension of samples x channels
+        n_bins: int
+            Number of pixels to reduce the data to
+        reuse: bool
+            Whether to write into the arrays of the previous call.
+            If False, new arrays are returned
+
+        Returns
+        ----------
+        x_out: Numpy Array
+            Start and end x values of each pixel
+        y_out: Numpy Array
+            Min and max of each pixel, with dimension of 2*n_bins x channels
+        """
+        n = y.shape[0]
+        n_bins = max(1,int(n_bins))
+        if n < 4*n_bins:
+            return x[:n],y
+
+        bin_size = n // n_bins
+        start = n - bin_size*n_bins
+        bin_starts = np.arange(0,n_bins*bin_size,bin_size)
+
+        key = (n_bins,y.shape[1],y.dtype)
+        if reuse and key == self._key:
+            x_out,y_out = self._x,self._y
+        else:
+            x_out = np.empty(2*n_bins)
+            y_out = np.empty((2*n_bins,y.shape[1]),dtype = y.dtype)
+            if reuse:
+                self._key,self._x,self._y,self._x_key = key,x_out,y_out,None
+
+        np.minimum.reduceat(y[start:],bin_starts,axis = 0,out = y_out[0::2])
+        np.maximum.reduceat(y[start:],bin_starts,axis = 0,out = y_out[1::2])
+        # The x values only change with the x data
+        x_key = (id(x),n,x[n-1])
+        if not reuse or x_key != self._x_key:
+            x_out[0::2] = x[start:n:bin_size]
+            x_out[1::2] = x[start+bin_size-1:n:bin_size]
+            if reuse:
+                self._x_key = x_key
+        return x_out,y_out
+
 class TimeLiveGraph(LiveGraph):
     """
     Reimplemented LiveGraph. Displays the time domain plot
@@ -232,6 +299,8 @@ class TimeLiveGraph(LiveGraph):
     ----------
     sig_hold: list of bool
         Contains whether the signal is being held
+    decimator: MinMaxDecimator
+        Reduces the plot data to the width of the plot
     """
     def __init__(self, *args,**kwargs):
         """
@@ -239,6 +308,7 @@ class TimeLiveGraph(LiveGraph):
         """
         super().__init__(*args,**kwargs)
         self.sig_hold = []
+        self.decimator = MinMaxDecimator()
         self.plotItem.setTitle(title="Time Plot", color = 'FFFFFF')
         self.plotItem.setLabel('bottom','Time(s)')
 
@@ -258,6 +328,45 @@ class TimeLiveGraph(LiveGraph):
     def reset_sig_hold(self):
         self.sig_hold = [Qt.Unchecked] * len(self.plotlines)
 
+    def pixel_width(self):
+        """
+        Returns
+        ----------
+        int
+            Width of the plot area in pixels
+        """
+        return max(1,int(self.plotItem.getViewBox().width()))
+
+    def update_lines(self,x,data):
+        """
+        Update all the lines with new data, reduced to min/max pairs
+        per pixel first. Lines with their signal held are aligned to
+        their first zero crossing (upwards) before being reduced.
+
+        Parameters
+        ----------
+        x: Numpy Array
+            X data, shared by the lines
+        data: Numpy Array
+            Y data, with dimension of samples x lines
+        """
+        n_bins = self.pixel_width()
+        x_dec,y_dec = self.decimator.decimate(x,data,n_bins)
+        for i in range(data.shape[1]):
+            if self.sig_hold[i] == Qt.Checked:
+                plotdata = data[:,i]
+                zc = 0
+                avg = np.mean(plotdata)
+                zero_crossings = np.where(np.diff(np.sign(plotdata-avg))>0)[0]
+                if zero_crossings.shape[0]:
+                    zc = zero_crossings[0]+1
+                x_i,y_i = self.decimator.decimate(x[:len(plotdata)-zc],
+                                                  data[zc:,i:i+1],n_bins,
+                                                  reuse = False)
+                self.update_line(i,x = x_i,y = y_i[:,0])
+            else:
+                self.update_line(i,x = x_dec,y = y_dec[:,i])
+
 class FreqLiveGraph(LiveGraph):
     """
     Reimplemented LiveGraph. Displays the frequency domain plot
@@ -271,6 +380,111 @@ class FreqLiveGraph(LiveGraph):
         self.plotItem.setLabel('bottom','Freq(Hz)')
         self.plotItem.disableAutoRange(axis=None)
 
+    def update_lines(self,x,data):
+        """
+        Update all the lines with new data
+
+        Parameters
+        ----------
+        x: Numpy Array
+            X data, shared by the lines
+        data: Numpy Array
+            Y data, with dimension of samples x lines
+        """
+        for i in range(data.shape[1]):
+            self.update_line(i,x = x,y = data[:,i])
+
+
+class PeakBarsItem(pg.GraphicsObject):
+    """
+    A single graphics item drawing a short vertical bar at the peak
+    of each channel, coloured by its value. All the bars are updated
+    with one setData and drawn in one paint, the bars of the same colour
+    with one drawLines call.
+
+    Attributes
+    ----------
+    values: Numpy Array
+        The peak of each channel, the bar of channel i is drawn at y = i
+    half_height: float
+        Half the height of a bar
+    pens: list of QPen
+        The pens for the quantised values, from the colour map
+    """
+    def __init__(self,colourmap,half_height = 0.3,max_value = 1.0,n_colours = 64):
+        """
+        Parameters
+        ----------
+        colourmap: pg.ColorMap
+            Colour of the bars against their value
+        half_height: float
+            Half the height of a bar
+        max_value: float
+            Value at the top of the colour map
+        n_colours: int
+            Number of colours the values are quantised to
+        """
+        super().__init__()
+        self.values = np.zeros(0)
+        self.half_height = half_height
+        self.set_colourmap(colourmap,max_value,n_colours)
+
+    def set_colourmap(self,colourmap,max_value = 1.0,n_colours = 64):
+        """
+        Set the colours of the bars
+
+        Parameters
+        ----------
+        colourmap: pg.ColorMap
+            Colour of the bars against their value
+        max_value: float
+            Value at the top of the colour map
+        n_colours: int
+            Number of colours the values are quantised to
+        """
+        self.max_value = max_value
+        lut = colourmap.getLookupTable(0.0,max_value,n_colours,alpha = False)
+        self.pens = [pg.mkPen(QColor(int(r),int(g),int(b))) for r,g,b in lut]
+        self.update()
+
+    def setData(self,values):
+        """
+        Set the peaks and schedule a repaint
+
+        Parameters
+        ----------
+        values: Numpy Array
+            The peak of each channel
+        """
+        if not self.values.shape == np.shape(values):
+            self.prepareGeometryChange()
+        self.values = np.array(values,dtype = np.float64)
+        self.update()
+
+    def boundingRect(self):
+        """
+        Reimplemented from GraphicsObject.
+        """
+        n = self.values.shape[0]
+        right = max(float(self.values.max()),self.max_value) if n else self.max_value
+        return QRectF(0.0,-self.half_height,right,max(n-1,0) + 2*self.half_height)
+
+    def paint(self,painter,*args):
+        """
+        Reimplemented from GraphicsObject.
+        """
+        n = self.values.shape[0]
+        if not n:
+            return
+        scale = (len(self.pens) - 1) / self.max_value
+        idx = np.clip(np.round(self.values * scale),0,len(self.pens) - 1).astype(int)
+        order = np.argsort(idx,kind = 'stable')
+        bounds = np.flatnonzero(np.diff(idx[order])) + 1
+        for group in np.split(order,bounds):
+            painter.setPen(self.pens[idx[group[0]]])
+            painter.drawLines([QLineF(self.values[i],i - self.half_height,
+                                      self.values[i],i + self.half_height)
+                               for i in group])
 
 class LevelsLiveGraph(LiveGraph):
     """
@@ -281,12 +495,14 @@ class LevelsLiveGraph(LiveGraph):
     thresholdChanged: pyqtSignal
         Emits when the threshold line is moved
         Sends out the value of the threshold
-    peak_plots: list of plotDataItem
-        The lines which indicate the channels' peaks
-    peak_trace: list of float
+    peak_bars: PeakBarsItem
+        The lines which indicate the channels' peaks, in one item
+    peak_trace: Numpy Array
         The values of the channels' peaks
-    trace_counter: list of int
-        Counter for the peak plots before they decay
+    peak_decays: Numpy Array
+        The current decay rate of the channels' peaks
+    trace_counter: Numpy Array
+        Number of chunks since each peak was set, before it decays
     chanlvl_pts: list of plotDataItem
         Rms plots
     chanlvl_bars: list of bool
@@ -307,11 +523,14 @@ class LevelsLiveGraph(LiveGraph):
             The reference of the Recorder
         The rest are passed into LiveGraph
         """
-        self.peak_plots = []
-        self.peak_trace = []
-        self.trace_counter = []
+        self.peak_bars = None
+        self.peak_trace = np.zeros(0)
+        self.peak_decays = np.zeros(0)
+        self.trace_counter = np.zeros(0)
         self.trace_countlimit = 30
-        self.level_colourmap = None
+        val = [0.0,0.5,0.8]
+        colour = np.array([[0,255,0,255],[0,255,0,255],[255,0,0,255]], dtype = np.ubyte)
+        self.level_colourmap = pg.ColorMap(val,colour)
 
         super().__init__(*args,**kwargs)
         self.plotItem.setTitle(title="Channel Levels", color = 'FFFFFF')
@@ -333,11 +552,10 @@ class LevelsLiveGraph(LiveGraph):
         self.threshold_line.sigPositionChanged.connect(self.change_threshold)
         self.plotItem.addItem(self.threshold_line)
 
-        self.reset_channel_peaks(rec)
+        self.peak_bars = PeakBarsItem(self.level_colourmap)
+        self.plotItem.addItem(self.peak_bars)
 
-        val = [0.0,0.5,0.8]
-        colour = np.array([[0,255,0,255],[0,255,0,255],[255,0,0,255]], dtype = np.ubyte)
-        self.level_colourmap = pg.ColorMap(val,colour)
+        self.reset_channel_peaks(rec)
 
     def set_plot_colour(self,num,col):
         """
@@ -351,30 +569,35 @@ class LevelsLiveGraph(LiveGraph):
         self.plot_colours[num] = col
         self.chanlvl_pts.scatter.setBrush(col)
 
-    def set_peaks(self,num,maximum):
+    def set_peaks(self,maximum,chunks = 1):
         """
-        Set the value of the peak plots
+        Set the value of the peak plots of all the channels at once.
+        A peak is held for trace_countlimit chunks, then decays at an
+        increasing rate until a higher maximum comes along
+
         Parameters
         ----------
-        num: int
-            index of the peak to be set
-        maximum: float
-            Instantaneous maximum value of the peak
-        """
-        if self.trace_counter[num]>self.trace_countlimit:
-            self.peak_trace[num] = max(self.peak_trace[num]*math.exp(-self.peak_decays[num]),0)
-            self.peak_decays[num] += TRACE_DECAY
-        self.trace_counter[num] += 1
-
-        if self.peak_trace[num]<maximum:
-            self.peak_trace[num] = maximum
-            self.peak_decays[num] = 0
-            self.trace_counter[num] = 0
-
-        self.peak_plots[num].setData(x = [self.peak_trace[num],self.peak_trace[num]],
-                       y = [(num-0.3), (num+0.3)])
-
-        self.peak_plots[num].setPen(self.level_colourmap.map(self.peak_trace[num]))
+        maximum: Numpy Array
+            Instantaneous maximum value of each channel
+        chunks: int
+            Number of chunks since the last call
+        """
+        n = max(1,int(chunks))
+        # Number of the n chunks in which each peak decays, i.e. those after
+        # its counter goes past the limit
+        k = np.clip(self.trace_counter + n - self.trace_countlimit - 1, 0, n)
+        # Same as k successive decays, with the rate increasing each time
+        decay = k*self.peak_decays + TRACE_DECAY*k*(k-1)/2
+        self.peak_trace = np.maximum(self.peak_trace*np.exp(-decay),0)
+        self.peak_decays += k*TRACE_DECAY
+        self.trace_counter += n
+
+        higher = self.peak_trace < maximum
+        self.peak_trace[higher] = maximum[higher]
+        self.peak_decays[higher] = 0
+        self.trace_counter[higher] = 0
+
+        self.peak_bars.setData(self.peak_trace)
 
     def set_channel_levels(self,value,maximum):
         """
@@ -386,8 +609,8 @@ class LevelsLiveGraph(LiveGraph):
         maximum: float
             Instantaneous maximum value of the plot
         """
-        self.chanlvl_bars.setData(x = value,y = np.arange(len(self.peak_plots)), right = maximum-value,left = value)
-        self.chanlvl_pts.setData(x = value,y = np.arange(len(self.peak_plots)))
+        self.chanlvl_bars.setData(x = value,y = np.arange(len(value)), right = maximum-value,left = value)
+        self.chanlvl_pts.setData(x = value,y = np.arange(len(value)))
 
     def change_threshold(self,arg):
         """
@@ -408,7 +631,7 @@ class LevelsLiveGraph(LiveGraph):
         """
         Reimplemented from LiveGraph.
         """
-        self.plot_colours = [None] * len(self.peak_plots)
+        self.plot_colours = [None] * len(self.peak_trace)
         self.gen_default_colour()
 
     def reset_default_colour(self,chan):
@@ -426,10 +649,10 @@ class LevelsLiveGraph(LiveGraph):
         val = [0.0,0.5,1.0]
         colour = np.array([[255,0,0,255],[0,255,0,255],[0,0,255,255]], dtype = np.ubyte)
         plot_colourmap =  pg.ColorMap(val,colour)
-        c_list = plot_colourmap.getLookupTable(nPts = len(self.peak_plots))
+        c_list = plot_colourmap.getLookupTable(nPts = len(self.peak_trace))
 
         self.def_colours = []
-        for i in range(len(self.peak_plots)):
+        for i in range(len(self.peak_trace)):
             r,g,b = c_list[i]
             #self.plotlines.set_plot_colour(i,QColor(r,g,b),True)
             self.plot_colours[i] = QColor(r,g,b)
@@ -448,11 +671,6 @@ class LevelsLiveGraph(LiveGraph):
         """
         Reset the channel peaks plot
         """
-        for _ in range(len(self.peak_plots)):
-            line = self.peak_plots.pop()
-            line.clear()
-            del line
-
         self.peak_trace = np.zeros(rec.channels)
         self.peak_decays = np.zeros(rec.channels)
         self.trace_counter = np.zeros(rec.channels)
@@ -460,10 +678,7 @@ class LevelsLiveGraph(LiveGraph):
 
         self.threshold_line.setBounds((0,rec.max_value))
 
-        for i in range(rec.channels):
-            self.peak_plots.append(self.plotItem.plot(x = [self.peak_trace[i],self.peak_trace[i]],
-                                                          y = [(i-0.3), (i+0.3)]))
-
+        self.peak_bars.setData(self.peak_trace)
 
         self.plotItem.setRange(xRange = (0,rec.max_value+0.1),yRange = (-0.5, (rec.channels+5-0.5)))
         self.plotItem.setLimits(xMin = -0.1,xMax = rec.max_value+0.1,yMin = -0.5,yMax = (rec.channels+5-0.5))
@@ -13,6 +13,8 @@ NI_DRIVERS: bool
     Indicates whether NIDAQmx drivers and pyDAQmx module are installed
     when attempting to import NIRecorder module
     The module is needed to check on the available National Instrument devices
+AGGREGATE_BACKENDS: list of str
+    Module names of the Recorder backends combined by the Aggregate input
 MAX_SAMPLE: int
     Arbritrary maximum number of samples that can be recorded.
 
@@ -31,6 +33,8 @@ import pyqtgraph as pg
 import functools as fct
 
 import cued_datalogger.acquisition.myRecorder as mR
+import cued_datalogger.acquisition.SimRecorder as SimR
+import cued_datalogger.acquisition.AggregateRecorder as AggR
 try:
     import cued_datalogger.acquisition.NIRecorder as NIR
     NI_drivers = True
@@ -41,6 +45,8 @@ except ImportError:
     print("ImportError: Seems like you don't have pyDAQmx modules")
     NI_drivers = False
 
+# The Aggregate input combines a SoundCard with an NI card, if there is one
+AGGREGATE_BACKENDS = ['myRecorder'] + ['NIRecorder'] * NI_drivers
 MAX_SAMPLE = 1e9
 
 #==========================WIDGET CLASSES================================
@@ -475,7 +481,7 @@ class DevConfigUI(BaseWidget):
         Emits the configuration of the recorder is set
     typebtngroup: QButtonGroup
         Contains the buttons to select source of audio stream
-        Either SoundCard or NI
+        Either SoundCard, NI, Simulated or Aggregate
     config_button: QPushButton
         Confirm the settings and set up the new recorder
     rec: Recorder object
@@ -502,8 +508,12 @@ class DevConfigUI(BaseWidget):
         typelbox = QHBoxLayout(self.typegroup)
         pyaudio_button = QRadioButton('SoundCard',self.typegroup)
         NI_button = QRadioButton('NI',self.typegroup)
+        sim_button = QRadioButton('Simulated',self.typegroup)
+        agg_button = QRadioButton('Aggregate',self.typegroup)
         typelbox.addWidget(pyaudio_button)
         typelbox.addWidget(NI_button)
+        typelbox.addWidget(sim_button)
+        typelbox.addWidget(agg_button)
         pyaudio_button.setChecked(True)
         # Set that to the layout of the group
         self.typegroup.setLayout(typelbox)
@@ -512,6 +522,8 @@ class DevConfigUI(BaseWidget):
         self.typebtngroup = QButtonGroup(self)
         self.typebtngroup.addButton(pyaudio_button)
         self.typebtngroup.addButton(NI_button)
+        self.typebtngroup.addButton(sim_button)
+        self.typebtngroup.addButton(agg_button)
 
         config_form.addRow(self.typegroup)
 
@@ -563,6 +575,10 @@ class DevConfigUI(BaseWidget):
                 rb[0].setChecked(True)
             elif type(self.rec) == NIR.Recorder:
                 rb[1].setChecked(True)
+            elif type(self.rec) == SimR.Recorder:
+                rb[2].setChecked(True)
+            elif type(self.rec) == AggR.Recorder:
+                rb[3].setChecked(True)
                 
             info = [self.rec.rate,self.rec.channels,
                 self.rec.chunk_size,self.rec.num_chunk]
@@ -574,7 +590,8 @@ class DevConfigUI(BaseWidget):
     def display_sources(self):
         """
         Display the available sources from the type of recorder
-        Either SoundCard(myRecorder) or NI(NIRecorder)
+        Either SoundCard(myRecorder), NI(NIRecorder), Simulated(SimRecorder)
+        or Aggregate(AggregateRecorder)
         """
         # Check which type of recorder is selected
         rb = self.typegroup.findChildren(QRadioButton)
@@ -582,6 +599,10 @@ class DevConfigUI(BaseWidget):
             selR = mR.Recorder()
         elif rb[1].isChecked():
             selR = NIR.Recorder()
+        elif rb[2].isChecked():
+            selR = SimR.Recorder()
+        elif rb[3].isChecked():
+            selR = AggR.Recorder(backends = AGGREGATE_BACKENDS)
         else:
             return
 
@@ -610,7 +631,8 @@ class DevConfigUI(BaseWidget):
     def read_device_config(self):
         """
         Display the available sources from the type of recorder
-        Either SoundCard(myRecorder) or NI(NIRecorder)
+        Either SoundCard(myRecorder), NI(NIRecorder), Simulated(SimRecorder)
+        or Aggregate(AggregateRecorder)
 
         Returns
         ----------
@@ -637,6 +659,10 @@ class DevConfigUI(BaseWidget):
             recType = mR
         elif recType[1]:
             recType = NIR
+        elif recType[2]:
+            recType = SimR
+        elif recType[3]:
+            recType = AggR
         return(recType, configs)
 
 #-----------------------------STATUS WIDGET-------------------------------
@@ -648,9 +674,14 @@ class StatusUI(BaseWidget):
         * Button to reset the splitters
         * Button to resume/pause the stream
         * Button to grab a snapshot of the stream
+        * ComboBox to select the live spectrum averaging
+        * Label showing the frame rate and plot timings
 
     Attributes
     ----------
+    spectrumModeChanged: pyqtsignal
+        Emits when the live spectrum averaging is changed
+        Sends out the name of the averaging
     statusbar: QStatusBar
         Displays the status of the stream
     resetView: QPushButton
@@ -659,7 +690,13 @@ class StatusUI(BaseWidget):
         Resume/pause the stream
     sshotbtn: List of widgets
         Grab a snapshot of the stream
+    spectrum_box: QComboBox
+        Select the live spectrum averaging
+    render_label: QLabel
+        Displays the frame rate and the time taken by each plot
     """
+    spectrumModeChanged = pyqtSignal(str)
+
     def initUI(self):
         """
         Reimplemented from BaseWidget.
@@ -680,6 +717,39 @@ class StatusUI(BaseWidget):
         self.sshotbtn = QPushButton('Get Snapshot',self)
         self.sshotbtn.resize(self.sshotbtn.sizeHint())
         stps_layout.addWidget(self.sshotbtn)
+        self.spectrum_box = QComboBox(self)
+        self.spectrum_box.addItems(['Buffer FFT','Exp. Avg.','Lin. Avg.','Peak Hold'])
+        self.spectrum_box.currentTextChanged.connect(self.spectrumModeChanged.emit)
+        stps_layout.addWidget(self.spectrum_box)
+        self.render_label = QLabel('FPS: -',self)
+        stps_layout.addWidget(self.render_label)
+
+    def get_spectrum_mode(self):
+        """
+        Returns
+        ----------
+        str
+            Current text of spectrum_box
+        """
+        return self.spectrum_box.currentText()
+
+    def set_render_stats(self,fps,timings):
+        """
+        Display the frame rate and the time taken by each plot
+
+        Parameters
+        ----------
+        fps: float
+            Measured number of frames per second
+        timings: dict
+            Average time (in seconds) taken by each plot, see
+            RenderScheduler.timings
+        """
+        text = 'FPS: %.1f' % fps
+        for name,label in (('time','T'),('freq','F'),('levels','L')):
+            if name in timings:
+                text += ' %s: %.1fms' % (label,timings[name]*1000)
+        self.render_label.setText(text)
 
     def trigger_message(self):
         """
@@ -687,6 +757,20 @@ class StatusUI(BaseWidget):
         """
         self.statusbar.showMessage('Triggered! Recording...')
 
+    def dropout_message(self,missing):
+        """
+        Display a message when stream data is lost
+
+        Parameters
+        ----------
+        missing: int
+            Estimated number of missing samples (0 if unknown)
+        """
+        if missing:
+            self.statusbar.showMessage('Stream dropout! About %i samples lost' % missing,3000)
+        else:
+            self.statusbar.showMessage('Stream dropout!',3000)
+
 #-----------------------------RECORDING WIDGET-------------------------------
 class RecUI(BaseWidget):
     """
@@ -699,6 +783,7 @@ class RecUI(BaseWidget):
         * Additional widgets for specific recording mode:
             * Normal: None
             * Average transfer function: Buttons to undo or clear past autospectrum and crossspectrum
+            * Multi-shot: Number of capture blocks, and the captured/dropped event counts
 
     Attributes
     ----------
@@ -719,6 +804,8 @@ class RecUI(BaseWidget):
         Contains the additional settings
     input_chan_box: QComboBox
         Additional settings to put input channel for average transfer function calculation
+    blocks_box: QLineEdit
+        Additional settings to put the number of capture blocks for multi-shot capture
     """
     startRecording = pyqtSignal()
     cancelRecording = pyqtSignal()
@@ -744,7 +831,7 @@ class RecUI(BaseWidget):
         rec_settings_layout.addWidget(self.spec_settings_widget)
 
         self.switch_rec_box = QComboBox(self)
-        self.switch_rec_box.addItems(['Normal','TF Avg.','TF Grid','<something>'])
+        self.switch_rec_box.addItems(['Normal','TF Avg.','TF Grid','Multi-shot'])
         self.switch_rec_box.currentIndexChanged.connect(self.spec_settings_widget.setCurrentIndex)
         global_settings_layout.addRow(QLabel('Mode',self),self.switch_rec_box)
 
@@ -770,7 +857,7 @@ class RecUI(BaseWidget):
         # Connect the sample and time input check
         self.rec_boxes[0].editingFinished.connect(lambda: self.autoset_record_config('Samples'))
         self.rec_boxes[1].editingFinished.connect(lambda: self.autoset_record_config('Time'))
-        self.rec_boxes[2].editingFinished.connect(lambda: set_input_limits(self.rec_boxes[2],-1,self.rec.chunk_size,int))
+        self.rec_boxes[2].editingFinished.connect(lambda: set_input_limits(self.rec_boxes[2],-1,self.max_pretrig(),int))
         self.rec_boxes[2].textEdited.connect(self.toggle_trigger)
 
         self.normal_rec = QWidget(self)
@@ -790,6 +877,17 @@ class RecUI(BaseWidget):
         #avg_layout.addWidget(self.avg_input_box)
         avg_layout.addWidget(self.avg_count_box)
         tfavg_settings.addRow(QLabel('Averages',self),avg_layout)
+        self.tf_weighting_box = QComboBox(self)
+        self.tf_weighting_box.addItems(['Linear','Exponential'])
+        tfavg_settings.addRow(QLabel('Weighting',self),self.tf_weighting_box)
+        # Continuous averaging of overlapped segments from the stream
+        continuous_layout = QHBoxLayout()
+        self.tf_continuous_box = QCheckBox('Continuous',self)
+        continuous_layout.addWidget(self.tf_continuous_box)
+        self.tf_target_box = QLineEdit('200',self)
+        self.tf_target_box.setValidator(QIntValidator(1,100000))
+        continuous_layout.addWidget(self.tf_target_box)
+        tfavg_settings.addRow(QLabel('Target',self),continuous_layout)
         tfavg_rec_layout.addLayout(tfavg_settings)
         # Buttons for average transfer function
         tflog_btn_layout = QHBoxLayout()
@@ -809,11 +907,15 @@ class RecUI(BaseWidget):
         tfgrid_rec_layout.addWidget(QLabel('Nothing is here :(',self))
         self.spec_settings_widget.addWidget(self.tfgrid_rec)
 
-        # Placeholder
-        self.something_rec = QWidget(self)
-        something_rec_layout = QVBoxLayout(self.something_rec)
-        something_rec_layout.addWidget(QLabel('<something is here>',self))
-        self.spec_settings_widget.addWidget(self.something_rec)
+        # Widgets for multi-shot capture
+        self.multishot_rec = QWidget(self)
+        multishot_settings = QFormLayout(self.multishot_rec)
+        self.blocks_box = QLineEdit('16',self)
+        self.blocks_box.setValidator(QIntValidator(1,1024))
+        multishot_settings.addRow(QLabel('Blocks',self),self.blocks_box)
+        self.capture_count_box = QLabel('Captured: 0 Dropped: 0',self)
+        multishot_settings.addRow(QLabel('Events',self),self.capture_count_box)
+        self.spec_settings_widget.addWidget(self.multishot_rec)
 
         # Add the record and cancel buttons
         rec_btn_layout = QHBoxLayout(self.normal_rec)
@@ -919,16 +1021,75 @@ class RecUI(BaseWidget):
         self.rec_boxes[3].addItems([str(i) for i in range(self.rec.channels)])
 
         validators = [QDoubleValidator(0.1,MAX_SAMPLE*self.rec.rate,1),
-                     QIntValidator(-1,self.rec.chunk_size)]
+                     QIntValidator(-1,self.max_pretrig())]
         for cbox,vd in zip(self.rec_boxes[1:-2],validators):
             cbox.setValidator(vd)
 
+    def max_pretrig(self):
+        """
+        Returns
+        ----------
+        int
+            Maximum number of pretrigger samples, see RecorderParent.max_pretrig
+        """
+        return self.rec.max_pretrig
+
+    def get_tf_weighting(self):
+        """
+        Returns
+        ----------
+        str
+            Weighting of the transfer function average,
+            see TransferFunctionAverager.weighting
+        """
+        return self.tf_weighting_box.currentText().lower()
+
+    def get_tf_continuous(self):
+        """
+        Returns
+        ----------
+        bool
+            Whether the transfer function is averaged continuously from
+            the stream, rather than from separate recordings
+        """
+        return self.tf_continuous_box.isChecked()
+
+    def get_tf_target(self):
+        """
+        Returns
+        ----------
+        int
+            Number of averages to take in continuous mode
+        """
+        try:
+            return max(1,int(self.tf_target_box.text()))
+        except ValueError:
+            return 200
+
     def update_TFavg_count(self,val):
         """
         Update the value of the number of recordings for average transfer function
         """
         self.avg_count_box.setText('Count: %i' % val)
 
+    def get_capture_blocks(self):
+        """
+        Returns
+        ----------
+        int
+            Number of capture blocks for multi-shot capture
+        """
+        try:
+            return int(self.blocks_box.text())
+        except ValueError:
+            return 16
+
+    def update_capture_count(self,captured,dropped):
+        """
+        Update the number of captured and dropped events of multi-shot capture
+        """
+        self.capture_count_box.setText('Captured: %i Dropped: %i' % (captured,dropped))
+
     def toggle_trigger(self,string):
         """
         Enable or disable the trigger settings
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""
+This module contains the scheduler pacing the redraws of the live plots
+in the acquisition window, independently of the chunk rate.
+
+The plot timer of the window ticks at the frame rate, and asks the
+scheduler at each tick whether to draw a frame. A frame which takes
+longer than the frame period causes the following ticks to be skipped,
+instead of piling up and starving the event loop. Each plot is only
+redrawn when its data has changed since its last redraw, e.g. when new
+chunks have been written to the buffer.
+
+The scheduler also measures the frame rate and the time taken by each
+plot, averaged over the recent frames.
+
+Example:
+    | >>>render = RenderScheduler(fps = 30)
+    | >>>if render.begin_frame():
+    | ...    if render.changed('time',ring.total_written):
+    | ...        with render.timed('time'):
+    | ...            timeplot.update_lines(x,data)
+    | ...    if render.end_frame():
+    | ...        print(render.fps, render.timings)
+
+Attributes
+----------
+TIMING_SMOOTHING: float
+    Weight of the newest frame in the averaged timings, from 0 to 1
+"""
+import contextlib
+import math
+import time
+
+TIMING_SMOOTHING = 0.1
+
+class RenderScheduler(object):
+    """
+    Frame pacing and timing of the live plots
+
+    Attributes
+    ----------
+    fps: float
+        Maximum number of frames per second
+    period: float
+        Time between two frames (in seconds)
+    measured_fps: float
+        Number of frames drawn per second, measured over the last
+        report interval
+    timings: dict
+        Average time (in seconds) taken by each timed part of a frame,
+        and by the whole frame ('frame')
+    frames: int
+        Number of frames drawn
+    skipped: int
+        Number of ticks skipped because a frame overran
+    """
+    def __init__(self,fps = 30,report_interval = 1.0):
+        """
+        Parameters
+        ----------
+        fps: float
+            Maximum number of frames per second
+        report_interval: float
+            Time (in seconds) over which the frame rate is measured
+        """
+        self.report_interval = report_interval
+        self.set_fps(fps)
+        self.reset()
+
+    def set_fps(self,fps):
+        """
+        Set the maximum frame rate
+
+        Parameters
+        ----------
+        fps: float
+            Maximum number of frames per second
+        """
+        self.fps = max(1.0,float(fps))
+        self.period = 1 / self.fps
+
+    @property
+    def interval(self):
+        """
+        int
+            Interval (in ms) to start the plot timer with
+        """
+        return max(1,int(round(1000 * self.period)))
+
+    def reset(self):
+        """
+        Clear the timings and the data versions, so that all plots
+        are redrawn on the next frame
+        """
+        self.versions = {}
+        self.timings = {}
+        self.measured_fps = 0.0
+        self.frames = 0
+        self.skipped = 0
+        self.next_frame = 0.0
+        self._frame_start = None
+        self._report_start = None
+        self._report_frames = 0
+
+    def invalidate(self,*args):
+        """
+        Force all the plots to be redrawn on the next frame,
+        e.g. when their settings change.
+        Any argument is ignored, so it can be connected to any signal
+        """
+        self.versions = {}
+
+#---------------- FRAME METHODS -----------------------------------
+    def begin_frame(self,now = None):
+        """
+        Start a frame, unless the previous frame overran into this tick
+
+        Parameters
+        ----------
+        now: float
+            Current time (in seconds, time.perf_counter by default)
+
+        Returns
+        ----------
+        bool
+            True if the frame should be drawn
+        """
+        if now is None:
+            now = time.perf_counter()
+        if now < self.next_frame:
+            self.skipped += 1
+            return False
+        self._frame_start = now
+        if self._report_start is None:
+            self._report_start = now
+        return True
+
+    def changed(self,name,version):
+        """
+        Check whether the data of a plot has changed since its last redraw,
+        and note the new version if so
+
+        Parameters
+        ----------
+        name: str
+            Name of the plot
+        version: object
+            Anything which changes with the data,
+            e.g. the number of samples written to the buffer
+
+        Returns
+        ----------
+        bool
+            True if the plot should be redrawn
+        """
+        if name in self.versions and self.versions[name] == version:
+            return False
+        self.versions[name] = version
+        return True
+
+    @contextlib.contextmanager
+    def timed(self,name):
+        """
+        Context manager timing a part of the frame
+
+        Parameters
+        ----------
+        name: str
+            Name of the part, e.g. of the plot
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._add_timing(name,time.perf_counter() - start)
+
+    def _add_timing(self,name,duration):
+        """
+        Add a duration to the averaged timings
+
+        Parameters
+        ----------
+        name: str
+            Name of the timed part
+        duration: float
+            Time taken (in seconds)
+        """
+        if name in self.timings:
+            self.timings[name] += TIMING_SMOOTHING * (duration - self.timings[name])
+        else:
+            self.timings[name] = duration
+
+    def end_frame(self,now = None):
+        """
+        Finish a frame. If it overran the frame period, the ticks
+        until the next free frame slot are skipped
+
+        Parameters
+        ----------
+        now: float
+            Current time (in seconds, time.perf_counter by default)
+
+        Returns
+        ----------
+        bool
+            True if a new frame rate measurement is available
+        """
+        if self._frame_start is None:
+            return False
+        if now is None:
+            now = time.perf_counter()
+        duration = now - self._frame_start
+        self._add_timing('frame',duration)
+        # Slightly early, so that a timer tick just before the slot counts
+        slots = max(1,math.ceil(duration / self.period))
+        self.next_frame = self._frame_start + (slots - 0.5) * self.period
+        self._frame_start = None
+        self.frames += 1
+        self._report_frames += 1
+
+        elapsed = now - self._report_start
+        if elapsed >= self.report_interval:
+            self.measured_fps = self._report_frames / elapsed
+            self._report_start = now
+            self._report_frames = 0
+            return True
+        return False
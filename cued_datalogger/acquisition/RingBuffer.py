@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+This module contains the circular buffer used by the Recorder classes to
+hold the most recent stream data.
+
+The buffer keeps a write cursor instead of shuffling the data around, so
+reading the newest samples only returns views into the storage. With the
+mirrored layout, every sample is written twice (once in each half of the
+storage), which makes the newest window of any length one contiguous slice.
+
+Example:
+    | >>>from cued_datalogger.acquisition.RingBuffer import RingBuffer
+    | >>>ring = RingBuffer(4096, channels = 2, mirrored = True)
+    | >>>ring.write(chunk)
+    | >>>latest = ring.latest(1024)
+"""
+import numpy as np
+
+class RingBuffer(object):
+    """
+    A circular buffer of multi-channel samples with a write cursor
+
+    Attributes
+    ----------
+    length: int
+        Number of samples (per channel) stored in the buffer
+    channels: int
+        Number of channels
+    mirrored: bool
+        Whether each sample is also written to a mirror copy of the buffer,
+        so that the newest samples are always contiguous
+    cursor: int
+        Index of the next sample to be written
+    total_written: int
+        Number of samples written since the buffer was allocated or reset
+    storage: Numpy Array
+        The underlying array, with dimension of length x channels
+        (2*length x channels if mirrored)
+    """
+    def __init__(self,length,channels = 1,dtype = np.float64,mirrored = False):
+        """
+        Allocate the buffer
+
+        Parameters
+        ----------
+        length: int
+            Number of samples (per channel) to store
+        channels: int
+            Number of channels
+        dtype: numpy dtype
+            Data type of the stored samples
+        mirrored: bool
+            Whether to keep a mirror copy of the buffer
+        """
+        self.length = max(1,int(length))
+        self.channels = max(1,int(channels))
+        self.dtype = np.dtype(dtype)
+        self.mirrored = mirrored
+        rows = 2*self.length if mirrored else self.length
+        self.storage = np.zeros(shape = (rows,self.channels),dtype = self.dtype)
+        self.reset()
+
+    def reset(self):
+        """
+        Zero the buffer and move the cursor back to the start
+        """
+        self.storage[:] = 0
+        self.cursor = 0
+        self.total_written = 0
+
+    @property
+    def data(self):
+        """
+        Numpy Array
+            View of the primary (non-mirrored) storage, in storage order
+        """
+        return self.storage[:self.length]
+
+    def write(self,data):
+        """
+        Write samples into the buffer and advance the cursor.
+        If more samples than the buffer length are given, only the newest
+        samples are kept.
+
+        Parameters
+        ----------
+        data: Numpy Array
+            Samples with dimension of n x channels
+        """
+        n = data.shape[0]
+        if n > self.length:
+            data = data[n-self.length:]
+            self.cursor = (self.cursor + n - self.length) % self.length
+            self.total_written += n - self.length
+            n = self.length
+
+        start = self.cursor
+        first = min(n, self.length - start)
+        self.storage[start:start+first] = data[:first]
+        self.storage[:n-first] = data[first:]
+        if self.mirrored:
+            self.storage[self.length+start:self.length+start+first] = data[:first]
+            self.storage[self.length:self.length+n-first] = data[first:]
+
+        self.cursor = (start + n) % self.length
+        self.total_written += n
+
+    def read_latest(self,n_samples = None,skip = 0):
+        """
+        Get the newest samples without copying them
+
+        Parameters
+        ----------
+        n_samples: int
+            Number of samples to read. Reads the whole buffer if None
+        skip: int
+            Number of the very newest samples to leave out, i.e. the
+            returned samples end *skip* samples before the cursor
+
+        Returns
+        ----------
+        views: tuple of Numpy Array
+            One view if the samples are contiguous in storage (always the
+            case when mirrored), otherwise two views: the older samples
+            followed by the newer ones
+        """
+        if n_samples is None:
+            n_samples = self.length - skip
+        if n_samples < 0 or n_samples + skip > self.length:
+            raise ValueError('Cannot read %i samples (skipping %i) from a '
+                             'buffer of length %i' % (n_samples,skip,self.length))
+
+        end = self.cursor - skip
+        if end < 0:
+            end += self.length
+        start = end - n_samples
+        if start >= 0:
+            return (self.storage[start:end],)
+        elif self.mirrored:
+            return (self.storage[start+self.length:end+self.length],)
+        else:
+            return (self.storage[start+self.length:],self.storage[:end])
+
+    def latest(self,n_samples = None,skip = 0):
+        """
+        Get the newest samples as one array.
+        This is a view into the buffer if the samples are contiguous,
+        otherwise the (at most) n_samples are copied into a new array
+
+        Parameters
+        ----------
+        n_samples: int
+            Number of samples to read. Reads the whole buffer if None
+        skip: int
+            Number of the very newest samples to leave out
+
+        Returns
+        ----------
+        Numpy Array
+            with dimension of n_samples x channels
+            The newest data on the most right
+        """
+        views = self.read_latest(n_samples,skip)
+        if len(views) == 1:
+            return views[0]
+        return np.concatenate(views,axis = 0)
+
+    def copy_latest(self,out,skip = 0):
+        """
+        Copy the newest samples into a preallocated array
+
+        Parameters
+        ----------
+        out: Numpy Array
+            Destination array, the number of rows sets how many samples
+            are copied
+        skip: int
+            Number of the very newest samples to leave out
+
+        Returns
+        ----------
+        out: Numpy Array
+        """
+        pos = 0
+        for view in self.read_latest(out.shape[0],skip):
+            out[pos:pos+view.shape[0]] = view
+            pos += view.shape[0]
+        return out
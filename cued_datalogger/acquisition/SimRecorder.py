@@ -0,0 +1,346 @@
+# -*- coding: utf-8 -*-
+"""
+This module contains the class to record data from a simulated source.
+It needs no hardware: the signals are generated (or replayed from a file)
+by a timer thread, which calls the stream callback at the sample rate
+and chunk size of the recorder, just like a real device would.
+It is meant for testing and benchmarking the acquisition pipeline.
+
+The 'devices' are the signal types:
+    * Sine: a sine wave on each channel, channel n at (n+1) times the frequency
+    * Noise: gaussian white noise
+    * Impulse: decaying sine responses to regular impulses (like hammer hits)
+    * Sweep: a repeating linear sine sweep
+    * Replay: loops over the data of a .wav or DataLogger .mat file
+      (see set_replay_file)
+
+Typical example of using the module:
+    | >>>import SimRecorder as SimR
+    | >>>recorder = SimR.Recorder(channels = 4, device_name = 'Sweep')
+    | Channels: 4
+    | Rate: 44100
+    | Chunk size: 1024
+    | Number of chunks: 4
+    | You are using a simulated source for recording
+    | Selected device: Sweep
+    | >>>recorder.stream_init()
+    | True
+    | >>>recorder.record_init()
+    | Recording function is ready! Use record_start() to start
+    | True
+    | >>>recorder.record_start()
+    | stream already started
+    | Recording Start!
+    | True
+    | >>>Recording Done! Please flush the data with flush_record_data().
+    | data = recorder.flush_record_data()
+    | >>>recorder.close()
+
+Attributes
+----------
+SIGNAL_TYPES: list of str
+    The available signal types
+"""
+from cued_datalogger.acquisition.RecorderParent import RecorderParent
+
+import threading
+import time
+
+import numpy as np
+import scipy.io as sio
+import scipy.io.wavfile as wavfile
+
+SIGNAL_TYPES = ['Sine','Noise','Impulse','Sweep','Replay']
+
+class Recorder(RecorderParent):
+    """
+    Sets up the recording stream from a simulated source
+
+    Attributes
+    ----------
+    device_name: str
+        The signal type to be generated
+    signal_params: dict
+        The parameters of the signals:
+            'amplitude': peak value (V)
+            'frequency': base frequency (Hz) of Sine and Impulse
+            'noise': standard deviation (V) of the noise added to any signal
+            'impulse_rate': number of impulses per second
+            'decay': decay rate (1/s) of the impulse responses
+            'sweep_start', 'sweep_end': frequency range (Hz) of the sweep
+            'sweep_duration': duration (s) of one sweep
+    realtime: bool
+        Whether to pace the chunks at the sample rate. If False, the chunks
+        are generated as fast as possible
+    replay_data: Numpy Array
+        The data being replayed, with dimension of samples x channels
+    max_value: float
+        Maximum value of recorded data
+    """
+#---------------- INITIALISATION METHODS -----------------------------------
+    def __init__(self,channels = 1,rate = 44100, chunk_size = 1024,
+                 num_chunk = 4,device_name = None, realtime = True):
+        """
+        Re-implemented from RecorderParent
+        """
+        super().__init__(channels = channels,rate = rate,
+             chunk_size = chunk_size,num_chunk = num_chunk)
+        print('You are using a simulated source for recording')
+
+        self.signal_params = {'amplitude': 0.5,
+                              'frequency': 440.0,
+                              'noise': 0.01,
+                              'impulse_rate': 2.0,
+                              'decay': 20.0,
+                              'sweep_start': 20.0,
+                              'sweep_end': rate/2,
+                              'sweep_duration': 2.0}
+        self.realtime = realtime
+        self.replay_data = None
+        self.replay_file = None
+        self.sample_count = 0
+        self.random = np.random.RandomState(0)
+
+        self._streaming = threading.Event()
+        self._closing = threading.Event()
+
+        self.device_name = None
+        self.set_device_by_name(str(device_name))
+
+        self.open_recorder()
+        self.trigger_init()
+
+        self.max_value = 1;
+
+#---------------- DEVICE SETTING METHODS -----------------------------------
+    def set_device_by_name(self, name):
+        """
+        Set the signal type by name.
+        Revert to Sine if no such type, or if there is no file to replay.
+
+        Parameters
+        ----------
+        name: str
+            Name of the signal type
+        """
+        if name == 'Replay' and self.replay_data is None:
+            print('No file to replay, use set_replay_file first')
+            name = None
+        if not name in SIGNAL_TYPES:
+            name = SIGNAL_TYPES[0]
+        self.device_name = name
+        print('Selected device: %s' % self.device_name)
+
+    def available_devices(self):
+        """
+        Get the signal types that can be generated
+
+        Returns
+        ----------
+        names: List of str
+            Name of the signal types
+        descriptions: List of str
+            Description of the signal types
+        """
+        names = SIGNAL_TYPES[:-1]
+        descriptions = ['Simulated'] * len(names)
+        if self.replay_data is not None:
+            names = names + ['Replay']
+            descriptions.append(str(self.replay_file))
+        return(names,descriptions)
+
+    def current_device_info(self):
+        """
+        Prints information about the current signal
+        """
+        print('Signal: %s' % self.device_name)
+        for key,value in self.signal_params.items():
+            print('%s: %s' % (key,value))
+        if self.device_name == 'Replay':
+            print('Replaying: %s (%i samples)' % (self.replay_file,
+                                                  self.replay_data.shape[0]))
+
+    def set_replay_file(self, filename):
+        """
+        Load a file to replay and select the Replay signal.
+        The file channels are repeated, if needed, to match the recorder.
+
+        Parameters
+        ----------
+        filename: str
+            Either a .wav file, or a DataLogger .mat file (with 'indata')
+        """
+        if filename.endswith('.wav'):
+            file_rate, data = wavfile.read(filename)
+            if data.dtype == np.int16:
+                data = data / 2**15
+            elif data.dtype == np.int32:
+                data = data / 2**31
+        else:
+            mat = sio.loadmat(filename)
+            file_rate = mat['freq'][0][0]
+            data = mat['indata']
+
+        data = np.asarray(data,dtype = np.float64)
+        if data.ndim == 1:
+            data = data.reshape((-1,1))
+        if not file_rate == self.rate:
+            print('Replay file sampled at %i Hz, it will be replayed at %i Hz'
+                  % (file_rate,self.rate))
+
+        reps = -(-self.channels // data.shape[1])
+        self.replay_data = np.tile(data,(1,reps))[:,:self.channels]
+        self.replay_file = filename
+        self.set_device_by_name('Replay')
+
+#---------------- SIGNAL METHODS -----------------------------------
+    def generate_signal(self,n_samples):
+        """
+        Generate the next samples of the selected signal, carrying on from
+        the previous call
+
+        Parameters
+        ----------
+        n_samples: int
+            Number of samples (per channel) to generate
+
+        Returns
+        ----------
+        signal: Numpy Array
+            Signal in volts, with dimension of n_samples x channels
+        """
+        p = self.signal_params
+        n = self.sample_count + np.arange(n_samples)
+        t = (n / self.rate).reshape((-1,1))
+        harmonics = np.arange(1,self.channels+1)
+        shape = (n_samples,self.channels)
+
+        if self.device_name == 'Sine':
+            signal = p['amplitude'] * np.sin(2*np.pi*p['frequency']*harmonics*t)
+        elif self.device_name == 'Noise':
+            signal = self.random.normal(0,p['amplitude']/3,shape)
+        elif self.device_name == 'Impulse':
+            period = max(1,int(self.rate / p['impulse_rate']))
+            t_hit = ((n % period) / self.rate).reshape((-1,1))
+            signal = (p['amplitude'] * np.exp(-p['decay']*t_hit)
+                      * np.sin(2*np.pi*p['frequency']*harmonics*t_hit))
+        elif self.device_name == 'Sweep':
+            T = p['sweep_duration']
+            t_sweep = t % T
+            phase = 2*np.pi*(p['sweep_start']*t_sweep +
+                             (p['sweep_end']-p['sweep_start'])*t_sweep**2/(2*T))
+            signal = p['amplitude'] * np.sin(phase) * np.ones(shape)
+        elif self.device_name == 'Replay':
+            signal = self.replay_data[n % self.replay_data.shape[0]]
+        else:
+            signal = np.zeros(shape)
+
+        if p['noise']:
+            signal = signal + self.random.normal(0,p['noise'],shape)
+
+        self.sample_count += n_samples
+        return signal
+
+    def generate_chunk(self):
+        """
+        Generate the next chunk, as the raw int16 data a device would give
+
+        Returns
+        ----------
+        Numpy Array
+            int16 data of chunk_size x channels, interleaved by channel
+        """
+        signal = self.generate_signal(self.chunk_size) * (2**15 / self.full_scale)
+        np.clip(signal,-2**15,2**15-1,out = signal)
+        return signal.astype(np.int16).ravel()
+
+#---------------- STREAMING METHODS -----------------------------------
+    def stream_audio_callback(self,in_data,timestamp = None):
+        """
+        Callback function for audio streaming.
+        It only hands the raw data over to the consumer thread,
+        which does the rest (see RecorderParent.process_chunk).
+
+        Parameters
+        ----------
+        in_data: Numpy Array
+            The raw int16 chunk
+        timestamp: float
+            Simulated device time (in seconds) of the first sample
+        """
+        self.push_chunk(in_data,timestamp)
+
+    def _stream_loop(self):
+        """
+        Timer thread: generate the chunks and call the callback.
+        In realtime, the chunks are paced by the ideal chunk times,
+        so the average rate is exact even if one chunk is late.
+        """
+        period = self.chunk_size / self.rate
+        next_time = time.perf_counter()
+        while not self._closing.is_set():
+            if not self._streaming.is_set():
+                self._streaming.wait(0.1)
+                next_time = time.perf_counter()
+                continue
+
+            if self.realtime:
+                next_time += period
+                delay = next_time - time.perf_counter()
+                if delay > 0 and self._closing.wait(delay):
+                    break
+            timestamp = self.sample_count / self.rate
+            self.stream_audio_callback(self.generate_chunk(),timestamp)
+
+    def stream_init(self, playback = False):
+        """
+        Re-implemented from RecorderParent.
+        """
+        if self.audio_stream == None:
+            self.consumer_start()
+            self._closing.clear()
+            self.audio_stream = threading.Thread(target = self._stream_loop,
+                                                 name = 'SimRecorder',
+                                                 daemon = True)
+            self.audio_stream.start()
+            self.stream_start()
+            return True
+        else:
+            return False
+
+    # Start the streaming
+    def stream_start(self):
+        """
+        Re-implemented from RecorderParent.
+        """
+        if self.audio_stream:
+            if not self._streaming.is_set():
+                self._streaming.set()
+            else:
+                print('stream already started')
+        else:
+            print('No audio stream is set up')
+
+    # Stop the streaming
+    def stream_stop(self):
+        """
+        Re-implemented from RecorderParent.
+        """
+        if self.audio_stream:
+            if self._streaming.is_set():
+                self._streaming.clear()
+            else:
+                print('stream already stopped')
+        else:
+            print('No audio stream is set up')
+
+    # Close the stream, probably needed if any parameter of the stream is changed
+    def stream_close(self):
+        """
+        Re-implemented from RecorderParent.
+        """
+        if self.audio_stream:
+            self._streaming.clear()
+            self._closing.set()
+            self.audio_stream.join()
+            self.audio_stream = None
@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+"""
+This module contains the streaming spectrum estimator used for the
+averaged live spectrum.
+
+The estimator is fed with the new chunks only, and keeps the samples
+which do not yet make a full segment. Each full segment (Welch method:
+windowed, with overlap) is transformed once and added to the average,
+so the cost of each update only depends on the amount of new data.
+
+Averaging modes:
+    * exponential: the newest segments weigh more, with a time constant
+      of num_averages segments (all segments weigh the same if 0)
+    * linear: all segments weigh the same, up to num_averages segments
+      (unlimited if 0), after which the average is held, or started
+      again if continuous (e.g. for a live display)
+    * peak: the maximum of each frequency bin is held
+
+Example:
+    | >>>est = SpectrumEstimator(channels = 2, rate = 44100, segment = 4096)
+    | >>>recorder.add_chunk_listener(est.update, physical = True)
+    | >>>recorder.add_gap_listener(est.restart)
+    | >>>asd = est.result()
+
+Attributes
+----------
+AVERAGING_MODES: list of str
+    The available averaging modes
+SCALINGS: list of str
+    The available scalings of the result
+"""
+import threading
+
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+
+AVERAGING_MODES = ['exponential','linear','peak']
+SCALINGS = ['psd','asd']
+
+class SpectrumEstimator(object):
+    """
+    Streaming Welch spectrum estimator
+
+    Attributes
+    ----------
+    channels: int
+        Number of channels
+    rate: int
+        Sampling rate
+    segment: int
+        Number of samples in a segment
+    step: int
+        Number of samples between the starts of two segments
+    averaging: str
+        The averaging mode, one of AVERAGING_MODES
+    num_averages: int
+        Number of segments to average over
+    scaling: str
+        'psd' for the power spectral density (V^2/Hz),
+        'asd' for the amplitude spectral density (V/sqrt(Hz))
+    continuous: bool
+        Whether a completed linear average is started again
+    count: int
+        Number of segments in the current average
+    segments: int
+        Number of segments processed since the last reset
+    frequencies: Numpy Array
+        Frequencies of the spectrum
+    """
+    def __init__(self,channels,rate,segment = 4096,overlap = 0.5,
+                 averaging = 'exponential',num_averages = 16,scaling = 'asd',
+                 continuous = False):
+        """
+        Parameters
+        ----------
+        channels: int
+            Number of channels
+        rate: int
+            Sampling rate
+        segment: int
+            Number of samples in a segment
+        overlap: float
+            Fraction of a segment overlapping with the next one, from 0 to 1
+        averaging: str
+            One of AVERAGING_MODES
+        num_averages: int
+            Number of segments to average over
+        scaling: str
+            One of SCALINGS
+        continuous: bool
+            In linear mode, start a new average once num_averages segments
+            are averaged, instead of holding it
+        """
+        if not averaging in AVERAGING_MODES:
+            raise ValueError('Unknown averaging mode: %s' % averaging)
+        if not scaling in SCALINGS:
+            raise ValueError('Unknown scaling: %s' % scaling)
+        self.channels = channels
+        self.rate = rate
+        self.segment = max(2,int(segment))
+        self.step = max(1,int(round(self.segment * (1 - overlap))))
+        self.averaging = averaging
+        self.num_averages = max(0,int(num_averages))
+        self.scaling = scaling
+        self.continuous = continuous
+
+        self.window = np.hanning(self.segment).reshape((1,-1,1))
+        # One-sided PSD scaling, DC and Nyquist are not doubled
+        self.psd_scale = np.full((self.segment//2+1,1),
+                                 2 / (rate * np.sum(self.window**2)))
+        self.psd_scale[0] /= 2
+        if self.segment % 2 == 0:
+            self.psd_scale[-1] /= 2
+        self.frequencies = np.arange(self.segment//2+1) * rate / self.segment
+
+        self._lock = threading.Lock()
+        self._buffer = np.zeros((2*self.segment,channels))
+        self.reset()
+
+    def reset(self):
+        """
+        Clear the average and the samples waiting for a full segment
+        """
+        with self._lock:
+            self._fill = 0
+            self.count = 0
+            self.segments = 0
+            self._average = np.zeros((self.segment//2+1,self.channels))
+
+    def restart(self,gap = 0):
+        """
+        Drop the samples waiting for a full segment, e.g. after a dropout,
+        so that no segment spans it. The average so far is kept
+
+        Parameters
+        ----------
+        gap: int
+            Estimated number of samples missing (not used)
+        """
+        with self._lock:
+            self._fill = 0
+
+    def update(self,data):
+        """
+        Add new samples, and average any full segment
+
+        Parameters
+        ----------
+        data: Numpy Array
+            New samples in volts, with dimension of samples x channels
+        """
+        n = data.shape[0]
+        with self._lock:
+            if self._fill + n > self._buffer.shape[0]:
+                buffer = np.zeros((self._fill + n + self.segment,self.channels))
+                buffer[:self._fill] = self._buffer[:self._fill]
+                self._buffer = buffer
+            self._buffer[self._fill:self._fill+n] = data
+            self._fill += n
+            if self._fill < self.segment:
+                return
+
+            # View the full segments without copying them
+            num_seg = (self._fill - self.segment) // self.step + 1
+            rows,cols = self._buffer.strides
+            segments = as_strided(self._buffer,
+                                  shape = (num_seg,self.segment,self.channels),
+                                  strides = (rows*self.step,rows,cols))
+            self._process_segments(segments)
+
+            # Keep the samples needed for the next segment
+            used = num_seg * self.step
+            left = self._fill - used
+            self._buffer[:left] = self._buffer[used:self._fill]
+            self._fill = left
+
+    def _process_segments(self,segments):
+        """
+        Transform new full segments and add them to the average
+
+        Parameters
+        ----------
+        segments: Numpy Array
+            View of the segments, with dimension of
+            segments x samples x channels
+        """
+        psd = np.abs(np.fft.rfft(segments * self.window,axis = 1))**2
+        psd *= self.psd_scale
+        self._add_segments(psd)
+
+    def _add_segments(self,psd):
+        """
+        Add the PSD of new segments to the average
+
+        Parameters
+        ----------
+        psd: Numpy Array
+            with dimension of segments x frequencies x channels
+        """
+        self.segments += psd.shape[0]
+        if self.averaging == 'peak':
+            np.maximum(self._average,psd.max(axis = 0),out = self._average)
+            self.count += psd.shape[0]
+        elif self.averaging == 'linear':
+            while psd.shape[0]:
+                if self.num_averages and self.count >= self.num_averages:
+                    if not self.continuous:
+                        break
+                    # The completed average is replaced by the next one
+                    self.count = 0
+                new = psd
+                if self.num_averages:
+                    new = psd[:self.num_averages - self.count]
+                total = self.count + new.shape[0]
+                self._average *= self.count / total
+                self._average += new.sum(axis = 0) / total
+                self.count = total
+                psd = psd[new.shape[0]:]
+        else:
+            for p in psd:
+                self.count += 1
+                if self.num_averages:
+                    weight = 1 / min(self.count,self.num_averages)
+                else:
+                    weight = 1 / self.count
+                self._average += weight * (p - self._average)
+
+    def result(self):
+        """
+        Get the averaged spectrum
+
+        Returns
+        ----------
+        Numpy Array
+            The spectrum in the chosen scaling, with dimension of
+            frequencies x channels
+        """
+        with self._lock:
+            if self.scaling == 'asd':
+                return np.sqrt(self._average)
+            return self._average.copy()
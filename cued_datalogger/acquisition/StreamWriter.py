@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""
+This module contains the classes and functions to stream a recording
+to disk, so that the recording duration is not limited by the RAM.
+
+A stream recording is stored as two files sharing the same base name:
+    * <name>.dat: the raw samples, in (samples x channels) C order
+    * <name>.json: the metadata header (sample rate, channels, dtype, ...)
+
+The data file is only ever appended to, so it can be opened as a
+memory-mapped array at any time, without loading it into memory.
+
+Typical example of using the module:
+    | >>>writer = StreamWriter('soak_test', channels = 32, rate = 51200)
+    | >>>writer.write(chunk)
+    | >>>writer.close()
+    | >>>data = open_stream_file('soak_test')
+
+Attributes
+----------
+DATA_EXT: str
+    Extension of the raw data file
+HEADER_EXT: str
+    Extension of the metadata header file
+STREAM_FORMAT: str
+    Format identifier written into the header
+"""
+import json
+import os.path
+import threading
+import time
+import queue
+import warnings
+
+import numpy as np
+
+DATA_EXT = '.dat'
+HEADER_EXT = '.json'
+STREAM_FORMAT = 'cued_datalogger_stream'
+
+def stream_file_paths(filename):
+    """
+    Get the data and header paths of a stream recording
+
+    Parameters
+    ----------
+    filename: str
+        Base name of the recording. Any data or header extension is removed
+
+    Returns
+    ----------
+    data_path: str
+    header_path: str
+    """
+    base, ext = os.path.splitext(filename)
+    if ext not in (DATA_EXT, HEADER_EXT):
+        base = filename
+    return base + DATA_EXT, base + HEADER_EXT
+
+def write_stream_header(filename, header):
+    """
+    Write the metadata header of a stream recording
+
+    Parameters
+    ----------
+    filename: str
+        Base name of the recording
+    header: dict
+        The metadata to be written
+    """
+    header_path = stream_file_paths(filename)[1]
+    with open(header_path, 'w') as f:
+        json.dump(header, f, indent = 2)
+
+def read_stream_header(filename):
+    """
+    Read the metadata header of a stream recording.
+    If the recording was not closed properly, the number of samples is
+    worked out from the size of the data file.
+
+    Parameters
+    ----------
+    filename: str
+        Base name of the recording
+
+    Returns
+    ----------
+    header: dict
+    """
+    data_path, header_path = stream_file_paths(filename)
+    with open(header_path) as f:
+        header = json.load(f)
+    if header.get('format') != STREAM_FORMAT:
+        raise ValueError('%s is not a stream recording header' % header_path)
+
+    frame_size = np.dtype(header['dtype']).itemsize * header['channels']
+    samples_on_disk = os.path.getsize(data_path) // frame_size
+    if not header.get('complete') or header['samples'] > samples_on_disk:
+        header['samples'] = samples_on_disk
+    return header
+
+def open_stream_file(filename, mode = 'r'):
+    """
+    Open the data of a stream recording as a memory-mapped array
+
+    Parameters
+    ----------
+    filename: str
+        Base name of the recording
+    mode: str
+        Memory map mode, see numpy.memmap
+
+    Returns
+    ----------
+    data: numpy memmap
+        with dimension of samples x channels
+    """
+    header = read_stream_header(filename)
+    data_path = stream_file_paths(filename)[0]
+    shape = (header['samples'], header['channels'])
+    if not header['samples']:
+        return np.zeros(shape, dtype = header['dtype'])
+    return np.memmap(data_path, dtype = header['dtype'], mode = mode,
+                     shape = shape)
+
+class StreamWriter(object):
+    """
+    Appends chunks of data to a stream recording from a background thread.
+
+    Chunks are handed over through a bounded queue, so writing to disk
+    never holds up the caller. If the queue is full, the chunk is dropped
+    and counted rather than blocking the stream.
+
+    Attributes
+    ----------
+    filename: str
+        Base name of the recording
+    channels: int
+        Number of channels
+    rate: int
+        Sampling rate
+    dtype: numpy dtype
+        Data type of the samples on disk
+    samples_written: int
+        Number of samples (per channel) written to disk so far
+    dropped_samples: int
+        Number of samples (per channel) dropped because the queue was full.
+        It is stored in the header, and a RuntimeWarning is given on close
+        if any were dropped
+    """
+    def __init__(self, filename, channels, rate, dtype = np.float64,
+                 queue_size = 256, metadata = None):
+        """
+        Create the recording files and start the writer thread
+
+        Parameters
+        ----------
+        filename: str
+            Base name of the recording
+        channels: int
+            Number of channels
+        rate: int
+            Sampling rate
+        dtype: numpy dtype
+            Data type of the samples on disk
+        queue_size: int
+            Maximum number of chunks waiting to be written
+        metadata: dict
+            Any extra items to be stored in the header
+        """
+        self.filename = filename
+        self.channels = channels
+        self.rate = rate
+        self.dtype = np.dtype(dtype)
+        self.samples_written = 0
+        self.dropped_samples = 0
+        self.header = {'format': STREAM_FORMAT,
+                       'version': 1,
+                       'dtype': self.dtype.str,
+                       'channels': int(channels),
+                       'sample_rate': rate,
+                       'samples': 0,
+                       'dropped_samples': 0,
+                       'start_time': time.time(),
+                       'complete': False}
+        if metadata:
+            self.header.update(metadata)
+
+        data_path = stream_file_paths(filename)[0]
+        self._file = open(data_path, 'wb')
+        write_stream_header(filename, self.header)
+
+        self._queue = queue.Queue(maxsize = queue_size)
+        self._thread = threading.Thread(target = self._run,
+                                        name = 'StreamWriter', daemon = True)
+        self._thread.start()
+
+    def write(self, data, block = False):
+        """
+        Queue a chunk of data to be written. The data is copied.
+
+        Parameters
+        ----------
+        data: Numpy Array
+            with dimension of samples x channels
+        block: bool
+            Wait for room in the queue instead of dropping the chunk,
+            e.g. when exporting rather than streaming
+
+        Returns
+        ----------
+        bool
+            True if queued, False if it was dropped
+        """
+        try:
+            self._queue.put(np.array(data, dtype = self.dtype), block = block)
+            return True
+        except queue.Full:
+            self.dropped_samples += data.shape[0]
+            return False
+
+    def _run(self):
+        """
+        Writer thread: append queued chunks to the data file
+        until the closing sentinel is received
+        """
+        while True:
+            data = self._queue.get()
+            if data is None:
+                break
+            self._file.write(data.tobytes())
+            self.samples_written += data.shape[0]
+
+    def close(self):
+        """
+        Wait for the queued chunks to be written, then close the files
+
+        Returns
+        ----------
+        int
+            Number of samples written
+        """
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+            self._file.close()
+
+            self.header['samples'] = self.samples_written
+            self.header['dropped_samples'] = self.dropped_samples
+            self.header['complete'] = True
+            write_stream_header(self.filename, self.header)
+            if self.dropped_samples:
+                warnings.warn('Stream writer dropped %i samples of %s'
+                              % (self.dropped_samples, self.filename),
+                              RuntimeWarning)
+        return self.samples_written
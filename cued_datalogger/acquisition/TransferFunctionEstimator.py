@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+This module contains the streaming transfer function estimator used for
+the continuous transfer function average.
+
+The live stream is cut into windowed, overlapping segments as in the
+SpectrumEstimator. The auto- and cross-spectra of each full segment are
+added to a TransferFunctionAverager, so the averaged transfer functions
+(H1 and H2) and coherence between the input channel and the other channels
+are available at any moment, without recording first. After a dropout,
+the samples waiting for a full segment are dropped (see restart), so that
+no segment averaged spans the dropout.
+
+Example:
+    | >>>est = TransferFunctionEstimator(channels = 4, rate = 44100,
+    | ...                                input_channel = 0, segment = 4096,
+    | ...                                num_averages = 200)
+    | >>>recorder.add_chunk_listener(est.update, physical = True)
+    | >>>recorder.add_gap_listener(est.restart)
+    | >>>tf,coh = est.result('H1')
+"""
+import numpy as np
+
+from cued_datalogger.acquisition.SpectrumEstimator import SpectrumEstimator
+from cued_datalogger.analysis.frequency_domain import TransferFunctionAverager
+
+class TransferFunctionEstimator(SpectrumEstimator):
+    """
+    Streaming overlapped transfer function estimator
+
+    Attributes
+    ----------
+    input_channel: int
+        Index of the input channel
+    output_channels: list of int
+        Indices of the output channels, in the order of the results
+    num_averages: int
+        Number of segments to average over, after which the average
+        is held (unlimited if 0)
+    averager: TransferFunctionAverager
+        The running average of the spectra
+    """
+    def __init__(self,channels,rate,input_channel = 0,segment = 4096,
+                 overlap = 0.5,num_averages = 0,averager = None):
+        """
+        Parameters
+        ----------
+        channels: int
+            Number of channels
+        rate: int
+            Sampling rate
+        input_channel: int
+            Index of the input channel
+        segment: int
+            Number of samples in a segment
+        overlap: float
+            Fraction of a segment overlapping with the next one, from 0 to 1
+        num_averages: int
+            Number of segments to average over (unlimited if 0)
+        averager: TransferFunctionAverager
+            Average to carry on from, a new linear average if None.
+            It is cleared if its spectra do not match the segments
+        """
+        self.input_channel = input_channel
+        self.output_channels = [i for i in range(channels) if not i == input_channel]
+        # Set after the parent initialisation, which resets the estimator
+        self.averager = None
+        super().__init__(channels,rate,segment = segment,overlap = overlap,
+                         averaging = 'linear',num_averages = num_averages)
+        if averager is None:
+            averager = TransferFunctionAverager(history = 0)
+        self.averager = averager
+        # Scale the spectra to the power of unwindowed spectra, so that
+        # they can be averaged with those of whole recordings
+        self.fft_scale = np.sqrt(self.segment / np.sum(self.window**2))
+        n_freq = self.segment//2+1
+        if averager.count and (not averager.num_frequencies == n_freq or
+                               not averager.Gyy.shape[1] == len(self.output_channels)):
+            print('Spectra do not match the previous averages, clearing them')
+            averager.clear()
+
+    def reset(self):
+        """
+        Clear the average and the samples waiting for a full segment
+        """
+        with self._lock:
+            self._fill = 0
+            if self.averager is not None:
+                self.averager.clear()
+
+    def undo(self):
+        """
+        Remove the last average, safely while the stream is adding more
+
+        Returns
+        ----------
+        bool
+            True if an average was removed
+        """
+        with self._lock:
+            return self.averager.undo()
+
+    @property
+    def count(self):
+        """
+        int
+            Number of averages so far
+        """
+        return self.averager.count
+
+    def _process_segments(self,segments):
+        """
+        Transform new full segments and add their spectra to the average
+
+        Parameters
+        ----------
+        segments: Numpy Array
+            View of the segments, with dimension of
+            segments x samples x channels
+        """
+        if self.num_averages:
+            segments = segments[:max(0,self.num_averages - self.averager.count)]
+        if not segments.shape[0]:
+            return
+        spectra = np.fft.rfft(segments * self.window,axis = 1)
+        spectra *= self.fft_scale
+        X = spectra[:,:,self.input_channel]
+        Y = spectra[:,:,self.output_channels]
+        Gxx = (X * X.conj()).real
+        Gyy = (Y * Y.conj()).real
+        Gxy = X.conj()[:,:,np.newaxis] * Y
+        if self.averager.weighting == 'linear':
+            # All at once, the segments weigh the same
+            self.averager.add_spectra(Gxx.mean(axis = 0),Gyy.mean(axis = 0),
+                                      Gxy.mean(axis = 0),n = segments.shape[0])
+        else:
+            for i in range(segments.shape[0]):
+                self.averager.add_spectra(Gxx[i],Gyy[i],Gxy[i])
+
+    def result(self,estimator = 'H1'):
+        """
+        Get the averaged transfer functions and coherence
+
+        Parameters
+        ----------
+        estimator: str
+            'H1' (noise on the outputs) or 'H2' (noise on the input)
+
+        Returns
+        ----------
+        tf: Numpy Array or None
+            Transfer functions, with dimension of frequencies x outputs,
+            None if nothing has been averaged yet
+        coherence: Numpy Array or None
+            Coherence, with dimension of frequencies x outputs
+        """
+        with self._lock:
+            if not self.averager.count:
+                return None,None
+            if estimator == 'H2':
+                tf = self.averager.h2()
+            else:
+                tf = self.averager.h1()
+            return tf,self.averager.coherence()
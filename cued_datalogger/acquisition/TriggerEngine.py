@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+This module contains the trigger used by the Recorder classes to start
+a recording when the signal crosses a level.
+
+The trigger is a Schmitt trigger on each of the trigger channels:
+a channel is set off when its signal reaches the level, and is only
+re-armed once the signal has gone back past the level by more than the
+hysteresis. The state of each channel is carried over from one chunk to
+the next, so a crossing is found at the exact sample even if it straddles
+two chunks. Several channels are combined with any-of or all-of logic.
+
+The whole chunk is checked at once, without looping over the samples.
+
+Example:
+    | >>>trig = TriggerEngine(channels = [0,2], level = 0.5,
+    | ...                     slope = 'rising', hysteresis = 0.05)
+    | >>>pos = trig.check(chunk)
+    | >>>if pos is not None:
+    | ...    print('Triggered at sample %i' % pos)
+
+Attributes
+----------
+SLOPES: list of str
+    The available trigger slopes
+LOGICS: list of str
+    The available ways to combine the trigger channels
+"""
+import numpy as np
+
+SLOPES = ['rising','falling','either']
+LOGICS = ['any','all']
+
+class TriggerEngine(object):
+    """
+    A multi-channel, slope-aware Schmitt trigger
+
+    Attributes
+    ----------
+    channels: list of int
+        Indices of the channels checked for the trigger
+    level: Numpy Array
+        Trigger level of each channel, relative to the reference
+    slope: str
+        'rising': triggers when the signal goes up past the level,
+        'falling': triggers when the signal goes down past -level,
+        'either': triggers when the magnitude of the signal reaches the level
+    hysteresis: float
+        How far back past the level the signal must go to re-arm a channel
+    logic: str
+        'any': triggers when any channel is set off,
+        'all': triggers when all the channels are set off at the same time
+    reference: Numpy Array
+        Level of each channel subtracted from the signal before checking
+    state: Numpy Array
+        Whether each channel is currently set off
+    """
+    def __init__(self,channels = 0,level = 0.1,slope = 'either',
+                 hysteresis = 0,logic = 'any',reference = 0):
+        """
+        Parameters
+        ----------
+        channels: int or list of int
+            Indices of the channels to check
+        level: float or list of float
+            Trigger level, for all channels or per channel
+        slope: str
+            One of SLOPES
+        hysteresis: float
+            Re-arming hysteresis, must not be negative
+        logic: str
+            One of LOGICS
+        reference: float or list of float
+            Reference level, for all channels or per channel
+        """
+        if not slope in SLOPES:
+            raise ValueError('Unknown trigger slope: %s' % slope)
+        if not logic in LOGICS:
+            raise ValueError('Unknown trigger logic: %s' % logic)
+        self.channels = list(np.atleast_1d(channels).astype(int))
+        n = len(self.channels)
+        self.level = np.broadcast_to(np.asarray(level,dtype = np.float64),(n,)).copy()
+        self.slope = slope
+        self.hysteresis = abs(float(hysteresis))
+        self.logic = logic
+        self.reference = np.broadcast_to(np.asarray(reference,dtype = np.float64),(n,)).copy()
+        self.reset()
+
+    def reset(self):
+        """
+        Re-arm all the channels
+        """
+        self.state = np.zeros(len(self.channels),dtype = bool)
+        self.combined = False
+
+    def check(self,data):
+        """
+        Check a chunk for the trigger, carrying on from the previous chunk
+
+        Parameters
+        ----------
+        data: Numpy Array
+            Chunk of the trigger channels only (in volts),
+            with dimension of samples x len(channels)
+
+        Returns
+        ----------
+        int or None
+            Index of the sample setting off the trigger, None if not triggered
+        """
+        n = data.shape[0]
+        if n == 0:
+            return None
+        x = data - self.reference
+        if self.slope == 'falling':
+            x = -x
+        elif self.slope == 'either':
+            x = np.abs(x)
+
+        # Index of the latest sample which set off or re-armed each channel
+        idx = np.arange(n).reshape((-1,1))
+        fired = np.maximum.accumulate(np.where(x >= self.level,idx,-1),axis = 0)
+        armed = np.maximum.accumulate(np.where(x < self.level - self.hysteresis,idx,-1),axis = 0)
+        # Channels with neither keep their state from the previous chunk
+        state = np.where((fired < 0) & (armed < 0),self.state,fired > armed)
+
+        if self.logic == 'all':
+            combined = state.all(axis = 1)
+        else:
+            combined = state.any(axis = 1)
+
+        # The trigger is set off on the rising edge of the combined state
+        edges = combined.copy()
+        edges[0] &= not self.combined
+        edges[1:] &= ~combined[:-1]
+
+        self.state = state[-1]
+        self.combined = bool(combined[-1])
+        if edges.any():
+            return int(np.argmax(edges))
+        return None
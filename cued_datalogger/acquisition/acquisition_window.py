@@ -27,6 +27,28 @@ NI_DRIVERS: bool
     These are required to interface with a National Instrument hardware.
 PLAYBACK: bool
     Indicates whether to play the streaming audio, only works with SoundCard
+RAW_STORAGE: bool
+    Indicates whether the recorder keeps the raw int16 samples, which are
+    only scaled to volts when needed
+SCIPY_FFT: bool
+    Indicates whether scipy.fft is available for the live spectrum,
+    otherwise numpy.fft is used
+FFT_FLOAT32: bool
+    Indicates whether to compute the live spectrum in single precision
+FFT_WORKERS: Int
+    Number of threads computing the live spectrum (scipy.fft only)
+SPECTRUM_SEGMENT: Int
+    Maximum segment length of the averaged live spectrum
+SPECTRUM_AVERAGES: Int
+    Number of segments the averaged live spectrum is averaged over
+SPECTRUM_MODES: dict
+    Averaging mode of the SpectrumEstimator for each live spectrum option
+TF_HISTORY: Int
+    Number of transfer function averages which can be undone
+TF_EXP_AVERAGES: Int
+    Time constant (in averages) of the exponentially weighted transfer function
+RENDER_FPS: Int
+    Maximum refresh rate of the live plots
 WIDTH: Int
     Width of the application window
 HEIGHT: Int
@@ -42,14 +64,23 @@ import pyqtgraph as pg
 
 import copy
 import numpy as np
-from numpy.fft import rfft
+try:
+    from scipy.fft import rfft as batch_rfft
+    SCIPY_FFT = True
+except ImportError:
+    from numpy.fft import rfft as batch_rfft
+    SCIPY_FFT = False
 
 from cued_datalogger.acquisition.RecordingUIs import (ChanToggleUI,ChanConfigUI,DevConfigUI,
-                                                 StatusUI,RecUI)
+                                                 StatusUI,RecUI,AGGREGATE_BACKENDS)
 from cued_datalogger.acquisition.RecordingGraph import TimeLiveGraph,FreqLiveGraph,LevelsLiveGraph
 from cued_datalogger.acquisition.ChanMetaWin import ChanMetaWin
+from cued_datalogger.acquisition.SpectrumEstimator import SpectrumEstimator
+from cued_datalogger.acquisition.TransferFunctionEstimator import TransferFunctionEstimator
+from cued_datalogger.acquisition.RenderScheduler import RenderScheduler
 
 import cued_datalogger.acquisition.myRecorder as mR
+import cued_datalogger.acquisition.AggregateRecorder as AggR
 try:
     import cued_datalogger.acquisition.NIRecorder as NIR
     NI_drivers = True
@@ -59,14 +90,25 @@ except NotImplementedError:
 except ImportError:
     print("ImportError: Seems like you don't have pyDAQmx modules")
     NI_drivers = False
-from cued_datalogger.analysis.frequency_domain import (compute_transfer_function,
-                                                   calculate_auto_spectrum, calculate_cross_spectrum)
+from cued_datalogger.analysis.frequency_domain import (TransferFunctionAverager,
+                                                   compute_transfer_function)
 
 from cued_datalogger.api.channel import ChannelSet
 from cued_datalogger.api.toolbox import Toolbox, MasterToolbox
 
 # GLOBAL CONSTANTS
 PLAYBACK = False    # Whether to playback the stream
+RAW_STORAGE = False # Whether to store the raw int16 samples
+FFT_FLOAT32 = False # Whether to compute the live spectrum in single precision
+FFT_WORKERS = 1     # Number of threads for the live spectrum
+SPECTRUM_SEGMENT = 4096 # Maximum segment length of the averaged spectrum
+SPECTRUM_AVERAGES = 16  # Number of averages of the averaged spectrum
+SPECTRUM_MODES = {'Exp. Avg.':'exponential',
+                  'Lin. Avg.':'linear',
+                  'Peak Hold':'peak'}
+TF_HISTORY = 32     # Number of transfer function averages kept for undo
+TF_EXP_AVERAGES = 8 # Time constant of the exponential transfer function average
+RENDER_FPS = 30     # Maximum refresh rate of the live plots
 WIDTH = 900         # Window width
 HEIGHT = 600        # Window height
 
@@ -95,6 +137,9 @@ class AcquisitionWindow(QMainWindow):
     rec: Recorder object
          Object which handles the streaming and recording
          See documentation for Recorder classes
+    capture_chanset: ChannelSet
+        The events of the current multi-shot capture, in order: one channel
+        per event and recorder channel
     """
     sig_time_series_data_saved = pyqtSignal(object)
     sig_transfer_function_data_saved = pyqtSignal(object)
@@ -121,19 +166,33 @@ class AcquisitionWindow(QMainWindow):
 
         # Set recorder object
         self.playing = False
+        kwargs = {'backends': AGGREGATE_BACKENDS} if recType == AggR else {}
         self.rec = recType.Recorder(rate = configs[1],
                                     channels = configs[2],
                                     chunk_size = configs[3],
                                     num_chunk = configs[4],
-                                    device_name = configs[0])
+                                    device_name = configs[0],
+                                    **kwargs)
+        self.rec.raw_storage = RAW_STORAGE
         # Set up the TimeSeries and FreqSeries
         self.timedata = None
         self.freqdata = None
-
-        # Set up tallies for the average transfer function calculation
-        self.autospec_in_tally = []
-        self.autospec_out_tally = []
-        self.crossspec_tally = []
+        # Cached window for the live spectrum and its input array
+        self.fft_weights = None
+        self.fft_in = None
+        # Streaming estimator for the averaged live spectrum
+        self.spectrum_est = None
+
+        # Set up the running average for the average transfer function
+        self.tf_avg = TransferFunctionAverager(num_averages = TF_EXP_AVERAGES,
+                                               history = TF_HISTORY)
+        # Streaming estimator for the continuous transfer function average
+        self.tf_est = None
+        # Events of the multi-shot capture
+        self.capture_chanset = ChannelSet()
+        # Paces the plot redraws
+        self.render = RenderScheduler(fps = RENDER_FPS)
+        self.peaks_written = 0
 
         try:
             # Construct UI
@@ -262,6 +321,9 @@ class AcquisitionWindow(QMainWindow):
         self.chanconfig_UI.sigTimeOffsetChanged.connect(self.timeplot.set_offset)
         self.chanconfig_UI.sigFreqOffsetChanged.connect(self.freqplot.set_offset)
         self.chanconfig_UI.sigHoldChanged.connect(self.timeplot.set_sig_hold)
+        self.chanconfig_UI.sigTimeOffsetChanged.connect(self.render.invalidate)
+        self.chanconfig_UI.sigFreqOffsetChanged.connect(self.render.invalidate)
+        self.chanconfig_UI.sigHoldChanged.connect(self.render.invalidate)
         self.chanconfig_UI.sigColourChanged.connect(self.timeplot.set_plot_colour)
         self.chanconfig_UI.sigColourChanged.connect(self.freqplot.set_plot_colour)
         self.chanconfig_UI.sigColourChanged.connect(self.levelsplot.set_plot_colour)
@@ -277,6 +339,7 @@ class AcquisitionWindow(QMainWindow):
         self.stats_UI.resetView.pressed.connect(self.ResetSplitterSizes)
         self.stats_UI.togglebtn.pressed.connect(lambda: self.toggle_rec())
         self.stats_UI.sshotbtn.pressed.connect(self.get_snapshot)
+        self.stats_UI.spectrumModeChanged.connect(self.set_spectrum_mode)
         self.RecUI.rec_boxes[4].textEdited.connect(self.levelsplot.change_threshold)
         self.RecUI.startRecording.connect(self.start_recording)
         self.RecUI.cancelRecording.connect(self.cancel_recording)
@@ -294,11 +357,11 @@ class AcquisitionWindow(QMainWindow):
         self.main_widget.setFocus()
         self.setCentralWidget(self.main_widget)
 
-        # Set up a timer to update the plot
+        # Set up a timer to update the plot, at the frame rate
         self.plottimer = QTimer(self)
         self.plottimer.timeout.connect(self.update_line)
         #self.plottimer.timeout.connect(self.update_chanlvls)
-        self.plottimer.start(self.rec.chunk_size*1000//self.rec.rate)
+        self.plottimer.start(self.render.interval)
 
         self.show()
 
@@ -361,39 +424,130 @@ class AcquisitionWindow(QMainWindow):
     # Updates the plots
     def update_line(self):
         """
-        Callback to update the time domain and frequency domain plot
+        Callback to update the time domain and frequency domain plot.
+        The frames are paced by self.render, and each plot is only
+        redrawn if its data has changed
         """
-        # Get the buffer
-        data = self.rec.get_buffer()
+        if not self.render.begin_frame():
+            return
 
-        # Take the last chunk for the levels plot
-        currentdata = data[len(data)-self.rec.chunk_size:,:]
-        currentdata -= np.mean(currentdata)
-        rms = np.sqrt(np.mean(currentdata ** 2,axis = 0))
-        maxs = np.amax(abs(currentdata),axis = 0)
-        self.levelsplot.set_channel_levels(rms,maxs)
+        # Follow the continuous transfer function average
+        if self.tf_est:
+            self.RecUI.update_TFavg_count(self.tf_est.count)
+            if self.tf_est.count >= self.tf_est.num_averages:
+                self.stop_tf_stream()
 
-        # Prepare the window and weightage for FFT plot
-        window = np.hanning(data.shape[0])
-        weightage = np.exp(2* self.timedata / self.timedata[-1])
+        written = self.rec.ring.total_written
+        new_data = self.render.changed('buffer',written)
+        if self.spectrum_est:
+            new_spectrum = self.render.changed('spectrum',self.spectrum_est.segments)
+        else:
+            new_spectrum = self.render.changed('spectrum',written)
+
+        if new_data or new_spectrum:
+            # Get the buffer (a view, so do not modify it in place)
+            data = self.rec.to_physical(self.rec.get_buffer())
+
+        if new_data:
+            with self.render.timed('levels'):
+                # Take the last chunk for the levels plot
+                currentdata = data[len(data)-self.rec.chunk_size:,:]
+                currentdata = currentdata - np.mean(currentdata)
+                rms = np.sqrt(np.mean(currentdata ** 2,axis = 0))
+                maxs = np.amax(abs(currentdata),axis = 0)
+                self.levelsplot.set_channel_levels(rms,maxs)
+                # Update the level peaks with all the samples written since
+                # the last frame, decayed for the chunks in between
+                new_samples = min(written - self.peaks_written,len(data))
+                if new_samples > self.rec.chunk_size:
+                    newdata = data[len(data)-new_samples:,:]
+                    newdata = newdata - np.mean(newdata)
+                    maxs = np.amax(abs(newdata),axis = 0)
+                chunks = (written - self.peaks_written) // self.rec.chunk_size
+                self.peaks_written = written
+                self.levelsplot.set_peaks(maxs,chunks)
+
+            with self.render.timed('time'):
+                # Update the time plot, decimated to its width
+                self.timeplot.update_lines(self.timedata,data)
+
+        if new_spectrum:
+            with self.render.timed('freq'):
+                # Update the FFT plot, all channels at once
+                if self.spectrum_est:
+                    self.freqplot.update_lines(self.spectrum_est.frequencies,
+                                               self.spectrum_est.result())
+                else:
+                    self.freqplot.update_lines(self.freqdata,self.live_spectrum(data))
+
+        if self.render.end_frame():
+            self.stats_UI.set_render_stats(self.render.measured_fps,self.render.timings)
+
+    def live_spectrum(self,data):
+        """
+        Compute the spectrum of the buffer for the FFT plot, using one
+        real FFT over all the channels.
+        The window (Hann window with an exponential weightage) and the
+        FFT input array are cached for the buffer length.
 
-        # Update each plot item's data + level peaks
-        for i in range(data.shape[1]):
-            plotdata = data[:,i].reshape((len(data[:,i]),))
-
-            # Check for zero crossing if needed
-            zc = 0
-            if self.timeplot.sig_hold[i] == Qt.Checked:
-                avg = np.mean(plotdata);
-                zero_crossings = np.where(np.diff(np.sign(plotdata-avg))>0)[0]
-                if zero_crossings.shape[0]:
-                    zc = zero_crossings[0]+1
-
-            self.timeplot.update_line(i,x = self.timedata[:len(plotdata)-zc] ,y = plotdata[zc:])
-            fft_data = rfft(plotdata* window * weightage)
-            psd_data = abs(fft_data)** 0.5
-            self.freqplot.update_line(i,x = self.freqdata ,y = psd_data)
-            self.levelsplot.set_peaks(i,maxs[i])
+        Parameters
+        ----------
+        data: Numpy Array
+            Buffer data in volts, with dimension of samples x channels
+
+        Returns
+        ----------
+        Numpy Array
+            Square root of the spectrum magnitude, with dimension of
+            (samples/2+1) x channels
+        """
+        n = data.shape[0]
+        dtype = np.float32 if FFT_FLOAT32 else np.float64
+        if (self.fft_weights is None or not self.fft_weights.shape[0] == n
+            or not self.fft_weights.dtype == dtype):
+            weightage = np.exp(2* np.arange(n) / max(n-1,1))
+            self.fft_weights = (np.hanning(n) * weightage).astype(dtype).reshape((-1,1))
+        if self.fft_in is None or not self.fft_in.shape == data.shape or not self.fft_in.dtype == dtype:
+            self.fft_in = np.empty(data.shape,dtype = dtype)
+
+        np.multiply(data,self.fft_weights,out = self.fft_in,casting = 'same_kind')
+        if SCIPY_FFT:
+            fft_data = batch_rfft(self.fft_in,axis = 0,workers = FFT_WORKERS)
+        else:
+            fft_data = batch_rfft(self.fft_in,axis = 0)
+        return np.sqrt(np.abs(fft_data))
+
+    def set_spectrum_mode(self,mode):
+        """
+        Callback to change the live spectrum between the FFT of the buffer
+        and an averaged spectrum, which is estimated from the new chunks
+        as they arrive (see SpectrumEstimator)
+
+        Parameters
+        ----------
+        mode: str
+            'Buffer FFT', or one of the keys of SPECTRUM_MODES
+        """
+        if self.spectrum_est:
+            self.rec.remove_chunk_listener(self.spectrum_est.update)
+            self.rec.remove_gap_listener(self.spectrum_est.restart)
+            self.spectrum_est = None
+
+        if mode in SPECTRUM_MODES:
+            self.spectrum_est = SpectrumEstimator(self.rec.channels,self.rec.rate,
+                                                  segment = min(SPECTRUM_SEGMENT,self.rec.ring.length),
+                                                  averaging = SPECTRUM_MODES[mode],
+                                                  num_averages = SPECTRUM_AVERAGES,
+                                                  scaling = 'asd',continuous = True)
+            self.rec.add_chunk_listener(self.spectrum_est.update,physical = True)
+            self.rec.add_gap_listener(self.spectrum_est.restart)
+            self.freqplot.plotItem.setLabel('left','ASD (V/sqrt(Hz))')
+            self.freqplot.plotItem.enableAutoRange(axis = 'y')
+        else:
+            self.freqplot.plotItem.setLabel('left','')
+            self.freqplot.plotItem.disableAutoRange(axis = None)
+            self.freqplot.plotItem.setRange(yRange = (0, 100*self.rec.channels))
+        self.render.invalidate()
 
     #-------------------------STATUS BAR WIDGET--------------------------------
     def toggle_rec(self,stop = None):
@@ -425,9 +579,12 @@ class AcquisitionWindow(QMainWindow):
         """
         Callback to take the current buffer data and send it out to parent window
         """
+        # Copy the buffer view once into a block, as it is overwritten by the stream
         snapshot = self.rec.get_buffer()
+        self.live_chanset.set_channel_block('time_series',snapshot.T,
+                                            tuple(range(snapshot.shape[1])))
         for i in range(snapshot.shape[1]):
-            self.live_chanset.set_channel_data(i,'time_series',snapshot[:,i])
+            self.set_raw_scaling(i,snapshot.dtype)
 
         self.live_chanset.set_channel_metadata( tuple(range(snapshot.shape[1])),
                                                    {'sample_rate':self.rec.rate})
@@ -454,7 +611,23 @@ class AcquisitionWindow(QMainWindow):
         """
         success = False
         rec_configs = self.RecUI.get_record_config()
-        if rec_configs[2]>=0:
+        if self.RecUI.get_recording_mode() == 'TF Avg.' and self.RecUI.get_tf_continuous():
+            # Average the transfer function from the stream
+            if self.start_tf_stream(rec_configs[0]):
+                success = True
+                self.stats_UI.statusbar.showMessage('Averaging...')
+        elif self.RecUI.get_recording_mode() == 'Multi-shot':
+            # Capture triggered events until cancelled
+            if self.rec.capture_start(posttrig = rec_configs[0],
+                                      pretrig = max(0,rec_configs[2]),
+                                      num_blocks = self.RecUI.get_capture_blocks(),
+                                      channel = rec_configs[3],
+                                      threshold = rec_configs[4]):
+                success = True
+                self.capture_chanset = ChannelSet()
+                self.RecUI.update_capture_count(0,0)
+                self.stats_UI.statusbar.showMessage('Capturing...')
+        elif rec_configs[2]>=0:
             # Set up the trigger if specified
             if self.rec.trigger_start(posttrig = rec_configs[0],
                                       duration = rec_configs[1],
@@ -493,35 +666,35 @@ class AcquisitionWindow(QMainWindow):
 
         # Get the recorded data and compute DFT
         data = self.rec.flush_record_data()
-        ft_datas = np.zeros((int(data.shape[0]/2)+1,data.shape[1]),dtype = np.complex)
-        for i in range(data.shape[1]):
-            self.live_chanset.set_channel_data(i,'time_series',data[:,i])
-            ft = rfft(data[:,i])
-            self.live_chanset.add_channel_dataset(i,'spectrum',ft)
-            ft_datas[:,i] = ft
-
-        self.live_chanset.set_channel_metadata( tuple(range(data.shape[1])),
-                                                   {'sample_rate':self.rec.rate})
+        ft_datas = self.set_live_data(data)
 
         # Check recording mode
         rec_mode = self.RecUI.get_recording_mode()
         if rec_mode == 'Normal':
             # Send data normally
-            self.live_chanset.add_channel_dataset(tuple(range(data.shape[1])), 'frequency', [])
             self.live_chanset.add_channel_dataset(tuple(range(data.shape[1])),'transfer_function',[])
             self.live_chanset.add_channel_dataset(tuple(range(data.shape[1])),'coherence',[])
             self.save_transfer_function()
         elif rec_mode == 'TF Avg.':
-            # Compute the auto- and crossspectrum for average transfer function
-            # while store them in the tally
+            # Add the auto- and crossspectra to the running average
+            # of the transfer function
             chans = list(range(self.rec.channels))
             in_chan = self.RecUI.get_input_channel()
             chans.remove(in_chan)
             input_chan_data = ft_datas[:,in_chan]
 
+            # Reject recordings with dropouts, they would corrupt the average
+            if self.rec.rec_gaps:
+                print('The recording has %i dropout(s), it is not added to the average'
+                      % len(self.rec.rec_gaps))
+                self.stats_UI.statusbar.showMessage('Dropouts in recording! Not averaged')
+                self.RecUI.spec_settings_widget.setEnabled(True)
+                self.RecUI.switch_rec_box.setEnabled(True)
+                return
+
             # Check for incorrect data length with previous recorded data
-            if not len(self.autospec_in_tally)==0:
-                if not input_chan_data.shape[0] == self.autospec_in_tally[-1].shape[0]:
+            if self.tf_avg.count:
+                if not input_chan_data.shape[0] == self.tf_avg.num_frequencies:
                     print('Data shape does not match, you may have fiddle the settings')
                     print('Please either clear the past data, or revert the settings')
                     self.stats_UI.statusbar.clearMessage()
@@ -529,27 +702,9 @@ class AcquisitionWindow(QMainWindow):
                     self.RecUI.switch_rec_box.setEnabled(True)
                     return
 
-            self.autospec_in_tally.append(calculate_auto_spectrum(input_chan_data))
-
-            autospec_out = np.zeros((ft_datas.shape[0],ft_datas.shape[1] - 1),dtype = np.complex)
-            crossspec = np.zeros(autospec_out.shape,dtype = np.complex)
-            for i,chan in enumerate(chans):
-                autospec_out[:,i] = calculate_auto_spectrum(ft_datas[:,chan])
-                crossspec[:,i] = calculate_cross_spectrum(input_chan_data,ft_datas[:,chan])
-
-            self.autospec_out_tally.append(autospec_out)
-            self.crossspec_tally.append(crossspec)
-            auto_in_sum = np.array(self.autospec_in_tally).sum(axis = 0)
-            auto_out_sum = np.array(self.autospec_out_tally).sum(axis = 0)
-            cross_sum = np.array(self.crossspec_tally).sum(axis = 0)
-            for i,chan in enumerate(chans):
-                tf_avg,cor = compute_transfer_function(auto_in_sum,auto_out_sum[:,i],cross_sum[:,i])
-                self.live_chanset.add_channel_dataset(chan,'transfer_function',tf_avg)
-                self.live_chanset.add_channel_dataset(chan,'coherence',cor)
-
-            # Update the average count and send the data
-            self.RecUI.update_TFavg_count(len(self.autospec_in_tally))
-            self.save_transfer_function()
+            self.tf_avg.weighting = self.RecUI.get_tf_weighting()
+            self.tf_avg.add(input_chan_data,ft_datas[:,chans])
+            self.set_tf_average(chans)
 
         elif rec_mode == 'TF Grid':
             # TODO: Implement recording for grid transfer function
@@ -563,32 +718,234 @@ class AcquisitionWindow(QMainWindow):
         self.RecUI.spec_settings_widget.setEnabled(True)
         self.RecUI.switch_rec_box.setEnabled(True)
 
+    def set_live_data(self,data):
+        """
+        Put recorded data into the live ChannelSet, with its spectrum
+
+        Parameters
+        ----------
+        data: Numpy Array
+            Recorded data, with dimension of samples x channels.
+            It is kept by the live ChannelSet without a copy, so it must
+            not be written to afterwards
+
+        Returns
+        ----------
+        ft_datas: Numpy Array
+            Spectrum of each channel, with dimension of frequencies x channels
+            (a view of the spectrum block of the live ChannelSet)
+        """
+        chans = tuple(range(data.shape[1]))
+        if isinstance(data, np.memmap):
+            # A recording streamed to disk stays there: the time series are
+            # views of the file, and the channels are transformed one by one
+            ft_datas = np.empty((data.shape[0]//2+1,data.shape[1]),dtype = np.complex128)
+            for i in chans:
+                self.live_chanset.add_channel_dataset(i,'time_series',data[:,i])
+                self.set_raw_scaling(i,data.dtype)
+                ft_datas[:,i] = batch_rfft(self.rec.to_physical(data[:,i],channel = i))
+                self.live_chanset.add_channel_dataset(i,'spectrum',ft_datas[:,i])
+            self.live_chanset.set_channel_metadata(chans,{'sample_rate':self.rec.rate})
+            return ft_datas
+
+        self.live_chanset.set_channel_block('time_series',data.T,chans,copy = False)
+        for i in chans:
+            self.set_raw_scaling(i,data.dtype)
+        # Transform all the channels at once, along the rows of the block
+        block = self.live_chanset.channel_block('time_series',chans)
+        ft_block = batch_rfft(self.rec.to_physical(block.T).T,axis = 1)
+        self.live_chanset.set_channel_block('spectrum',ft_block,chans,copy = False)
+
+        self.live_chanset.set_channel_metadata(chans,{'sample_rate':self.rec.rate})
+        return ft_block.T
+
+    def drain_captures(self):
+        """
+        Callback to take the events captured in multi-shot mode.
+        Each event is added to the capture ChannelSet in order, which is
+        then sent to the parent window
+        """
+        queue = self.rec.capture_queue
+        if queue is None:
+            return
+        events = queue.drain()
+        self.RecUI.update_capture_count(queue.captured,queue.dropped)
+        for event in events:
+            self.add_capture_event(event)
+        if events:
+            print('Saving %i captured events...' % len(events))
+            self.sig_time_series_data_saved.emit(self.capture_chanset)
+
+    def add_capture_event(self,event):
+        """
+        Add a multi-shot event to the capture ChannelSet, as one channel per
+        recorder channel, named after the event number and the channel
+
+        Parameters
+        ----------
+        event: dict
+            The event, as given by CaptureQueue.drain
+        """
+        data = event['data']
+        num = len(self.capture_chanset) // data.shape[1] + 1
+        comments = 'Trigger sample: %i' % event['trigger_sample']
+        if event['gaps']:
+            comments += '; Dropouts (position, missing samples): ' + \
+                        ', '.join('(%i, %i)' % tuple(gap) for gap in event['gaps'])
+        first = len(self.capture_chanset)
+        for i in range(data.shape[1]):
+            self.capture_chanset.add_channels()
+            idx = first + i
+            self.capture_chanset.set_channel_metadata(idx,
+                {'name': 'Event %i : %s' % (num,self.live_chanset.channels[i].name),
+                 'sample_rate': self.rec.rate,
+                 'comments': comments,
+                 'tags': ['dropouts'] if event['gaps'] else []})
+            self.capture_chanset.add_channel_dataset(idx,'time_series',data[:,i])
+            if data.dtype == np.int16:
+                self.capture_chanset.set_channel_scaling(idx,'time_series',
+                                                         self.rec.scale[i],
+                                                         self.rec.offset[i])
+
+    def set_raw_scaling(self,chan,dtype):
+        """
+        Set the scaling of the time series of a channel in the live ChannelSet,
+        so that raw int16 data from the recorder is converted to volts on access
+
+        Parameters
+        ----------
+        chan: int
+            Index of the channel
+        dtype: numpy dtype
+            Data type of the time series
+        """
+        if dtype == np.int16:
+            self.live_chanset.set_channel_scaling(chan,'time_series',
+                                                  self.rec.scale[chan],
+                                                  self.rec.offset[chan])
+        else:
+            self.live_chanset.set_channel_scaling(chan,'time_series',None)
+
+    def set_tf_average(self,chans):
+        """
+        Set the averaged transfer function and coherence of the output
+        channels, and send the data.
+        The transfer function is Gyy/Gxy, as calculated in the frequency
+        domain widget, which is the complex conjugate of the H2 estimate
+        of the TransferFunctionAverager
+
+        Parameters
+        ----------
+        chans: list of int
+            The output channels, in the order they were averaged
+        """
+        # Update the average count
+        self.RecUI.update_TFavg_count(self.tf_avg.count)
+        if not self.tf_avg.count:
+            return
+        tf,coh = compute_transfer_function(self.tf_avg.Gxx.reshape((-1,1)),
+                                           self.tf_avg.Gyy,self.tf_avg.Gxy)
+        for i,chan in enumerate(chans):
+            self.live_chanset.add_channel_dataset(chan,'transfer_function',tf[:,i])
+            self.live_chanset.add_channel_dataset(chan,'coherence',coh[:,i])
+        self.save_transfer_function()
+
+    def start_tf_stream(self,samples):
+        """
+        Start averaging the transfer function continuously from overlapped
+        segments of the stream, carrying on from the current average
+
+        Parameters
+        ----------
+        samples: int
+            Number of samples in a segment, limited to the buffer length
+
+        Returns
+        ----------
+        bool
+            True if the averaging started
+        """
+        in_chan = self.RecUI.get_input_channel()
+        if self.rec.channels < 2 or not 0 <= in_chan < self.rec.channels:
+            print('Need an input channel and at least one output channel')
+            return False
+        self.tf_avg.weighting = self.RecUI.get_tf_weighting()
+        self.tf_est = TransferFunctionEstimator(self.rec.channels,self.rec.rate,
+                                                input_channel = in_chan,
+                                                segment = min(samples,self.rec.ring.length),
+                                                num_averages = self.RecUI.get_tf_target(),
+                                                averager = self.tf_avg)
+        self.RecUI.update_TFavg_count(self.tf_est.count)
+        self.rec.add_chunk_listener(self.tf_est.update,physical = True)
+        # Segments spanning a dropout would corrupt the average
+        self.rec.add_gap_listener(self.tf_est.restart)
+        return True
+
+    def stop_tf_stream(self):
+        """
+        Stop the continuous transfer function average, and send the
+        averaged transfer function with the latest segment of the stream
+        """
+        est = self.tf_est
+        if est is None:
+            return
+        self.rec.remove_chunk_listener(est.update)
+        self.rec.remove_gap_listener(est.restart)
+        self.tf_est = None
+
+        for btn in self.main_widget.findChildren(QPushButton):
+            btn.setEnabled(True)
+        self.RecUI.cancelbtn.setDisabled(True)
+        self.RecUI.spec_settings_widget.setEnabled(True)
+        self.RecUI.switch_rec_box.setEnabled(True)
+        self.stats_UI.statusbar.clearMessage()
+
+        if est.count:
+            self.set_live_data(np.array(self.rec.get_buffer()[-est.segment:]))
+            self.save_time_series()
+        self.set_tf_average(est.output_channels)
+
     def undo_tf_tally(self):
         """
-        Callback to remove the last autospectrum and crossspectrum in the tally
+        Callback to remove the last average of the transfer function
         """
-        if self.autospec_in_tally:
-            self.autospec_in_tally.pop()
-            self.autospec_out_tally.pop()
-            self.crossspec_tally.pop()
-        self.RecUI.update_TFavg_count(len(self.autospec_in_tally))
+        if self.tf_est:
+            # The stream is adding to the average, so go through its lock
+            self.tf_est.undo()
+            self.RecUI.update_TFavg_count(self.tf_est.count)
+            return
+        if self.tf_avg.undo():
+            chans = list(range(self.rec.channels))
+            in_chan = self.RecUI.get_input_channel()
+            if in_chan in chans and len(chans) - 1 == self.tf_avg.Gyy.shape[1]:
+                chans.remove(in_chan)
+                self.set_tf_average(chans)
+                return
+        self.RecUI.update_TFavg_count(self.tf_avg.count)
 
     def remove_tf_tally(self):
         """
-        Callback to clear the autospectrum and crossspectrum tallies
+        Callback to clear the average of the transfer function
         """
-        if self.autospec_in_tally:
-            self.autospec_in_tally = []
-            self.autospec_out_tally = []
-            self.crossspec_tally = []
-        self.RecUI.update_TFavg_count(len(self.autospec_in_tally))
+        if self.tf_est:
+            # The stream is adding to the average, so go through its lock
+            self.tf_est.reset()
+        else:
+            self.tf_avg.clear()
+        self.RecUI.update_TFavg_count(self.tf_avg.count)
 
     # Cancel the data recording
     def cancel_recording(self):
         """
-        Callback to cancel the recording and re-enable the UIs
+        Callback to cancel the recording and re-enable the UIs.
+        The continuous transfer function average is stopped with the
+        averages taken so far
         """
+        if self.tf_est:
+            self.stop_tf_stream()
+            return
         self.rec.record_cancel()
+        self.drain_captures()
         for btn in self.main_widget.findChildren(QPushButton):
             btn.setEnabled(True)
 
@@ -616,15 +973,25 @@ class AcquisitionWindow(QMainWindow):
             # Get Input from the Device Configuration UI
             Rtype, settings = self.devconfig_UI.read_device_config()
             # Reinitialise the recording object
-            self.rec = Rtype.Recorder()
+            if Rtype == AggR:
+                # The channels are set on each source, and add up
+                self.rec = AggR.Recorder(backends = AGGREGATE_BACKENDS,
+                                         rate = settings[1],
+                                         channels = settings[2],
+                                         chunk_size = settings[3],
+                                         num_chunk = settings[4])
+            else:
+                self.rec = Rtype.Recorder()
+            self.rec.raw_storage = RAW_STORAGE
             # Set the recorder parameters
             dev_name = self.rec.available_devices()[0]
             sel_ind = min(settings[0],len(dev_name)-1)
             self.rec.set_device_by_name(dev_name[sel_ind])
-            self.rec.rate = settings[1]
-            self.rec.channels = settings[2]
-            self.rec.chunk_size = settings[3]
-            self.rec.num_chunk = settings[4]
+            if not Rtype == AggR:
+                self.rec.rate = settings[1]
+                self.rec.channels = settings[2]
+                self.rec.chunk_size = settings[3]
+                self.rec.num_chunk = settings[4]
             self.devconfig_UI.configboxes[0].setCurrentIndex(dev_name.index(self.rec.device_name))
         except:
             t,v,tb = sys.exc_info()
@@ -665,9 +1032,14 @@ class AcquisitionWindow(QMainWindow):
         self.ResetMetaData()
         self.ResetChanBtns()
         self.connect_rec_signals()
+        self.spectrum_est = None
+        self.tf_est = None
+        self.set_spectrum_mode(self.stats_UI.get_spectrum_mode())
 
         # Restart the plot update timer
-        self.plottimer.start(self.rec.chunk_size*1000//self.rec.rate)
+        self.render.reset()
+        self.peaks_written = 0
+        self.plottimer.start(self.render.interval)
 
     def ResetPlots(self):
         """
@@ -783,6 +1155,9 @@ class AcquisitionWindow(QMainWindow):
         """
         self.rec.rEmitter.recorddone.connect(self.stop_recording)
         self.rec.rEmitter.triggered.connect(self.stats_UI.trigger_message)
+        self.rec.rEmitter.overflowed.connect(self.stats_UI.dropout_message)
+        self.rec.rEmitter.underflowed.connect(lambda: self.stats_UI.dropout_message(0))
+        self.rec.rEmitter.captured.connect(self.drain_captures)
         #self.rec.rEmitter.newdata.connect(self.update_line)
         #self.rec.rEmitter.newdata.connect(self.update_chanlvls)
 
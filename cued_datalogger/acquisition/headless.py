@@ -0,0 +1,419 @@
+# -*- coding: utf-8 -*-
+"""
+This module contains the headless acquisition, to record from any Recorder
+backend from the command line, without PyQt windows or a display.
+It is meant for unattended, long-duration acquisitions.
+
+Three modes are available:
+    * duration: record for a given time
+    * trigger: wait for the trigger, then record for a given time,
+      with pretrigger samples
+    * multi-shot: capture triggered events of a given length, re-arming
+      the trigger after each one, until enough events are captured or
+      the time is up
+
+The recordings are streamed to disk (see StreamWriter) if an output name
+is given. Multi-shot events are saved as one stream recording each,
+named <output>_<event number>. The stream statistics are printed at
+regular intervals. Ctrl+C stops the acquisition, keeping what has been
+recorded so far.
+
+Typical example of using the module, from the command line:
+    | $ python -m cued_datalogger record -b ni -c 16 -r 51200 -d 3600 -o soak
+    | $ python -m cued_datalogger record -b aggregate --sources ni soundcard
+    | ...     -c 2 -d 60 -o rig
+    | $ python -m cued_datalogger record -b sim --device Impulse --multishot
+    | ...     --trigger 0.2 --pretrig 500 --event-samples 8000 --events 50 -o hits
+
+Attributes
+----------
+BACKENDS: dict
+    Module name of the Recorder backend for each --backend option
+STATS_INTERVAL: float
+    Default time (in seconds) between two lines of statistics
+POLL_INTERVAL: float
+    Time (in seconds) between two checks of the recorder state
+"""
+import argparse
+import importlib
+import time
+
+import numpy as np
+
+from cued_datalogger.acquisition.StreamWriter import StreamWriter
+
+BACKENDS = {'soundcard': 'myRecorder',
+            'ni': 'NIRecorder',
+            'sim': 'SimRecorder',
+            'aggregate': 'AggregateRecorder'}
+STATS_INTERVAL = 1.0
+POLL_INTERVAL = 0.05
+
+#------------------ COMMAND LINE -----------------------------------
+def add_arguments(parser):
+    """
+    Add the options of the headless acquisition to a parser
+
+    Parameters
+    ----------
+    parser: argparse.ArgumentParser
+        Parser (or sub-parser) of the record command
+    """
+    device = parser.add_argument_group('device')
+    device.add_argument('-b', '--backend', choices = sorted(BACKENDS),
+                        default = 'soundcard', help = "Recorder backend")
+    device.add_argument('--sources', nargs = '+', default = ['sim'],
+                        choices = sorted(set(BACKENDS) - {'aggregate'}),
+                        help = "Backends of the sources to aggregate "
+                        "(aggregate backend only)")
+    device.add_argument('--device', default = None,
+                        help = "Device name (signal type for the sim backend)")
+    device.add_argument('-r', '--rate', type = int, default = 44100,
+                        help = "Sampling rate (Hz)")
+    device.add_argument('-c', '--channels', type = int, default = 1,
+                        help = "Number of channels (of each source for the "
+                        "aggregate backend)")
+    device.add_argument('--chunk-size', type = int, default = 1024,
+                        help = "Samples per channel in one chunk")
+    device.add_argument('--num-chunk', type = int, default = 8,
+                        help = "Number of chunks in the buffer")
+
+    recording = parser.add_argument_group('recording')
+    recording.add_argument('-d', '--duration', type = float, default = 10.0,
+                           help = "Recording time (s). In multi-shot mode, the "
+                           "time to capture for (0 for no limit)")
+    recording.add_argument('-o', '--output', default = None,
+                           help = "Base name of the files to stream to. The "
+                           "recording is kept in memory if not given")
+    recording.add_argument('--stats-interval', type = float,
+                           default = STATS_INTERVAL,
+                           help = "Time (s) between two lines of statistics")
+
+    trigger = parser.add_argument_group('trigger')
+    trigger.add_argument('--trigger', type = float, default = None,
+                         metavar = 'LEVEL',
+                         help = "Wait for the signal to reach LEVEL (V) "
+                         "before recording")
+    trigger.add_argument('--trigger-channel', type = int, nargs = '+',
+                         default = [0], help = "Channel(s) to trigger on")
+    trigger.add_argument('--slope', choices = ['rising','falling','either'],
+                         default = 'either', help = "Trigger slope")
+    trigger.add_argument('--hysteresis', type = float, default = 0.0,
+                         help = "Trigger re-arming hysteresis (V)")
+    trigger.add_argument('--logic', choices = ['any','all'], default = 'any',
+                         help = "Combination of the trigger channels")
+    trigger.add_argument('--pretrig', type = int, default = 200,
+                         help = "Samples to keep from before the trigger")
+
+    multishot = parser.add_argument_group('multi-shot')
+    multishot.add_argument('--multishot', action = 'store_true',
+                           help = "Capture triggered events until enough "
+                           "are captured or the time is up")
+    multishot.add_argument('--event-samples', type = int, default = 5000,
+                           help = "Samples to capture from each trigger")
+    multishot.add_argument('--events', type = int, default = 0,
+                           help = "Number of events to capture (0 for no limit)")
+    multishot.add_argument('--blocks', type = int, default = 16,
+                           help = "Number of events waiting to be saved")
+
+def main(argv = None):
+    """
+    Run the headless acquisition with command line arguments
+
+    Parameters
+    ----------
+    argv: list of str
+        The arguments, sys.argv[1:] if None
+
+    Returns
+    ----------
+    int
+        Exit code
+    """
+    parser = argparse.ArgumentParser(description = "Record without the GUI")
+    add_arguments(parser)
+    return record(parser.parse_args(argv))
+
+#------------------ ACQUISITION -----------------------------------
+def create_recorder(args):
+    """
+    Create the recorder of the chosen backend
+
+    Parameters
+    ----------
+    args: argparse.Namespace
+        The parsed arguments
+
+    Returns
+    ----------
+    Recorder object
+    """
+    backend = importlib.import_module('cued_datalogger.acquisition.' +
+                                      BACKENDS[args.backend])
+    if args.backend == 'aggregate':
+        return backend.Recorder(backends = [BACKENDS[s] for s in args.sources],
+                                channels = args.channels,rate = args.rate,
+                                chunk_size = args.chunk_size,
+                                num_chunk = args.num_chunk)
+    return backend.Recorder(channels = args.channels,rate = args.rate,
+                            chunk_size = args.chunk_size,
+                            num_chunk = args.num_chunk,
+                            device_name = args.device)
+
+def record(args):
+    """
+    Run the acquisition described by the parsed arguments
+
+    Parameters
+    ----------
+    args: argparse.Namespace
+        The parsed arguments, see add_arguments
+
+    Returns
+    ----------
+    int
+        Exit code: 0 if successful, 1 if the acquisition could not start
+    """
+    rec = create_recorder(args)
+    if not rec.stream_init():
+        print('Cannot initialise the stream')
+        rec.close()
+        return 1
+
+    monitor = StatsMonitor(rec,args.stats_interval)
+    try:
+        if args.multishot:
+            return run_multishot(rec,args,monitor)
+        return run_recording(rec,args,monitor)
+    finally:
+        rec.close()
+        monitor.report(final = True)
+
+def run_recording(rec,args,monitor):
+    """
+    Record for the given duration, once triggered if a trigger level is given
+
+    Parameters
+    ----------
+    rec: Recorder object
+        The recorder, streaming
+    args: argparse.Namespace
+        The parsed arguments
+    monitor: StatsMonitor
+        Prints the statistics
+
+    Returns
+    ----------
+    int
+        Exit code
+    """
+    samples = int(args.duration * rec.rate)
+    if args.trigger is not None:
+        # Let the buffer fill up, for the reference level and pretrigger
+        time.sleep(rec.ring.length / rec.rate)
+        started = rec.trigger_start(threshold = args.trigger,
+                                    channel = args.trigger_channel,
+                                    pretrig = args.pretrig,posttrig = samples,
+                                    filename = args.output,slope = args.slope,
+                                    hysteresis = args.hysteresis,
+                                    logic = args.logic)
+    else:
+        started = (rec.record_init(samples = samples,filename = args.output)
+                   and rec.record_start())
+    if not started:
+        return 1
+
+    try:
+        while rec.recording or rec.trigger:
+            time.sleep(POLL_INTERVAL)
+            monitor.poll()
+    except KeyboardInterrupt:
+        print('Interrupted, keeping the data recorded so far')
+        rec.recording = False
+        rec.trigger = False
+
+    data = rec.flush_record_data()
+    if data is None:
+        print('Nothing was recorded')
+        rec.record_cancel()
+        return 0
+    print('Recorded %i samples x %i channels, %i dropout(s)'
+          % (data.shape[0],data.shape[1],len(rec.rec_gaps)))
+    if args.output:
+        print('Saved to %s' % args.output)
+    return 0
+
+def run_multishot(rec,args,monitor):
+    """
+    Capture triggered events, saving each of them, until enough events are
+    captured or the time is up
+
+    Parameters
+    ----------
+    rec: Recorder object
+        The recorder, streaming
+    args: argparse.Namespace
+        The parsed arguments
+    monitor: StatsMonitor
+        Prints the statistics
+
+    Returns
+    ----------
+    int
+        Exit code
+    """
+    if args.trigger is None:
+        print('Multi-shot mode needs a trigger level (--trigger)')
+        return 1
+    time.sleep(rec.ring.length / rec.rate)
+    if not rec.capture_start(posttrig = args.event_samples,
+                             pretrig = args.pretrig,num_blocks = args.blocks,
+                             threshold = args.trigger,
+                             channel = args.trigger_channel,slope = args.slope,
+                             hysteresis = args.hysteresis,logic = args.logic):
+        return 1
+
+    pretrig = rec.rec_start
+    saved = 0
+    start = time.perf_counter()
+    try:
+        while not args.events or saved < args.events:
+            if args.duration and time.perf_counter() - start > args.duration:
+                break
+            time.sleep(POLL_INTERVAL)
+            saved = save_events(rec,args,pretrig,saved)
+            monitor.poll()
+    except KeyboardInterrupt:
+        print('Interrupted')
+    rec.capture_stop()
+    saved = save_events(rec,args,pretrig,saved)
+
+    print('Saved %i events, %i dropped' % (saved,rec.capture_queue.dropped))
+    return 0
+
+def save_events(rec,args,pretrig,saved):
+    """
+    Drain the capture queue and save the events, up to the number of
+    events to capture. Events past that number are discarded
+
+    Parameters
+    ----------
+    rec: Recorder object
+        The recorder capturing the events
+    args: argparse.Namespace
+        The parsed arguments
+    pretrig: int
+        Number of samples from before the trigger
+    saved: int
+        Number of events saved so far
+
+    Returns
+    ----------
+    int
+        Number of events saved
+    """
+    for event in rec.capture_queue.drain():
+        if args.events and saved >= args.events:
+            break
+        if args.output:
+            save_event(rec,'%s_%04d' % (args.output,saved),event,pretrig)
+        saved += 1
+    return saved
+
+def save_event(rec,filename,event,pretrig):
+    """
+    Save a multi-shot event as a stream recording
+
+    Parameters
+    ----------
+    rec: Recorder object
+        The recorder which captured the event
+    filename: str
+        Base name of the recording
+    event: dict
+        The event, see CaptureQueue.drain
+    pretrig: int
+        Number of samples from before the trigger
+    """
+    metadata = {'chunk_size': rec.chunk_size,
+                'pretrig': pretrig,
+                'trigger_sample': event['trigger_sample'],
+                'gaps': [list(g) for g in event['gaps']]}
+    if event['data'].dtype == np.int16:
+        metadata['scale'] = rec.scale.tolist()
+        metadata['offset'] = rec.offset.tolist()
+    writer = StreamWriter(filename,rec.channels,rec.rate,
+                          dtype = event['data'].dtype,metadata = metadata)
+    writer.write(event['data'])
+    writer.close()
+
+#------------------ STATISTICS -----------------------------------
+class StatsMonitor(object):
+    """
+    Prints the throughput and dropout statistics of a recorder
+    at regular intervals
+
+    Attributes
+    ----------
+    rec: Recorder object
+        The recorder being monitored
+    interval: float
+        Time (in seconds) between two lines of statistics
+    """
+    def __init__(self,rec,interval = STATS_INTERVAL):
+        self.rec = rec
+        self.interval = interval
+        self.start = time.perf_counter()
+        self.last_time = self.start
+        self.last_written = rec.ring.total_written
+
+    def poll(self):
+        """
+        Print a line of statistics if the interval is up
+        """
+        if self.interval and time.perf_counter() - self.last_time >= self.interval:
+            self.report()
+
+    def report(self,final = False):
+        """
+        Print a line of statistics: elapsed time, sample rate achieved
+        over the last interval, data rate, recording progress and the
+        chunk counters (see RecorderParent.stats)
+
+        Parameters
+        ----------
+        final: bool
+            Whether it is the summary at the end, averaged over the whole run
+        """
+        rec = self.rec
+        now = time.perf_counter()
+        written = rec.ring.total_written
+        if final:
+            elapsed = now - self.start
+            rate = written / elapsed if elapsed > 0 else 0
+        else:
+            elapsed = now - self.last_time
+            rate = (written - self.last_written) / elapsed if elapsed > 0 else 0
+        mb_per_s = rate * rec.channels * np.dtype(rec.storage_dtype).itemsize / 1e6
+        stats = rec.stats()
+
+        line = '%s %8.1fs %10.0f S/s %7.2f MB/s' % ('total' if final else 'stats',
+                                                  now - self.start,rate,mb_per_s)
+        if rec.recording and rec.rec_end:
+            line += ' rec %5.1f%%' % (100 * (rec.rec_pos - rec.rec_start) /
+                                      max(1,rec.rec_end - rec.rec_start))
+        elif rec.trigger:
+            line += ' armed'
+        line += (' | chunks %i lag %i dropped %i lost %i overflows %i'
+                 % (stats['chunks'],stats['lag'],stats['dropped'],
+                    stats['lost_chunks'],stats['overflows']))
+        if rec.disk_writer:
+            line += ' | disk %i samples' % rec.disk_writer.samples_written
+        print(line,flush = True)
+
+        self.last_time = now
+        self.last_written = written
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(main())
@@ -186,36 +186,28 @@ class Recorder(RecorderParent):
         self.device_name = self.p.get_device_info_by_index(index)['name']
         print("Selected device: %s" % self.device_name)
 
-#---------------- DATA METHODS -----------------------------------
-    # Convert data obtained into a proper array
-    def audiodata_to_array(self,data):
-        """
-        Re-implemented from RecorderParent
-        """
-        return np.frombuffer(data, dtype = np.int16).reshape((self.chunk_size,self.channels))/ 2**15
-
 #---------------- STREAMING METHODS -----------------------------------
     def stream_audio_callback(self,in_data, frame_count, time_info, status):
         """
         Callback function for audio streaming.
-        First, it writes data to the circular buffer,
-        then record data if it is recording,
-        finally check for any trigger.
+        It only hands the raw data over to the consumer thread,
+        which does the rest (see RecorderParent.process_chunk).
+
+        The chunk is stamped with the ADC time of its first sample, and
+        the PortAudio status flags (which match the STATUS constants of
+        RecorderParent), so that dropouts can be detected.
 
         Inputs and Outputs are part of the callback format.
         More info can be found in PyAudio documentation
         """
-        data_array = self.audiodata_to_array(in_data)
-        self.write_buffer(data_array)
+        # Some host APIs do not give the ADC time. It can be 0.0 when the
+        # stream clock starts at zero, so only fall back if it is missing
+        timestamp = time_info.get('input_buffer_adc_time')
+        if timestamp is None:
+            timestamp = time_info.get('current_time')
+        self.push_chunk(in_data,timestamp,status)
         #self.rEmitter.newdata.emit()
 
-        if self.recording:
-            self.record_data(data_array)
-
-         # Trigger check
-        if self.trigger:
-            self._trigger_check_threshold(data_array)
-
         return(in_data,pyaudio.paContinue)
 
     # TODO: Check for valid device, channels and all that before initialisation
@@ -225,6 +217,7 @@ class Recorder(RecorderParent):
         """
         if (not self.device_index == None) and (self.audio_stream == None) :
             try:
+                self.consumer_start()
                 self.audio_stream = self.p.open(channels = self.channels,
                                  rate = self.rate,
                                  format = self.format,
@@ -247,6 +240,7 @@ class Recorder(RecorderParent):
                 print(v)
                 print(traceback.format_tb(tb))
                 self.audio_stream = None
+                self.consumer_stop()
                 return False
         else:
             return False
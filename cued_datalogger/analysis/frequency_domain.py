@@ -7,10 +7,22 @@ from PyQt5.QtWidgets import (QWidget, QGridLayout, QPushButton, QComboBox,
                              QCheckBox, QLabel, QGroupBox)
 from PyQt5.QtCore import pyqtSignal
 
+import collections
+
 import numpy as np
 from numpy.fft import rfft
 
 
+def calculate_channel_spectrum(channel):
+    """Calculate the spectrum of the Hann windowed time series of *channel*,
+    and store it in the channel."""
+    time_series = channel.data("time_series")
+    window = np.hanning(time_series.size)
+    spectrum = rfft(time_series * window)
+
+    channel.add_dataset("spectrum", data=spectrum)
+
+
 class FrequencyDomainWidget(InteractivePlotWidget):
     """
     The FrequencyDomainWidget is the main display widget for everything in
@@ -153,11 +165,9 @@ class FrequencyDomainWidget(InteractivePlotWidget):
         print("Calculating spectrum...")
         for channel in self.channels:
             if channel.is_dataset("time_series"):
-                time_series = channel.data("time_series")
-                window = np.hanning(time_series.size)
-                spectrum = rfft(time_series * window)
-
-                channel.add_dataset("spectrum", data=spectrum)
+                # Only recalculated if the time series has changed
+                channel.derive("spectrum", ["time_series"], {"window": "hann"},
+                               calculate_channel_spectrum)
 
             else:
                 print("Skipping {}: no 'time_series' "
@@ -230,6 +240,124 @@ def compute_transfer_function(autospec_in,autospec_out,crossspec):
     return(transfer_func,np.real(coherence))
 
 
+class TransferFunctionAverager(object):
+    """
+    Running average of the auto- and cross-spectra of one input and
+    several outputs, to estimate averaged transfer functions.
+
+    Adding an average only updates the running averages, so it costs the
+    same however many averages there are. The previous averages are kept
+    in a bounded history, so that the last few averages can be undone.
+
+    Attributes
+    ----------
+    weighting : str
+        'linear': all averages weigh the same,
+        'exponential': the newest averages weigh more, with a time constant
+        of *num_averages* averages
+    num_averages : int
+        Time constant of the exponential weighting
+    count : int
+        Number of averages taken
+    Gxx : ndarray
+        Averaged input autospectrum, of dimension (frequencies,)
+    Gyy : ndarray
+        Averaged output autospectra, of dimension (frequencies, outputs)
+    Gxy : ndarray
+        Averaged cross spectra, of dimension (frequencies, outputs)
+    """
+    def __init__(self, weighting='linear', num_averages=10, history=32):
+        if weighting not in ('linear', 'exponential'):
+            raise ValueError("Unknown weighting: {}".format(weighting))
+        self.weighting = weighting
+        self.num_averages = max(1, int(num_averages))
+        self.history = collections.deque(maxlen=history)
+        self.clear()
+
+    def clear(self):
+        """Remove all the averages."""
+        self.count = 0
+        self.Gxx = None
+        self.Gyy = None
+        self.Gxy = None
+        self.history.clear()
+
+    @property
+    def num_frequencies(self):
+        """The number of frequencies of the averaged spectra (0 if none)."""
+        return 0 if self.Gxx is None else self.Gxx.shape[0]
+
+    def add(self, input_spectrum, output_spectra):
+        """Add one average, from the spectrum *input_spectrum* of the input
+        (of dimension (frequencies,)) and the spectra *output_spectra* of the
+        outputs (of dimension (frequencies, outputs))."""
+        X = np.asarray(input_spectrum)
+        Y = np.asarray(output_spectra)
+        if Y.ndim == 1:
+            Y = Y.reshape((-1, 1))
+        Gxx = calculate_auto_spectrum(X).real
+        Gyy = calculate_auto_spectrum(Y).real
+        Gxy = calculate_cross_spectrum(X.reshape((-1, 1)), Y)
+        self.add_spectra(Gxx, Gyy, Gxy)
+
+    def add_spectra(self, Gxx, Gyy, Gxy, n=1):
+        """Add the auto- and cross-spectra *Gxx*, *Gyy* and *Gxy*, which are
+        themselves the average of *n* averages."""
+        if self.count == 0:
+            self.Gxx = np.zeros(Gxx.shape)
+            self.Gyy = np.zeros(Gyy.shape)
+            self.Gxy = np.zeros(Gxy.shape, dtype=np.complex128)
+        elif not Gxx.shape == self.Gxx.shape or not Gyy.shape == self.Gyy.shape:
+            raise ValueError("Spectra of shape {} do not match the averaged "
+                             "spectra of shape {}".format(Gyy.shape,
+                                                          self.Gyy.shape))
+        if self.history.maxlen is None or self.history.maxlen > 0:
+            self.history.append((self.count, self.Gxx.copy(), self.Gyy.copy(),
+                                 self.Gxy.copy()))
+
+        self.count += n
+        if self.weighting == 'exponential':
+            weight = n / min(self.count, max(n, self.num_averages))
+        else:
+            weight = n / self.count
+        self.Gxx += weight * (Gxx - self.Gxx)
+        self.Gyy += weight * (Gyy - self.Gyy)
+        self.Gxy += weight * (Gxy - self.Gxy)
+
+    def undo(self):
+        """Remove the last average, if it is still in the history.
+
+        Returns
+        -------
+        bool
+            True if an average was removed
+        """
+        if not self.history:
+            if self.count:
+                print("Cannot undo further than {} averages".format(
+                    self.history.maxlen))
+            return False
+        self.count, self.Gxx, self.Gyy, self.Gxy = self.history.pop()
+        if self.count == 0:
+            self.clear()
+        return True
+
+    def h1(self):
+        """The H1 transfer function estimates (Gxy / Gxx) of all the outputs,
+        best when the noise is on the outputs."""
+        return self.Gxy / self.Gxx.reshape((-1, 1))
+
+    def h2(self):
+        """The H2 transfer function estimates (Gyy / Gyx) of all the outputs,
+        best when the noise is on the input."""
+        return self.Gyy / self.Gxy.conj()
+
+    def coherence(self):
+        """The coherence between the input and each output."""
+        return (np.abs(self.Gxy)**2 /
+                (self.Gxx.reshape((-1, 1)) * self.Gyy))
+
+
 class FrequencyToolbox(Toolbox):
     """Toolbox containing the Frequency Domain controls."""
     sig_convert_to_circle_fit = pyqtSignal()
@@ -136,40 +136,53 @@ class SonogramDisplayWidget(ColorMapPlotWidget):
 
     def calculate_sonogram(self):
         """Calculate the sonogram, and store the values in the channel
-        (including autogenerated datasets). Sonogram data is in complex form."""
+        (including autogenerated datasets). Sonogram data is in complex form.
+        A channel's sonogram is only recalculated if its time series or the
+        window settings have changed."""
+        params = {"window": "hann",
+                  "nperseg": self.window_width,
+                  "noverlap": self.window_width // self.window_overlap_fraction}
         for channel in self.channels:
             if channel.is_dataset("time_series"):
-                (frequencies,
-                 times,
-                 spectrum) = scipy.signal.spectrogram(channel.data("time_series"),
-                                                     channel.metadata("sample_rate"),
-                                                     window=scipy.signal.get_window('hann', self.window_width),
-                                                     nperseg=self.window_width,
-                                                     noverlap=self.window_width // self.window_overlap_fraction,
-                                                     return_onesided=False,
-                                                     mode = 'complex')
-                # SciPy's spectrogram gives the FT transposed, so we need to transpose it back
-                spectrum = spectrum.transpose()
-                # Scipy calculates all the conjugate spectra/frequencies as well -
-                # we only want the positive ones
-                frequencies = np.abs(frequencies[:frequencies.size // 2 + 1])
-                spectrum = spectrum[:, :spectrum.shape[1] // 2 + 1]
-
-                channel.add_dataset("sonogram_frequency", data=frequencies, units="Hz")
-                channel.add_dataset("sonogram_omega", data=frequencies*2*np.pi, units="rad")
-                channel.add_dataset("sonogram_time", data=times, units="s")
-
-                channel.add_dataset("sonogram", data=spectrum, units=None)
-                channel.add_dataset("sonogram_phase", data=np.angle(spectrum), units='rad')
-                channel.add_dataset("sonogram_step", data=self.window_width // self.window_overlap_fraction, units=None)
+                channel.derive("sonogram", ["time_series"], params,
+                               self.calculate_channel_sonogram)
+
+    def calculate_channel_sonogram(self, channel):
+        """Calculate the sonogram of one channel with the current window
+        settings, and store the values in the channel."""
+        (frequencies,
+         times,
+         spectrum) = scipy.signal.spectrogram(channel.data("time_series"),
+                                             channel.metadata("sample_rate"),
+                                             window=scipy.signal.get_window('hann', self.window_width),
+                                             nperseg=self.window_width,
+                                             noverlap=self.window_width // self.window_overlap_fraction,
+                                             return_onesided=False,
+                                             mode = 'complex')
+        # SciPy's spectrogram gives the FT transposed, so we need to transpose it back
+        spectrum = spectrum.transpose()
+        # Scipy calculates all the conjugate spectra/frequencies as well -
+        # we only want the positive ones
+        frequencies = np.abs(frequencies[:frequencies.size // 2 + 1])
+        spectrum = spectrum[:, :spectrum.shape[1] // 2 + 1]
+
+        channel.add_dataset("sonogram_frequency", data=frequencies, units="Hz")
+        channel.add_dataset("sonogram_omega", data=frequencies*2*np.pi, units="rad")
+        channel.add_dataset("sonogram_time", data=times, units="s")
+
+        channel.add_dataset("sonogram", data=spectrum, units=None)
+        channel.add_dataset("sonogram_phase", data=np.angle(spectrum), units='rad')
+        channel.add_dataset("sonogram_step", data=self.window_width // self.window_overlap_fraction, units=None)
 
     def update_plot(self):
         """Clear the canvas and replot."""
         self.clear()
         if self.channels is not None:
+            # Only the channels whose sonogram is out of date are calculated
+            self.calculate_sonogram()
             for channel in self.channels:
                 if not channel.is_dataset("sonogram"):
-                    self.calculate_sonogram()
+                    continue
                 self.plot_colormap(channel.data("sonogram_frequency"),
                                    channel.data("sonogram_time"),
                                    to_dB(np.abs(channel.data("sonogram"))),
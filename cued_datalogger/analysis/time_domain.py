@@ -4,6 +4,10 @@ from cued_datalogger.api.toolbox import Toolbox
 from PyQt5.QtWidgets import QWidget, QGridLayout, QPushButton
 from PyQt5.QtCore import pyqtSignal
 
+# Time series longer than this are plotted as their envelope, so that long
+# (eg. memory-mapped) recordings are not loaded or drawn in full
+MAX_PLOT_POINTS = 200000
+
 
 class TimeDomainWidget(InteractivePlotWidget):
     """
@@ -26,10 +30,17 @@ class TimeDomainWidget(InteractivePlotWidget):
     def update_plot(self):
         self.clear()
         for channel in self.channels:
-            if channel.is_dataset("time_series"):
+            if not channel.is_dataset("time_series"):
+                continue
+            if channel.dataset("time_series").data.size <= MAX_PLOT_POINTS:
                 self.plot(channel.data("time"),
                           channel.data("time_series"),
                           pen=channel.colour)
+            else:
+                index, values = channel.downsampled("time_series",
+                                                    MAX_PLOT_POINTS)
+                self.plot(index / channel.sample_rate, values,
+                          pen=channel.colour)
 
 
 class TimeToolbox(Toolbox):
@@ -2,6 +2,8 @@ if __name__ == '__main__':
     import sys
     sys.path.append('../')
 
+import weakref
+
 import numpy as np
 import pyqtgraph as pg
 
@@ -12,6 +14,43 @@ from PyQt5.QtWidgets import (QWidget, QPushButton, QVBoxLayout,
                              QLineEdit, QCheckBox, QScrollArea,
                              QTreeWidget, QTreeWidgetItem, QHBoxLayout)
 
+# DataSets calculated by the Channel when they are accessed, from the
+# sample rate and the length of the data they are axes of
+AUTOGENERATED_AXES = ("time", "frequency", "omega")
+
+# Axis arrays by (id_, sample_rate, length), kept while a Channel uses them
+_axis_cache = weakref.WeakValueDictionary()
+
+def autogenerated_axis(id_, sample_rate, length):
+    """Return the data of the autogenerated DataSet *id\_* (``"time"``,
+    ``"frequency"`` or ``"omega"``) for *length* points at *sample_rate*.
+    The array is read-only, and shared by all the Channels with the same
+    sample rate and length."""
+    key = (id_, sample_rate, length)
+    axis = _axis_cache.get(key)
+    if axis is None:
+        if id_ == "time":
+            axis = np.linspace(0, length / sample_rate, length)
+        elif id_ == "frequency":
+            axis = np.linspace(0, sample_rate/2, length)
+        elif id_ == "omega":
+            axis = autogenerated_axis("frequency", sample_rate, length) * 2*np.pi
+        else:
+            raise ValueError("'id_' must be one of {}".format(AUTOGENERATED_AXES))
+        axis.flags.writeable = False
+        _axis_cache[key] = axis
+    return axis
+
+# Number of samples in each chunk when iterating over a DataSet
+CHUNK_SIZE = 1 << 20
+
+# Hits and misses of the derived DataSets (see Channel.derive), by id_
+derivation_stats = {}
+
+def reset_derivation_stats():
+    """Clear the hit and miss counters of the derived DataSets."""
+    derivation_stats.clear()
+
 class ChannelSet(object):
     """
     A group of channels, with methods for setting and getting data.
@@ -27,6 +66,13 @@ class ChannelSet(object):
     which uses tuple indexing, eg. ``channelset.channels[1, 2, range(5,10)]``,
     so that multiple channels can be selected easily.
 
+    DataSets of equal length can also be stored as one columnar block (see
+    :meth:`set_channel_block`): an array with dimension of channels x
+    samples, of which each Channel's DataSet holds a row view.
+    The block can then be taken back as a whole by :meth:`channel_block`
+    for vectorised analysis, eg. ``rfft(channelset.channel_block('time_series'),
+    axis=1)``.
+
 
     Attributes
     ----------
@@ -35,16 +81,27 @@ class ChannelSet(object):
 
     colormap : ColorMap
         A :class:`ColorMap` used for colouring the channels in this set.
+
+    blocks : dict
+        The columnar blocks, by DataSet id\_. Each item is a tuple of the
+        channel indices, the block, and the row views held by the DataSets.
     """
     def __init__(self, initial_num_channels=0):
         """Create the ChannelSet with a number of blank channels as given by
         *initial_num_channels*."""
         # Initialise the channel list
         self.channels = MatlabList()
+        self.blocks = {}
 
         # Create an initial number of channels
         self.add_channels(initial_num_channels)
 
+    def __setstate__(self, state):
+        """Restore a pickled ChannelSet, including ones pickled before
+        :attr:`blocks` existed."""
+        self.__dict__.update(state)
+        self.__dict__.setdefault('blocks', {})
+
     def __len__(self):
         """Return the number of Channels in this ChannelSet."""
         return len(self.channels)
@@ -74,15 +131,13 @@ class ChannelSet(object):
         # If an tuple is given, indexing the channels will give an iterable,
         # otherwise it will give one result
         if isinstance(channel_index, tuple):
-            for channel in self.channels[channel_index]:
-                channel.add_dataset(id_)
+            channels = self.channels[channel_index]
         else:
-            self.channels[channel_index].add_dataset(id_)
-
-        if data is not None:
-            self.set_channel_data(channel_index, id_, data)
-        if units is not None:
-            self.set_channel_units(channel_index, id_, units)
+            channels = [self.channels[channel_index]]
+        # Set the data as the DataSet is added, not afterwards, so that the
+        # autogenerated DataSets are only calculated once
+        for channel in channels:
+            channel.add_dataset(id_, units, [] if data is None else data)
 
     def set_channel_data(self, channel_index, id_, data):
         """Set the data of DataSet with *id\_* to *data* in the Channel
@@ -95,6 +150,28 @@ class ChannelSet(object):
         else:
             self.channels[channel_index].set_data(id_, data)
 
+    def set_channel_block(self, id_, block, channel_index=None, copy=True):
+        """Set the data of DataSet with *id\_* in the Channels specified by
+        *channel_index* (default all Channels) to the rows of *block*, an
+        array with dimension of channels x samples. The block is copied
+        into one C-contiguous array, unless *copy* is False, in which case
+        it is stored as it is, eg. the transpose of a samples x channels
+        recording with strided rows. Each DataSet holds a view of its row.
+        DataSets are created if needed."""
+        indices = self._channel_indices(channel_index)
+        if copy:
+            block = np.array(block, order='C')
+        else:
+            block = np.asarray(block)
+        if block.ndim != 2 or block.shape[0] != len(indices):
+            raise ValueError("'block' must have one row for each of the "
+                             "{} channels".format(len(indices)))
+
+        rows = list(block)
+        for i, row in zip(indices, rows):
+            self.channels[i].add_dataset(id_, data=row)
+        self.blocks[id_] = (indices, block, rows)
+
     def set_channel_units(self, channel_index, id_, units):
         """Set the units of DataSet with *id\_* to *units* in the Channel
         specified by *channel_index*."""
@@ -106,6 +183,18 @@ class ChannelSet(object):
         else:
             self.channels[channel_index].set_units(id_, units)
 
+    def set_channel_scaling(self, channel_index, id_, scale, offset=0):
+        """Set the *scale* and *offset* that convert the raw data of DataSet
+        with *id\_* to physical units, in the Channel specified by
+        *channel_index*."""
+        # If an tuple is given, indexing the channels will give an iterable,
+        # otherwise it will give one result
+        if isinstance(channel_index, tuple):
+            for channel in self.channels[channel_index]:
+                channel.set_scaling(id_, scale, offset)
+        else:
+            self.channels[channel_index].set_scaling(id_, scale, offset)
+
     def set_channel_metadata(self, channel_index, metadata_dict):
         """Set metadata of the Channel specified by *channel_index* using
         the keys and values given in *metadata_dict*."""
@@ -170,6 +259,76 @@ class ChannelSet(object):
         else:
             return self.channels[channel_index].data(id_)
 
+    def channel_block(self, id_, channel_index=None, scaled=False):
+        """Return the data from the DataSet given by *id\_* in the Channels
+        specified by *channel_index* (default all Channels) as one array,
+        with dimension of channels x samples. The stored block is returned
+        (without a copy) if the DataSets still hold its rows, otherwise the
+        rows are stacked into a new array, which needs them to have equal
+        lengths. If *scaled*, raw data is converted to physical units (see
+        :meth:`Channel.data`) in a new array."""
+        indices = self._channel_indices(channel_index)
+        block = self._stored_block(id_, indices)
+        if block is None:
+            block = np.stack([self.channels[i].dataset(id_).data
+                              for i in indices])
+
+        if scaled:
+            datasets = [self.channels[i].dataset(id_) for i in indices]
+            if any(ds.scale is not None for ds in datasets):
+                gain = np.ones(len(indices))
+                offset = np.zeros(len(indices))
+                for k, (i, ds) in enumerate(zip(indices, datasets)):
+                    if ds.scale is not None:
+                        factor = self.channels[i].calibration_factor
+                        gain[k] = ds.scale * factor
+                        offset[k] = ds.offset * factor
+                block = block.astype(np.float64)
+                block *= gain[:, np.newaxis]
+                block += offset[:, np.newaxis]
+        return block
+
+    def _stored_block(self, id_, indices):
+        """Return the stored block of DataSet *id\_* for the Channels at
+        *indices*, or None if it has none or any of the DataSets no longer
+        holds its row."""
+        if not indices or id_ not in self.blocks:
+            return None
+        block_indices, block, rows = self.blocks[id_]
+        for i, row in zip(block_indices, rows):
+            if i >= len(self):
+                return None
+            try:
+                if self.channels[i].dataset(id_).data is not row:
+                    return None
+            except ValueError:
+                return None
+
+        if indices == block_indices:
+            return block
+        if not set(indices) <= set(block_indices):
+            return None
+        positions = [block_indices.index(i) for i in indices]
+        # A run of consecutive rows is still a view, others are copied
+        if positions == list(range(positions[0], positions[-1] + 1)):
+            return block[positions[0]:positions[-1] + 1]
+        return block[positions]
+
+    def _channel_indices(self, channel_index):
+        """Return a list of the Channel indices given by *channel_index*:
+        None (all Channels), an int, or a tuple/list of ints and ranges."""
+        if channel_index is None:
+            return list(range(len(self)))
+        if isinstance(channel_index, (int, np.integer)):
+            return [int(channel_index)]
+        indices = []
+        for i in channel_index:
+            if isinstance(i, range):
+                indices.extend(i)
+            else:
+                indices.append(int(i))
+        return indices
+
     def channel_units(self, channel_index, id_):
         """Return the units from the DataSet given by *id\_* in the Channel
         specified by *channel_index*."""
@@ -251,7 +410,20 @@ class Channel(object):
     colour : tuple
         An RGBA tuple for this channel's colour - usually set
         by its parent ChannelSet
+
+    Notes
+    -----
+    DataSets calculated from other DataSets (eg. 'spectrum' from
+    'time_series') can be kept up to date with :meth:`derive`, which only
+    recalculates them when the versions of their input DataSets (see
+    :attr:`DataSet.version`), the channel's sample rate or calibration
+    factor, or the parameters of the calculation have changed. The hits and
+    misses are counted in :data:`derivation_stats`, by DataSet id\_.
     """
+    __slots__ = ('name', 'comments', 'tags', 'sample_rate',
+                 'calibration_factor', 'transfer_function_type', 'datasets',
+                 'colour', '_index', '_axis_keys', '_derivations')
+
     def __init__(self, name='', datasets=[],
                  comments='',
                  tags=[],
@@ -271,18 +443,79 @@ class Channel(object):
         self.calibration_factor = calibration_factor
         self.transfer_function_type = transfer_function_type
         self.datasets = []
+        self._index = {}
+        self._axis_keys = {}
+        self._derivations = {}
         self.colour = colour
 
-        # Create the auto-generated datasets
-        self.add_dataset("time", 's')
-        self.add_dataset("frequency", 'Hz')
-        self.add_dataset("omega", 'rad')
+        # Create the auto-generated datasets, calculated on access
+        for id_, units in [("time", 's'), ("frequency", 'Hz'), ("omega", 'rad')]:
+            self._append_dataset(DataSet(id_, units))
 
         # Set the channel datasets
         for ds in datasets:
             self.add_dataset(ds.id_, ds.units, ds.data)
 
-        self.update_autogenerated_datasets()
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in self.__slots__
+                if name != '_index'}
+
+    def __setstate__(self, state):
+        """Restore a pickled Channel, including ones pickled before
+        __slots__ were used."""
+        if isinstance(state, tuple):
+            state = state[1]
+        self._axis_keys = {}
+        self._derivations = {}
+        for name, value in state.items():
+            setattr(self, name, value)
+        self._index = {ds.id_: ds for ds in self.datasets}
+
+    def _append_dataset(self, ds):
+        """Add the DataSet *ds* to the list and the index."""
+        self.datasets.append(ds)
+        self._index[ds.id_] = ds
+
+    def _find(self, id_):
+        """Return the DataSet with *id\_*, raising a ValueError if there is
+        none. Autogenerated DataSets are brought up to date first."""
+        try:
+            ds = self._index[id_]
+        except KeyError:
+            # The list may have been changed directly
+            if len(self._index) != len(self.datasets):
+                self._index = {ds.id_: ds for ds in self.datasets}
+            if id_ not in self._index:
+                raise ValueError("No such DataSet {}".format(id_))
+            ds = self._index[id_]
+        if id_ in AUTOGENERATED_AXES:
+            key = self._axis_key(id_)
+            if key is not None and self._axis_keys.get(id_) != key:
+                ds.set_data(autogenerated_axis(*key))
+                self._axis_keys[id_] = key
+        return ds
+
+    def _has_data(self, id_):
+        """Return whether the DataSet *id\_* exists with data, without
+        calculating it."""
+        ds = self._index.get(id_)
+        return ds is not None and len(ds.data) > 0
+
+    def _axis_key(self, id_):
+        """Return the (id\_, sample_rate, length) that the autogenerated
+        DataSet *id\_* is calculated from (see :func:`autogenerated_axis`),
+        or None if there is no data to calculate it from."""
+        if id_ == "time":
+            if self._has_data("time_series"):
+                return (id_, self.sample_rate, self._index["time_series"].data.size)
+            elif self._has_data("sonogram"):
+                return (id_, self.sample_rate, 0)
+            return None
+        # Both TF and FFT requires frequency bins
+        for source in ("spectrum", "transfer_function", "sonogram"):
+            if self._has_data(source):
+                return (id_, self.sample_rate, self._index[source].data.size)
+        return None
 
     def info(self):
         """Print this Channel's attributes, including DataSet ids
@@ -308,61 +541,74 @@ class Channel(object):
     def is_dataset(self, id_):
         """Return a boolean of whether the dataset given by *id\_*
         exists with data already."""
-        for ds in self.datasets:
-            if ds.id_ == id_:
-                if len(ds.data):
-                    return True
-        return False
+        if id_ in AUTOGENERATED_AXES and id_ in self._index:
+            self._find(id_)
+        return self._has_data(id_)
 
     def add_dataset(self, id_, units=None, data=[]):
         """Create a new dataset in this channel with *id\_*, *units*, *data*.
         If a dataset given by *id\_* exists set its units and data."""
         # If it does not already exist, add it
-        if not id_ in self.ids():
-            self.datasets.append(DataSet(id_, units, data))
-            self.update_autogenerated_datasets()
+        if not id_ in self._index:
+            self._append_dataset(DataSet(id_, units, data))
         else:
             # If a dataset already exist, then set its data
-            self.set_data(id_, data)
             if units is not None:
                 self.set_units(id_, units)
-            self.update_autogenerated_datasets()
+            self.set_data(id_, data)
 
     def set_data(self, id_, data):
         """Set the data in dataset *id\_* to *data*."""
         # Set the data for a pre-existing DataSet
-        for ds in self.datasets:
-            if ds.id_ == id_:
-                ds.set_data(data)
-                self.update_autogenerated_datasets()
+        try:
+            ds = self._find(id_)
+        except ValueError:
+            raise ValueError("No such DataSet '{}'".format(id_))
+        if id_ in AUTOGENERATED_AXES:
+            if data is None or len(data) == 0:
+                # Empty data clears the autogenerated DataSet, so that it
+                # is calculated again on its next access
+                ds.set_data([])
+                self._axis_keys.pop(id_, None)
                 return
-        raise ValueError("No such DataSet '{}'".format(id_))
+            # Data given for an autogenerated DataSet is kept until the data
+            # it is calculated from changes length, or the sample rate changes
+            ds.set_data(data)
+            self._axis_keys[id_] = self._axis_key(id_)
+        else:
+            ds.set_data(data)
 
     def set_units(self, id_, units):
         """Set the units of dataset *id\_* to *units*."""
         # Set the units for a pre-existing DataSet
-        for ds in self.datasets:
-            if ds.id_ == id_:
-                ds.set_units(units)
-                return
-        raise ValueError("No such DataSet '{}'".format(id_))
+        try:
+            ds = self._find(id_)
+        except ValueError:
+            raise ValueError("No such DataSet '{}'".format(id_))
+        ds.set_units(units)
+
+    def set_scaling(self, id_, scale, offset=0):
+        """Set the scale and offset that convert the raw data in dataset
+        *id\_* to physical units."""
+        try:
+            ds = self._find(id_)
+        except ValueError:
+            raise ValueError("No such DataSet '{}'".format(id_))
+        ds.set_scaling(scale, offset)
 
     def set_metadata(self, metadata_dict):
         """Set the channel metadata to the metadata given in
         *metadata_dict*."""
         for metadata_name, metadata_value in metadata_dict.items():
             # If a permitted item of metadata is given, set metadata
-            if hasattr(self, metadata_name):
+            if hasattr(self, metadata_name) and not metadata_name.startswith('_'):
                 setattr(self, metadata_name, metadata_value)
             else:
                 raise ValueError("No such metadata '{}'".format(metadata_name))
 
     def dataset(self, id_):
         """Return the DataSet in this channel with *id\_*."""
-        for ds in self.datasets:
-            if ds.id_ == id_:
-                return ds
-        raise ValueError("No such DataSet {}".format(id_))
+        return self._find(id_)
 
     def ids(self):
         """Return a list of the DataSet ids that this channel has."""
@@ -370,19 +616,37 @@ class Channel(object):
         return [ds.id_ for ds in self.datasets]
 
     def data(self, id_):
-        """Return the data from the DataSet given by *id\_*."""
-        for ds in self.datasets:
-            if ds.id_ == id_:
-                return ds.data
-        # If no dataset found, return an empty array instead
-        raise ValueError("No such DataSet {}".format(id_))
+        """Return the data from the DataSet given by *id\_*. If the DataSet
+        stores raw samples, they are scaled to physical units (see
+        :meth:`DataSet.scaled_data`) using this channel's
+        :attr:`calibration_factor`."""
+        ds = self._find(id_)
+        if ds.scale is not None:
+            return ds.scaled_data(self.calibration_factor)
+        return ds.data
+
+    def data_slice(self, id_, start=None, stop=None, step=None):
+        """Return the data from the DataSet given by *id\_* between *start*
+        and *stop* (with *step*), scaled as in :meth:`data`. Only that part
+        is read from a memory-mapped DataSet."""
+        return self._find(id_).scaled_data(self.calibration_factor,
+                                           start=start, stop=stop, step=step)
+
+    def iter_data(self, id_, chunk_size=CHUNK_SIZE):
+        """Iterate over the data from the DataSet given by *id\_* in chunks
+        of *chunk_size* samples, scaled as in :meth:`data`, yielding the
+        start index and the data of each chunk (see :meth:`DataSet.chunks`)."""
+        return self._find(id_).chunks(chunk_size, self.calibration_factor)
+
+    def downsampled(self, id_, max_points):
+        """Return the indices and values of at most *max_points* points
+        following the envelope of the data from the DataSet given by *id\_*,
+        scaled as in :meth:`data` (see :meth:`DataSet.downsampled`)."""
+        return self._find(id_).downsampled(max_points, self.calibration_factor)
 
     def units(self, id_):
         """Return the units from the DataSet given by *id\_*."""
-        for ds in self.datasets:
-            if ds.id_ == id_:
-                return ds.units
-        raise ValueError("No such DataSet {}".format(id_))
+        return self._find(id_).units
 
     def metadata(self, metadata_id=None):
         """Return the value of this channel's metadata associated with
@@ -401,23 +665,54 @@ class Channel(object):
                     if key == metadata_id:
                         return value
 
+    def derive(self, id_, inputs, params, calculate):
+        """Bring the derived DataSet *id\_* up to date with the DataSets
+        *inputs* (a list of ids) and the dict of parameters *params*.
+        ``calculate(channel)`` is called to set the DataSet (and any others
+        calculated with it) only if it has never been derived, if the inputs
+        or parameters have changed since, or if it has been set otherwise.
+        Return True if it was recalculated."""
+        state = self._derivation_state(inputs, params)
+        record = self._derivations.get(id_)
+        stats = derivation_stats.setdefault(id_, {'hits': 0, 'misses': 0})
+        if (record is not None and record[0] == state
+                and id_ in self._index and self._index[id_].version == record[1]):
+            stats['hits'] += 1
+            return False
+
+        stats['misses'] += 1
+        calculate(self)
+        if id_ in self._index:
+            self._derivations[id_] = (state, self._index[id_].version)
+        return True
+
+    def derivation(self, id_):
+        """Return the versions of the input DataSets and the parameters that
+        the DataSet *id\_* was last derived from (see :meth:`derive`), as a
+        dict, or None if it has not been derived."""
+        record = self._derivations.get(id_)
+        if record is None:
+            return None
+        versions, sample_rate, calibration_factor, params = record[0]
+        return {'inputs': dict(versions),
+                'sample_rate': sample_rate,
+                'calibration_factor': calibration_factor,
+                'params': dict(params)}
+
+    def _derivation_state(self, inputs, params):
+        """Return a comparable record of the versions of the DataSets
+        *inputs*, the channel metadata used to calculate with them, and
+        *params*."""
+        versions = tuple((i, self._index[i].version if i in self._index else None)
+                         for i in inputs)
+        return (versions, self.sample_rate, self.calibration_factor,
+                tuple(sorted(params.items())))
+
     def update_autogenerated_datasets(self):
-        """Regenerate the values in the automatically generated DataSets."""
-        if self.is_dataset("time_series") or self.is_dataset("sonogram"):
-            t = self.dataset("time")
-            t.set_data(np.linspace(0, self.data("time_series").size / self.sample_rate, self.data("time_series").size))
-        # Both TF and FFT requires frequency bins
-        if self.is_dataset("spectrum") or self.is_dataset("transfer_function") or self.is_dataset("sonogram"):
-            if self.is_dataset("spectrum"):
-                data = self.data("spectrum")
-            elif self.is_dataset("transfer_function"):
-                data = self.data("transfer_function")
-            elif self.is_dataset("sonogram"):
-                data = self.data("sonogram")
-            f = self.dataset("frequency")
-            f.set_data(np.linspace(0, self.sample_rate/2, data.size))
-            w = self.dataset("omega")
-            w.set_data(self.data("frequency") * 2*np.pi)
+        """Recalculate the automatically generated DataSets on their next
+        access. They are otherwise only recalculated when the sample rate
+        or the length of the data they are calculated from changes."""
+        self._axis_keys = {}
 
 
 class DataSet(object):
@@ -434,7 +729,23 @@ class DataSet(object):
         The SI unit in which the data is measured.
 
     data : ndarray
-        A numpy array of data points associated with id\_.
+        A numpy array of data points associated with id\_. It may be a
+        :class:`numpy.memmap` (eg. a recording imported from disk), in which
+        case it is kept on disk: :meth:`scaled_data` slices, :meth:`chunks`
+        and :meth:`downsampled` only read the parts they need.
+
+    scale : float or None
+        If not ``None``, :attr:`data` holds raw samples (eg. int16 from the
+        recorder) which are converted to physical units by multiplying by
+        *scale* and adding :attr:`offset`. See :meth:`scaled_data`.
+
+    offset : float
+        Offset added to the scaled raw samples.
+
+    version : int
+        Incremented whenever the data or scaling is set, so that DataSets
+        derived from this one can tell whether it has changed. Changes made
+        to :attr:`data` in place are not counted.
 
     Notes
     -----
@@ -466,14 +777,34 @@ class DataSet(object):
 
     * ``"transfer_function"``
 
-    (\* indicates that this DataSet is auto-generated by the Channel)
+    (\* indicates that this DataSet is auto-generated by the Channel, when it
+    is accessed. Its data is a read-only array shared by the Channels with the
+    same sample rate and length, see
+    :func:`~cued_datalogger.api.channel.autogenerated_axis`)
     """
+    __slots__ = ('id_', 'units', 'data', 'scale', 'offset', 'version')
+
     def __init__(self, id_, units=None, data=np.array([])):
         """Create a new DataSet with unique *id_*. Can either be initialised as
         empty, or with units and/or data."""
+        self.version = 0
         self.set_id(id_)
         self.set_units(units)
         self.set_data(data)
+        self.set_scaling(None)
+
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __setstate__(self, state):
+        """Restore a pickled DataSet, including ones pickled before
+        __slots__ were used or before the scaling existed."""
+        if isinstance(state, tuple):
+            state = state[1]
+        self.version = 0
+        self.set_scaling(None)
+        for name, value in state.items():
+            setattr(self, name, value)
 
     def set_id(self, id_):
         """Set the DataSet's id\_ to *id_*."""
@@ -492,13 +823,107 @@ class DataSet(object):
 
     def set_data(self, data):
         """Set the DataSet's data array to *data*."""
-        # Set the dataset data
-        self.data = np.asarray(data)
+        # Set the dataset data, keeping memory-mapped data on disk
+        if isinstance(data, np.memmap):
+            self.data = data
+        else:
+            self.data = np.asarray(data)
+        self.version += 1
 
     def set_units(self, units):
         """Set the DataSet's units to *units*."""
         self.units = units
 
+    def set_scaling(self, scale, offset=0):
+        """Set the *scale* and *offset* that convert the raw data to physical
+        units. A *scale* of ``None`` means the data is already in physical
+        units."""
+        self.scale = scale
+        self.offset = offset
+        self.version += 1
+
+    @property
+    def is_memmap(self):
+        """bool: Whether the data is memory-mapped from a file."""
+        return isinstance(self.data, np.memmap)
+
+    def scaled_data(self, calibration_factor=1, dtype=np.float64,
+                    start=None, stop=None, step=None):
+        """Return the data (between *start* and *stop*, with *step*)
+        converted to physical units, as a new array of *dtype*:
+        ``(data * scale + offset) * calibration_factor``. Data with
+        no scale is returned as it is."""
+        data = self.data
+        if start is not None or stop is not None or step is not None:
+            data = data[start:stop:step]
+        if self.scale is None:
+            return data
+        out = data.astype(dtype)
+        out *= np.asarray(self.scale * calibration_factor, dtype=dtype)
+        if self.offset:
+            out += np.asarray(self.offset * calibration_factor, dtype=dtype)
+        return out
+
+    def chunks(self, chunk_size=CHUNK_SIZE, calibration_factor=1,
+               dtype=np.float64):
+        """Iterate over the data in chunks of *chunk_size* samples along the
+        first axis, converted to physical units as in :meth:`scaled_data`.
+        Yields the start index and the data of each chunk. Each chunk of a
+        memory-mapped DataSet is only read when it is reached."""
+        n = len(self.data)
+        for start in range(0, n, chunk_size):
+            yield start, self.scaled_data(calibration_factor, dtype,
+                                          start, min(n, start + chunk_size))
+
+    def downsampled(self, max_points, calibration_factor=1, dtype=np.float64):
+        """Return the indices and values of at most *max_points* points
+        following the envelope of the (1D, real) data: the minimum and the
+        maximum of each of *max_points*/2 equal bins, in order, converted to
+        physical units as in :meth:`scaled_data`. The data is read in chunks,
+        so a memory-mapped DataSet is never loaded at once. Data of no more
+        than *max_points* points is returned as it is, with all its indices."""
+        n = len(self.data)
+        if n <= max_points:
+            return np.arange(n), self.scaled_data(calibration_factor, dtype)
+
+        bin_size = -(-n // max(1, max_points // 2))
+        # Whole bins in each chunk, so that no bin is split between chunks
+        chunk_size = max(1, CHUNK_SIZE // bin_size) * bin_size
+        minima, maxima, arg_min, arg_max = [], [], [], []
+        for start in range(0, n, chunk_size):
+            chunk = np.asarray(self.data[start:min(n, start + chunk_size)])
+            whole = chunk.size // bin_size * bin_size
+            bins = [chunk[:whole].reshape(-1, bin_size)]
+            if whole < chunk.size:
+                # Last, partial bin
+                bins.append(chunk[whole:].reshape(1, -1))
+            for k, b in enumerate(bins):
+                offset = start + (whole if k else 0) + bin_size * np.arange(b.shape[0])
+                i_min = b.argmin(axis=1)
+                i_max = b.argmax(axis=1)
+                arg_min.append(offset + i_min)
+                arg_max.append(offset + i_max)
+                minima.append(b[np.arange(b.shape[0]), i_min])
+                maxima.append(b[np.arange(b.shape[0]), i_max])
+
+        # Interleave the minimum and maximum of each bin, in time order
+        arg_min, arg_max = np.concatenate(arg_min), np.concatenate(arg_max)
+        minima, maxima = np.concatenate(minima), np.concatenate(maxima)
+        first_min = arg_min <= arg_max
+        index = np.empty(2 * arg_min.size, dtype=np.int64)
+        values = np.empty(2 * arg_min.size, dtype=minima.dtype)
+        index[0::2] = np.where(first_min, arg_min, arg_max)
+        index[1::2] = np.where(first_min, arg_max, arg_min)
+        values[0::2] = np.where(first_min, minima, maxima)
+        values[1::2] = np.where(first_min, maxima, minima)
+
+        if self.scale is not None:
+            values = values.astype(dtype)
+            values *= np.asarray(self.scale * calibration_factor, dtype=dtype)
+            if self.offset:
+                values += np.asarray(self.offset * calibration_factor, dtype=dtype)
+        return index, values
+
 
 class ChannelSelectWidget(QWidget):
     """
@@ -6,7 +6,8 @@ Created on Fri Sep  1 14:00:14 2017
 """
 
 import scipy.io as sio
-from cued_datalogger.api.channel import ChannelSet
+from cued_datalogger.api.channel import ChannelSet, CHUNK_SIZE
+from cued_datalogger.acquisition.StreamWriter import StreamWriter
 import numpy as np
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout,QPushButton,QLabel,QListWidget,
                              QTreeWidgetItem,QHBoxLayout,QFileDialog,QCheckBox)
@@ -103,6 +104,63 @@ def export_to_mat(file,order, channel_set=None,back_comp = False):
                 time_series_fname = file[:-4]+'_sonogram.mat'
                 sio.savemat(time_series_fname,variables,appendmat = False)
             
+def export_to_stream(file, order, channel_set, chunk_size=CHUNK_SIZE):
+    """
+    Export the time series of channels from a ChannelSet to a stream
+    recording (see :mod:`StreamWriter <cued_datalogger.acquisition.StreamWriter>`),
+    which can be imported back with
+    :func:`~cued_datalogger.api.file_import.import_from_stream`.
+    The data is written in chunks, so channels memory-mapped from disk are
+    never loaded at once. Raw samples with the same scaling type are
+    exported as they are, with their scale and offset in the header.
+
+    Parameters
+    ----------
+    file : path_to_file
+        The base name (or the path to the ``.json`` header) of the recording.
+    order : tuple of int
+        Indices of the channels to export, in order. They must all have
+        time series of the same length.
+    channel_set : ChannelSet
+        The ChannelSet to export the data from.
+    chunk_size : int
+        Number of samples of each channel written at a time.
+
+    Returns
+    -------
+    int
+        Number of samples written.
+    """
+    channels = [channel_set.channels[i] for i in order]
+    datasets = [channel.dataset('time_series') for channel in channels]
+    n_samples = len(datasets[0].data)
+    if any(len(ds.data) != n_samples for ds in datasets):
+        raise ValueError("The time series of the channels must have the same length")
+
+    metadata = {'names': [channel.name for channel in channels]}
+    raw = (all(ds.scale is not None for ds in datasets)
+           and len(set(ds.data.dtype for ds in datasets)) == 1)
+    if raw:
+        dtype = datasets[0].data.dtype
+        metadata['scale'] = [float(ds.scale * channel.calibration_factor)
+                             for ds, channel in zip(datasets, channels)]
+        metadata['offset'] = [float(ds.offset * channel.calibration_factor)
+                              for ds, channel in zip(datasets, channels)]
+    else:
+        dtype = np.float64
+
+    writer = StreamWriter(file, len(channels), channels[0].sample_rate,
+                          dtype=dtype, metadata=metadata)
+    for start in range(0, n_samples, chunk_size):
+        stop = min(n_samples, start + chunk_size)
+        if raw:
+            chunk = [ds.data[start:stop] for ds in datasets]
+        else:
+            chunk = [channel.data_slice('time_series', start, stop)
+                     for channel in channels]
+        writer.write(np.column_stack(chunk), block=True)
+    return writer.close()
+
 class DataExportWidget(QWidget):
     """
     A proof-of-concept widget to show that exporting data is possible.
@@ -193,10 +251,13 @@ class DataExportWidget(QWidget):
         """
         Export the file to the url selected
         """
-        url = QFileDialog.getSaveFileName(self, "Export Data", "",
-                                           "MAT Files (*.mat)")[0]
+        url, url_filter = QFileDialog.getSaveFileName(self, "Export Data", "",
+                                                      "MAT Files (*.mat);;"
+                                                      "Stream Recordings (*.json)")
         if url:
-            if self.back_comp_btn.checkState() == Qt.Checked:
+            if url_filter.startswith('Stream') or url.endswith('.json'):
+                export_to_stream(url, tuple(self.order), self.cs)
+            elif self.back_comp_btn.checkState() == Qt.Checked:
                 export_to_mat(url,tuple(self.order), self.cs,back_comp = True)
             else:
                 export_to_mat(url,tuple(self.order), self.cs)
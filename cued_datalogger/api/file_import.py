@@ -1,6 +1,8 @@
 import sys,traceback
 import scipy.io as sio
 from cued_datalogger.api.channel import Channel, DataSet, ChannelSet
+from cued_datalogger.acquisition.StreamWriter import (read_stream_header,
+                                                      open_stream_file)
 import numpy as np
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout,QPushButton,QLabel,QTreeWidget,
                              QTreeWidgetItem,QHBoxLayout,QFileDialog)
@@ -118,6 +120,68 @@ def import_from_mat(file, channel_set=None):
     if new_channel_set:
         return channel_set
 
+def import_from_stream(file, channel_set=None):
+    """
+    A function for importing a recording that was streamed to disk
+    (see :mod:`StreamWriter <cued_datalogger.acquisition.StreamWriter>`)
+    to a ChannelSet. The data is not loaded: each ``time_series`` DataSet
+    is a view of the memory-mapped data file. The channel names are taken
+    from the header if it has them. The pretrigger length and the gap map
+    of any dropouts are kept in the comments of each channel, which is
+    also tagged ``'dropouts'`` if samples went missing.
+
+    Parameters
+    ----------
+    file : path_to_file
+        The path to the ``.json`` header (or the ``.dat`` data file) of the
+        recording.
+    channel_set : ChannelSet
+        The ChannelSet to save the imported data and metadata to. If ``None``,
+        a new ChannelSet is created and returned.
+    """
+    if channel_set is None:
+        new_channel_set = True
+        channel_set = ChannelSet()
+    else:
+        new_channel_set = False
+
+    header = read_stream_header(file)
+    data = open_stream_file(file)
+
+    names = header.get("names") or []
+    comments = []
+    if header.get("pretrig"):
+        comments.append("Pretrigger: {} samples".format(header["pretrig"]))
+    gaps = header.get("gaps") or []
+    if gaps:
+        comments.append("Dropouts (position, missing samples): " +
+                        ", ".join("({}, {})".format(*gap) for gap in gaps))
+
+    first_channel = len(channel_set)
+    for i in range(header["channels"]):
+        channel_set.add_channels()
+        channel_index = first_channel + i
+        if i < len(names):
+            name = names[i]
+        else:
+            name = "Stream {}".format(i)
+        channel_set.set_channel_metadata(channel_index,
+                                         {"name": name,
+                                          "sample_rate": header["sample_rate"],
+                                          "comments": "; ".join(comments),
+                                          "tags": ["dropouts"] if gaps else []})
+        channel_set.add_channel_dataset(channel_index,
+                                        "time_series",
+                                        data[:, i])
+        if "scale" in header:
+            # Raw samples, scaled to volts when accessed
+            channel_set.set_channel_scaling(channel_index, "time_series",
+                                            header["scale"][i],
+                                            header["offset"][i])
+    if new_channel_set:
+        return channel_set
+
+
 class DataImportWidget(QWidget):
     sig_replace_channelset = pyqtSignal(object)
     sig_extend_channelset = pyqtSignal(object)
@@ -186,9 +250,13 @@ class DataImportWidget(QWidget):
     def import_files(self):
         # Get a list of URLs from a QFileDialog
         url = QFileDialog.getOpenFileNames(self, "Load transfer function", "addons",
-                                               "MAT Files (*.mat)")[0]
+                                               "MAT Files (*.mat);;"
+                                               "Stream Recordings (*.json)")[0]
         try:
-            import_from_mat(url[0], self.new_cs)
+            if url[0].endswith('.json'):
+                import_from_stream(url[0], self.new_cs)
+            else:
+                import_from_mat(url[0], self.new_cs)
         except:
             t,v,tb = sys.exc_info()
             print(t)
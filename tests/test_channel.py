@@ -0,0 +1,110 @@
+import os
+
+import numpy as np
+import pytest
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from cued_datalogger.api import channel as channel_module
+from cued_datalogger.api.channel import Channel, ChannelSet, DataSet
+
+
+@pytest.fixture
+def stats():
+    channel_module.reset_derivation_stats()
+    yield channel_module.derivation_stats
+    channel_module.reset_derivation_stats()
+
+
+def double(channel):
+    channel.add_dataset('spectrum', data=2 * channel.data('time_series'))
+
+
+def test_derive_hits_and_misses(stats):
+    channel = Channel(sample_rate=100)
+    channel.add_dataset('time_series', data=np.arange(8.0))
+    derive = lambda **params: channel.derive('spectrum', ['time_series'],
+                                             params, double)
+
+    assert derive(window='hann')
+    assert not derive(window='hann')
+    assert not derive(window='hann')
+    assert stats['spectrum'] == {'hits': 2, 'misses': 1}
+
+    # New input data, parameters or sample rate
+    channel.set_data('time_series', np.ones(8))
+    assert derive(window='hann')
+    np.testing.assert_array_equal(channel.data('spectrum'), 2 * np.ones(8))
+    assert derive(window='none')
+    channel.sample_rate = 200
+    assert derive(window='none')
+    # The derived DataSet set otherwise
+    channel.set_data('spectrum', np.zeros(8))
+    assert derive(window='none')
+    assert not derive(window='none')
+    assert stats['spectrum'] == {'hits': 3, 'misses': 5}
+
+    derivation = channel.derivation('spectrum')
+    assert derivation['params'] == {'window': 'none'}
+    assert derivation['sample_rate'] == 200
+    assert channel.derivation('sonogram') is None
+
+
+def test_derivations_are_per_channel(stats):
+    cs = ChannelSet(2)
+    for channel in cs.channels:
+        channel.add_dataset('time_series', data=np.arange(4.0))
+        assert channel.derive('spectrum', ['time_series'], {}, double)
+    assert stats['spectrum'] == {'hits': 0, 'misses': 2}
+
+
+def test_memmap_dataset_stays_on_disk(tmp_path):
+    path = str(tmp_path / 'data.dat')
+    raw = np.memmap(path, dtype=np.int16, mode='w+', shape=(1000,))
+    raw[:] = np.arange(1000) - 500
+    raw.flush()
+
+    ds = DataSet('time_series', data=np.memmap(path, dtype=np.int16, mode='r'))
+    ds.set_scaling(0.5, 1.0)
+    assert ds.is_memmap
+    expected = (np.arange(1000) - 500) * 0.5 + 1.0
+    np.testing.assert_array_equal(ds.scaled_data(start=10, stop=20),
+                                  expected[10:20])
+
+    starts, chunks = zip(*ds.chunks(300))
+    assert starts == (0, 300, 600, 900)
+    np.testing.assert_array_equal(np.concatenate(chunks), expected)
+
+    indices, values = ds.downsampled(100)
+    assert len(values) <= 100
+    assert values.min() == expected.min() and values.max() == expected.max()
+    np.testing.assert_array_equal(values, expected[indices])
+
+
+def test_emptied_axis_is_autogenerated_again():
+    cs = ChannelSet(1)
+    cs.add_channel_dataset(0, 'spectrum', np.ones(501, dtype=complex))
+    assert cs.channels[0].data('frequency').shape == (501,)
+
+    # Given, emptied, then calculated again from the spectrum
+    cs.add_channel_dataset(0, 'frequency', np.arange(501.0))
+    assert cs.channels[0].data('frequency')[-1] == 500
+    cs.add_channel_dataset(0, 'frequency', [])
+    frequency = cs.channels[0].data('frequency')
+    assert frequency.shape == (501,)
+    assert frequency[-1] == cs.channels[0].sample_rate / 2
+    assert cs.channels[0].is_dataset('frequency')
+
+
+def test_block_of_a_recording_is_not_copied():
+    recording = np.arange(12.0).reshape((4, 3))
+    cs = ChannelSet(3)
+    cs.set_channel_block('time_series', recording.T, copy=False)
+    assert np.shares_memory(cs.channel_block('time_series'), recording)
+    np.testing.assert_array_equal(cs.channels[1].data('time_series'),
+                                  recording[:, 1])
+
+    cs.set_channel_block('time_series', recording.T)
+    block = cs.channel_block('time_series')
+    assert not np.shares_memory(block, recording)
+    assert block.flags['C_CONTIGUOUS']
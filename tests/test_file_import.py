@@ -0,0 +1,40 @@
+import os
+
+import numpy as np
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from cued_datalogger.acquisition.StreamWriter import StreamWriter
+from cued_datalogger.api.channel import ChannelSet
+from cued_datalogger.api.file_export import export_to_stream
+from cued_datalogger.api.file_import import import_from_stream
+
+
+def test_stream_export_import_keeps_names(tmp_path):
+    cs = ChannelSet(2)
+    data = np.random.randn(1000, 2)
+    for i, name in enumerate(['Hammer', 'Accel']):
+        cs.set_channel_metadata(i, {'name': name, 'sample_rate': 1000})
+        cs.add_channel_dataset(i, 'time_series', data[:, i])
+
+    export_to_stream(str(tmp_path / 'rec'), (0, 1), cs, chunk_size=300)
+    imported = import_from_stream(str(tmp_path / 'rec.json'))
+
+    assert imported.channel_metadata((0, 1), 'name') == ['Hammer', 'Accel']
+    assert imported.channels[0].tags == []
+    np.testing.assert_array_equal(imported.channels[1].data('time_series'),
+                                  data[:, 1])
+
+
+def test_stream_import_keeps_gaps(tmp_path):
+    writer = StreamWriter(str(tmp_path / 'rec'), 2, 1000,
+                          metadata={'pretrig': 100, 'gaps': [[512, 256]]})
+    writer.write(np.zeros((1000, 2)), block=True)
+    writer.close()
+    imported = import_from_stream(str(tmp_path / 'rec'))
+
+    assert imported.channel_metadata((0, 1), 'name') == ['Stream 0', 'Stream 1']
+    for channel in imported.channels:
+        assert channel.tags == ['dropouts']
+        assert 'Pretrigger: 100 samples' in channel.comments
+        assert '(512, 256)' in channel.comments
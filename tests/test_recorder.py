@@ -0,0 +1,120 @@
+import os
+
+import numpy as np
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from cued_datalogger.acquisition.RecorderParent import RecorderParent
+from cued_datalogger.acquisition.StreamWriter import read_stream_header
+
+
+class ManualRecorder(RecorderParent):
+    """A Recorder without a device: the chunks are given to process_chunk
+    by the tests, with their sequence numbers."""
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.open_recorder()
+
+    def stream_init(self, playback=False):
+        self.audio_stream = True
+        return True
+
+    def stream_start(self):
+        pass
+
+    def stream_stop(self):
+        pass
+
+    def stream_close(self):
+        self.audio_stream = None
+
+
+def chunk(rec, value):
+    return np.full(rec.chunk_size * rec.channels, value, dtype=np.int16)
+
+
+def record(rec, sequences, **kwargs):
+    rec.stream_init()
+    assert rec.record_init(samples=len(sequences) * rec.chunk_size, **kwargs)
+    assert rec.record_start()
+    for i, sequence in enumerate(sequences):
+        rec.process_chunk(chunk(rec, i + 1), sequence)
+    return rec.flush_record_data()
+
+
+def test_gap_map_of_dropped_sequence_numbers():
+    rec = ManualRecorder(channels=2, chunk_size=8, num_chunk=4)
+    data = record(rec, [0, 1, 4, 5, 7])
+
+    # The recording carries on with the chunks that did arrive
+    assert data.shape == (40, 2)
+    assert rec.lost_chunks == 3
+    assert rec.rec_gaps == [(16, 16), (32, 8)]
+    np.testing.assert_allclose(data[16:24], 3 * rec.scale[0])
+
+
+def test_dropped_slot_is_a_gap():
+    rec = ManualRecorder(channels=1, chunk_size=8, num_chunk=4)
+    for i in range(3):
+        if i == 1:
+            assert rec.acquire_chunk_slot() is not None
+            rec.drop_chunk_slot()
+        else:
+            slot = rec.acquire_chunk_slot()
+            slot[:] = i
+            rec.commit_chunk_slot(len(slot))
+    assert rec.lost_chunks == 1
+    assert rec.last_gap == (8, 8)
+
+
+def test_gap_map_written_to_the_stream_header(tmp_path):
+    rec = ManualRecorder(channels=2, chunk_size=8, num_chunk=4)
+    filename = str(tmp_path / 'rec')
+    data = record(rec, [0, 2, 3], filename=filename)
+
+    assert isinstance(data, np.memmap)
+    assert data.shape == (24, 2)
+    header = read_stream_header(filename)
+    assert header['gaps'] == [[8, 8]]
+    assert header['samples'] == 24
+
+
+def test_chunk_dropped_by_the_disk_writer_is_a_gap(tmp_path, monkeypatch):
+    rec = ManualRecorder(channels=2, chunk_size=8, num_chunk=4)
+    filename = str(tmp_path / 'rec')
+    rec.stream_init()
+    assert rec.record_init(samples=24, filename=filename)
+    assert rec.record_start()
+
+    # The writer queue is full for the second chunk
+    write = rec.disk_writer.write
+    calls = []
+    def full_once(data, block=False):
+        calls.append(data.shape[0])
+        return len(calls) != 2 and write(data, block)
+    monkeypatch.setattr(rec.disk_writer, 'write', full_once)
+
+    for i in range(4):
+        rec.process_chunk(chunk(rec, i + 1), i)
+    data = rec.flush_record_data()
+
+    # The recording carries on at the same position, to its full length
+    assert rec.rec_gaps == [(8, 8)]
+    assert data.shape == (24, 2)
+    np.testing.assert_allclose(data[8:16], 3 * rec.scale[0])
+    assert read_stream_header(filename)['gaps'] == [[8, 8]]
+
+
+def test_scaling_kept_when_the_buffer_is_reallocated():
+    rec = ManualRecorder(channels=2, chunk_size=8, num_chunk=4)
+    rec.scale[1] = 1e-3
+    rec.offset[1] = 0.5
+    rec.chunk_size = 16
+    rec.num_chunk = 2
+    assert rec.scale[1] == 1e-3 and rec.offset[1] == 0.5
+
+    # Reset to the full scale for a new number of channels
+    rec.channels = 3
+    rec.allocate_buffer()
+    np.testing.assert_array_equal(rec.scale, np.full(3, rec.full_scale / 2**15))
+    np.testing.assert_array_equal(rec.offset, np.zeros(3))
@@ -0,0 +1,52 @@
+import os
+from types import SimpleNamespace
+
+import numpy as np
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from cued_datalogger.acquisition.RecordingGraph import LevelsLiveGraph
+
+
+def levels(channels, countlimit=3):
+    """Only the peak state of a LevelsLiveGraph, without its widgets."""
+    return SimpleNamespace(peak_trace=np.zeros(channels),
+                           peak_decays=np.zeros(channels),
+                           trace_counter=np.zeros(channels),
+                           trace_countlimit=countlimit,
+                           peak_bars=SimpleNamespace(setData=lambda data: None))
+
+
+def test_batched_peaks_equal_single_chunks():
+    single = levels(3)
+    batched = levels(3)
+    peaks = np.array([1.0, 0.5, 0.8])
+    for graph in (single, batched):
+        LevelsLiveGraph.set_peaks(graph, peaks)
+    # Counters before the limit, at it and past it
+    single.trace_counter[:] = batched.trace_counter[:] = [0, 2, 5]
+
+    quiet = np.zeros(3)
+    for n in (1, 4, 7):
+        for _ in range(n):
+            LevelsLiveGraph.set_peaks(single, quiet)
+        LevelsLiveGraph.set_peaks(batched, quiet, chunks=n)
+        np.testing.assert_allclose(batched.peak_trace, single.peak_trace)
+        np.testing.assert_allclose(batched.peak_decays, single.peak_decays)
+        np.testing.assert_array_equal(batched.trace_counter, single.trace_counter)
+    assert np.all(single.peak_trace < peaks)
+
+
+def test_peak_holds_until_the_count_limit():
+    graph = levels(1, countlimit=3)
+    LevelsLiveGraph.set_peaks(graph, np.array([1.0]))
+    LevelsLiveGraph.set_peaks(graph, np.zeros(1), chunks=3)
+    assert graph.peak_trace[0] == 1.0
+    LevelsLiveGraph.set_peaks(graph, np.zeros(1))
+    assert graph.peak_trace[0] == 1.0
+    # The decay rate starts at zero
+    LevelsLiveGraph.set_peaks(graph, np.zeros(1), chunks=2)
+    assert graph.peak_trace[0] < 1.0
+    LevelsLiveGraph.set_peaks(graph, np.array([2.0]))
+    assert graph.peak_trace[0] == 2.0
+    assert graph.trace_counter[0] == 0
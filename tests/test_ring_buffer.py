@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from cued_datalogger.acquisition.RingBuffer import RingBuffer
+
+
+def samples(start, n, channels=2):
+    """Samples numbered from *start*, different on each channel."""
+    return (np.arange(start, start + n).reshape((-1, 1))
+            + 1000 * np.arange(channels)).astype(np.float64)
+
+
+@pytest.mark.parametrize('mirrored', [False, True])
+def test_latest_across_the_wraparound(mirrored):
+    ring = RingBuffer(10, channels=2, mirrored=mirrored)
+    for start in range(0, 24, 4):
+        ring.write(samples(start, 4))
+
+    assert ring.total_written == 24
+    assert ring.cursor == 4
+    np.testing.assert_array_equal(ring.latest(), samples(14, 10))
+    np.testing.assert_array_equal(ring.latest(6), samples(18, 6))
+    np.testing.assert_array_equal(ring.latest(5, skip=2), samples(17, 5))
+
+
+def test_mirrored_latest_is_a_contiguous_view():
+    ring = RingBuffer(10, channels=2, mirrored=True)
+    ring.write(samples(0, 13))
+    views = ring.read_latest(8)
+    assert len(views) == 1
+    assert np.shares_memory(views[0], ring.storage)
+    np.testing.assert_array_equal(views[0], samples(5, 8))
+
+
+def test_unmirrored_latest_is_split_at_the_wraparound():
+    ring = RingBuffer(10, channels=2)
+    ring.write(samples(0, 13))
+    older, newer = ring.read_latest(8)
+    np.testing.assert_array_equal(older, samples(5, 5))
+    np.testing.assert_array_equal(newer, samples(10, 3))
+
+
+def test_write_longer_than_the_buffer_keeps_the_newest():
+    ring = RingBuffer(10, channels=2, mirrored=True)
+    ring.write(samples(0, 3))
+    ring.write(samples(3, 25))
+    assert ring.total_written == 28
+    np.testing.assert_array_equal(ring.latest(), samples(18, 10))
+
+
+def test_copy_latest_and_reading_too_much():
+    ring = RingBuffer(10, channels=2)
+    ring.write(samples(0, 17))
+    out = np.zeros((6, 2))
+    ring.copy_latest(out, skip=1)
+    np.testing.assert_array_equal(out, samples(10, 6))
+    with pytest.raises(ValueError):
+        ring.read_latest(8, skip=3)
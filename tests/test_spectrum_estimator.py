@@ -0,0 +1,41 @@
+import numpy as np
+
+from cued_datalogger.acquisition.SpectrumEstimator import SpectrumEstimator
+
+RATE = 1000
+SEGMENT = 64
+
+
+def segments(amplitudes):
+    """One segment of a sine for each amplitude, with no overlap."""
+    t = np.arange(SEGMENT) / RATE
+    sine = np.sin(2 * np.pi * 125 * t)
+    return np.concatenate([a * sine for a in amplitudes]).reshape((-1, 1))
+
+
+def linear(continuous):
+    return SpectrumEstimator(1, RATE, segment=SEGMENT, overlap=0,
+                             averaging='linear', num_averages=4,
+                             scaling='psd', continuous=continuous)
+
+
+def test_linear_average_is_held():
+    est = linear(continuous=False)
+    est.update(segments([1, 1, 1, 1]))
+    held = est.result()
+    est.update(segments([3, 3, 3]))
+    assert est.count == 4 and est.segments == 7
+    np.testing.assert_array_equal(est.result(), held)
+
+
+def test_linear_average_restarts_when_continuous():
+    reference = linear(continuous=False)
+    reference.update(segments([3, 3]))
+
+    est = linear(continuous=True)
+    # Ten segments in chunks across the completed averages
+    data = segments([1, 1, 1, 1, 2, 2, 2, 2, 3, 3])
+    for start in range(0, data.shape[0], 100):
+        est.update(data[start:start + 100])
+    assert est.count == 2 and est.segments == 10
+    np.testing.assert_allclose(est.result(), reference.result())
@@ -0,0 +1,122 @@
+import numpy as np
+
+from cued_datalogger.acquisition.TransferFunctionEstimator import TransferFunctionEstimator
+from cued_datalogger.analysis.frequency_domain import (TransferFunctionAverager,
+                                                   compute_transfer_function)
+
+RATE = 1000
+SEGMENT = 256
+
+
+def known_system(samples, output_noise=0.0, input_noise=0.0, seed=0):
+    """White noise through y[n] = 0.5 x[n] + 0.25 x[n-1], with noise added
+    to the measured output or input. Returns the measured (input, output)
+    channels and the true transfer function at the segment frequencies."""
+    random = np.random.RandomState(seed)
+    x = random.randn(samples)
+    y = 0.5 * x
+    y[1:] += 0.25 * x[:-1]
+    data = np.column_stack([x + input_noise * random.randn(samples),
+                            y + output_noise * random.randn(samples)])
+    f = np.arange(SEGMENT // 2 + 1) * RATE / SEGMENT
+    h = 0.5 + 0.25 * np.exp(-2j * np.pi * f / RATE)
+    return data, h
+
+
+def estimate(data, chunk=100):
+    est = TransferFunctionEstimator(2, RATE, input_channel=0, segment=SEGMENT)
+    for start in range(0, data.shape[0], chunk):
+        est.update(data[start:start + chunk])
+    return est
+
+
+def test_h1_and_h2_of_a_clean_system():
+    data, h = known_system(200 * SEGMENT)
+    est = estimate(data)
+    assert est.count > 300
+    for estimator in ('H1', 'H2'):
+        tf, coh = est.result(estimator)
+        assert tf.shape == (SEGMENT // 2 + 1, 1)
+        np.testing.assert_allclose(tf[:, 0], h, atol=0.02)
+    assert np.all(coh > 0.98)
+
+
+def test_h1_with_output_noise_and_h2_with_input_noise():
+    data, h = known_system(400 * SEGMENT, output_noise=0.3)
+    h1, coh = estimate(data).result('H1')
+    h2, _ = estimate(data).result('H2')
+    np.testing.assert_allclose(h1[:, 0], h, atol=0.05)
+    # H2 is biased up by the noise on the output
+    assert np.mean(np.abs(h2[:, 0]) / np.abs(h)) > 1.1
+    assert np.mean(coh) < 0.9
+
+    data, h = known_system(400 * SEGMENT, input_noise=0.3)
+    h1, _ = estimate(data).result('H1')
+    h2, _ = estimate(data).result('H2')
+    np.testing.assert_allclose(h2[:, 0], h, atol=0.05)
+    # H1 is biased down by the noise on the input
+    assert np.mean(np.abs(h1[:, 0]) / np.abs(h)) < 0.95
+
+
+def test_chunking_does_not_change_the_average():
+    data, _ = known_system(50 * SEGMENT)
+    whole = estimate(data, chunk=data.shape[0])
+    chunked = estimate(data, chunk=37)
+    assert whole.count == chunked.count
+    np.testing.assert_allclose(chunked.result('H1')[0], whole.result('H1')[0])
+
+
+def test_num_averages_holds_the_average():
+    data, _ = known_system(50 * SEGMENT)
+    est = TransferFunctionEstimator(2, RATE, segment=SEGMENT, num_averages=10)
+    est.update(data)
+    assert est.count == 10
+
+
+def test_undo_and_reset():
+    data, _ = known_system(20 * SEGMENT)
+    averager = TransferFunctionAverager(history=4)
+    est = TransferFunctionEstimator(2, RATE, segment=SEGMENT, averager=averager)
+    est.update(data[:10 * SEGMENT])
+    first = averager.count
+    est.update(data[10 * SEGMENT:])
+    assert est.undo()
+    assert est.count == first
+    est.reset()
+    assert est.count == 0
+    assert est.result() == (None, None)
+
+
+def test_segments_restart_after_a_dropout():
+    from tests.test_recorder import ManualRecorder
+    data, _ = known_system(8 * 128)
+    raw = np.round(data * 2**12).astype(np.int16)
+    rec = ManualRecorder(channels=2, rate=RATE, chunk_size=128, num_chunk=4)
+    est = TransferFunctionEstimator(2, RATE, segment=SEGMENT)
+    rec.add_chunk_listener(est.update, physical=True)
+    rec.add_gap_listener(est.restart)
+
+    # Chunk 4 is lost: 4 chunks give 3 segments, then 3 chunks give 2,
+    # instead of 6 segments with one spanning the dropout
+    for sequence in [0, 1, 2, 3, 5, 6, 7]:
+        rec.process_chunk(raw[sequence * 128:(sequence + 1) * 128].ravel(),
+                          sequence)
+    assert rec.lost_chunks == 1
+    assert est.count == 5
+
+
+def test_h1_h2_phase_and_the_saved_convention():
+    # A pure delay: H = exp(-j w d) has a falling phase
+    data, _ = known_system(SEGMENT)
+    x = np.fft.rfft(data[:, 0])
+    y = x * np.exp(-2j * np.pi * np.arange(len(x)) * 3 / SEGMENT)
+    averager = TransferFunctionAverager()
+    averager.add(x, y)
+    np.testing.assert_allclose(averager.h1()[:, 0], y / x)
+    np.testing.assert_allclose(averager.h2()[:, 0], y / x)
+
+    # The transfer function saved from the acquisition is Gyy/Gxy
+    tf, coh = compute_transfer_function(averager.Gxx.reshape((-1, 1)),
+                                        averager.Gyy, averager.Gxy)
+    np.testing.assert_allclose(tf, averager.h2().conj())
+    np.testing.assert_allclose(coh, averager.coherence())
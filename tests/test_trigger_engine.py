@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from cued_datalogger.acquisition.TriggerEngine import TriggerEngine
+
+
+def column(*values):
+    return np.array(values, dtype=np.float64).reshape((-1, 1))
+
+
+def test_crossing_on_the_first_sample_of_a_chunk():
+    trig = TriggerEngine(level=0.5, slope='rising')
+    assert trig.check(column(0.0, 0.2, 0.4)) is None
+    assert trig.check(column(0.6, 0.8, 0.3)) == 0
+
+
+def test_no_retrigger_while_held_over_a_chunk_boundary():
+    trig = TriggerEngine(level=0.5, slope='rising', hysteresis=0.2)
+    assert trig.check(column(0.0, 0.6)) == 1
+    # Still above the level, then not far enough below it to re-arm
+    assert trig.check(column(0.7, 0.4, 0.6)) is None
+    # Re-armed at the end of this chunk, set off again in the next one
+    assert trig.check(column(0.6, 0.2)) is None
+    assert trig.check(column(0.1, 0.55)) == 1
+
+
+@pytest.mark.parametrize('slope,signal,expected', [
+    ('rising', (0.0, -0.7, 0.7), 2),
+    ('falling', (0.0, 0.7, -0.7), 2),
+    ('either', (0.0, -0.7, 0.7), 1),
+])
+def test_slopes(slope, signal, expected):
+    trig = TriggerEngine(level=0.5, slope=slope)
+    assert trig.check(column(*signal)) == expected
+
+
+def test_all_logic_across_chunks():
+    trig = TriggerEngine(channels=[0, 1], level=0.5, slope='rising',
+                         logic='all')
+    first = np.array([[0.0, 0.0], [0.8, 0.0], [0.9, 0.1]])
+    second = np.array([[0.9, 0.2], [0.9, 0.3], [0.9, 0.7]])
+    assert trig.check(first) is None
+    assert trig.check(second) == 2
+
+
+def test_reference_level():
+    trig = TriggerEngine(level=0.5, slope='either', reference=1.0)
+    assert trig.check(column(1.0, 1.2, 0.4)) == 2